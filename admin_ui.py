@@ -1,27 +1,107 @@
+import datetime
 import logging
+import math
 
 from flask import Blueprint, flash, redirect, render_template, request, url_for
-from wtforms import BooleanField, FloatField, Form, validators
+from wtforms import BooleanField, FloatField, Form, IntegerField, validators
 
-from config_manager import config_lock, save_config, shared_config
+from config_manager import ConfigEntry, config_store
+from config_view import (
+    ALERT_STATES,
+    CONFIG_PAGE_SIZE,
+    HEALTH_STATES,
+    SORT_FIELDS,
+    TRIGGERED,
+    ConfigQuery,
+    alert_state,
+    config_view,
+)
+from health import health_tracker
+from price_cache import price_cache
+from rules import RULE_FIELDS, validate_rules
 
 logger = logging.getLogger(__name__)
 
 admin_ui = Blueprint("admin_ui", __name__)
 
 
+def _finite(form, field):
+    # FloatField accepts "nan" and "inf", which would be stored and persisted
+    if field.data is not None and not math.isfinite(field.data):
+        raise validators.ValidationError("Must be a finite number.")
+
+
 class ThresholdForm(Form):
-    upper_threshold = FloatField("Upper Threshold", [validators.Optional()])
-    lower_threshold = FloatField("Lower Threshold", [validators.Optional()])
+    upper_threshold = FloatField("Upper Threshold", [validators.Optional(), _finite])
+    lower_threshold = FloatField("Lower Threshold", [validators.Optional(), _finite])
+    poll_interval = FloatField("Poll Interval", [validators.Optional(), _finite, validators.NumberRange(min=1)])
+    pct_change_open = FloatField("Change since Open (%)", [validators.Optional(), _finite])
+    pct_change_alert = FloatField("Change since Alert (%)", [validators.Optional(), _finite])
+    trailing_stop_pct = FloatField("Trailing Stop (%)", [validators.Optional(), _finite])
+    ma_short = IntegerField("Short MA", [validators.Optional()])
+    ma_long = IntegerField("Long MA", [validators.Optional()])
+    rearm_pct = FloatField("Re-arm (%)", [validators.Optional(), _finite])
     active = BooleanField("Active")
 
 
+def _redirect_back():
+    # Return to the page, filters and sort order the form was submitted from
+    return_to = request.form.get("return_to", "")
+    if return_to.startswith("/") and not return_to.startswith("//"):
+        return redirect(return_to)
+    return redirect(url_for("admin_ui.admin_page"))
+
+
+def _page_url(page):
+    return url_for("admin_ui.admin_page", **dict(request.args.to_dict(), page=page))
+
+
 @admin_ui.route("/", methods=["GET"])
 def admin_page():
-    # Render the admin UI with the current config
-    with config_lock:
-        config = list(shared_config)
-    return render_template("admin.html", config=config)
+    # Render one page of the config, filtered and sorted by the query string (see ConfigQuery)
+    try:
+        query = ConfigQuery.from_args(request.args, per_page=CONFIG_PAGE_SIZE)
+    except ValueError as e:
+        flash(f"Invalid filter: {e}", "error")
+        query = ConfigQuery(per_page=CONFIG_PAGE_SIZE)
+    page = config_view.query(query)
+    # Last known price and fetch time of the ISINs on this page from the shared price cache
+    prices = {}
+    # Circuit breaker state of the ISINs on this page; ISINs without a breaker have not been checked yet
+    health = {}
+    for entry in page.entries:
+        cached = price_cache.get(entry.isin)
+        if cached is not None:
+            prices[entry.isin] = {
+                "price": cached.price,
+                "fetched_at": datetime.datetime.fromtimestamp(cached.fetched_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "triggered": alert_state(entry) == TRIGGERED,
+            }
+        breaker = health_tracker.get(entry.isin)
+        if breaker is not None:
+            health[entry.isin] = {
+                "state": breaker["state"].replace("_", "-"),
+                "retry_at": (
+                    datetime.datetime.fromtimestamp(breaker["retry_at"]).strftime("%Y-%m-%d %H:%M:%S")
+                    if breaker["retry_at"]
+                    else None
+                ),
+                "last_error": breaker["last_error"],
+            }
+    pages = max(1, -(-page.total // query.per_page))
+    return render_template(
+        "admin.html",
+        config=page.entries,
+        prices=prices,
+        health=health,
+        query=query,
+        total=page.total,
+        pages=pages,
+        page_url=_page_url,
+        sort_fields=SORT_FIELDS,
+        health_states=HEALTH_STATES,
+        alert_states=ALERT_STATES,
+    )
 
 
 @admin_ui.route("/update", methods=["POST"])
@@ -30,24 +110,33 @@ def update_threshold():
     isin = request.form.get("isin")
     if not isin:
         flash("ISIN is missing from the form submission.", "error")
-        return redirect(url_for("admin_ui.admin_page"))
+        return _redirect_back()
     form = ThresholdForm(request.form)
     if not form.validate():
         flash(f"Invalid input for ISIN {isin}: {form.errors}", "error")
-        return redirect(url_for("admin_ui.admin_page"))
+        return _redirect_back()
     upper = form.upper_threshold.data
     lower = form.lower_threshold.data
     active = form.active.data
-    with config_lock:
-        for entry in shared_config:
-            if entry["isin"] == isin:
-                entry["upper_threshold"] = upper if upper is not None else None
-                entry["lower_threshold"] = lower if lower is not None else None
-                entry["active"] = active
-                break
-        save_config(shared_config)
-    logger.info(f"Config updated via admin UI for ISIN {isin}: upper={upper}, lower={lower}, active={active}")
-    return redirect(url_for("admin_ui.admin_page"))
+    poll_interval = form.poll_interval.data
+    rules = {field: getattr(form, field).data for field in RULE_FIELDS}
+    error = validate_rules(rules)
+    if error:
+        flash(f"Invalid input for ISIN {isin}: {error}", "error")
+        return _redirect_back()
+    if (
+        config_store.update(
+            isin, upper_threshold=upper, lower_threshold=lower, active=active, poll_interval=poll_interval, **rules
+        )
+        is None
+    ):
+        flash(f"ISIN {isin} not found.", "error")
+        return _redirect_back()
+    logger.info(
+        f"Config updated via admin UI for ISIN {isin}: upper={upper}, lower={lower}, active={active}, "
+        f"poll_interval={poll_interval}, rules={ {field: value for field, value in rules.items() if value is not None} }"
+    )
+    return _redirect_back()
 
 
 @admin_ui.route("/add", methods=["POST"])
@@ -55,37 +144,22 @@ def add_isin():
     isin = request.form.get("new_isin", "").strip().upper()
     if not isin or len(isin) != 12 or not isin.isalnum():
         flash("Invalid ISIN. Must be 12 alphanumeric characters.", "error")
-        return redirect(url_for("admin_ui.admin_page"))
-    with config_lock:
-        for entry in shared_config:
-            if entry["isin"] == isin:
-                flash(f"ISIN {isin} already exists.", "error")
-                return redirect(url_for("admin_ui.admin_page"))
-        shared_config.append(
-            {
-                "isin": isin,
-                "upper_threshold": None,
-                "lower_threshold": None,
-                "active": True,
-            }
-        )
-        save_config(shared_config)
+        return _redirect_back()
+    if not config_store.add(ConfigEntry(isin)):
+        flash(f"ISIN {isin} already exists.", "error")
+        return _redirect_back()
     logger.info(f"Added new ISIN {isin} via admin UI.")
     flash(f"ISIN {isin} added.", "success")
-    return redirect(url_for("admin_ui.admin_page"))
+    return _redirect_back()
 
 
 @admin_ui.route("/delete", methods=["POST"])
 def delete_isin():
     isin = request.form.get("delete_isin", "").strip().upper()
-    with config_lock:
-        before = len(shared_config)
-        shared_config[:] = [entry for entry in shared_config if entry["isin"] != isin]
-        after = len(shared_config)
-        save_config(shared_config)
-    if after < before:
+    deleted = config_store.delete(isin)
+    if deleted:
         logger.info(f"Deleted ISIN {isin} via admin UI.")
         flash(f"ISIN {isin} deleted.", "success")
     else:
         flash(f"ISIN {isin} not found.", "error")
-    return redirect(url_for("admin_ui.admin_page"))
+    return _redirect_back()
@@ -0,0 +1,72 @@
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from config_manager import ConfigEntry
+from rules import Alert, RuleEngine
+
+
+class TriggeredAlert(NamedTuple):
+    """
+    All rules that fired for one ISIN in one evaluation.
+    """
+
+    isin: str
+    price: float
+    alerts: Tuple[Alert, ...]
+    one_shot: bool  # no rearm_pct: the ISIN is deactivated after this alert
+
+    @property
+    def reason(self) -> str:
+        return " and ".join(alert.reason for alert in self.alerts)
+
+    @property
+    def subject(self) -> str:
+        return f"Stock Alert: {self.isin} {self.reason} (price: {self.price})"
+
+    @property
+    def body(self) -> str:
+        return f"The stock with ISIN {self.isin} {self.reason}. Current price: {self.price}."
+
+
+class AlertEvaluator:
+    """
+    Decides which alerts a batch of prices triggers. The rules of all ISINs in the batch are evaluated
+    together by the rule engine and the rules that fired are combined per ISIN. Fetching, scheduling,
+    clocks and email are left to the caller, so the monitoring loop and the replay tool run the same logic.
+    """
+
+    def __init__(self, rule_engine: Optional[RuleEngine] = None):
+        self.rule_engine = rule_engine if rule_engine is not None else RuleEngine()
+        self._one_shot: Dict[str, bool] = {}
+
+    def __len__(self) -> int:
+        return len(self._one_shot)
+
+    def __contains__(self, isin: str) -> bool:
+        return isin in self._one_shot
+
+    def sync(self, entries: Iterable[ConfigEntry]) -> None:
+        """
+        Align the evaluator with the active config entries (see RuleEngine.sync).
+        """
+        entries = list(entries)
+        self.rule_engine.sync(entries)
+        self._one_shot = {entry.isin: entry.rearm_pct is None for entry in entries}
+
+    def evaluate(
+        self,
+        prices: Mapping[str, float],
+        day: Optional[int] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> List[TriggeredAlert]:
+        """
+        Feed one price per ISIN to the rules and return the alerts they trigger, one per ISIN.
+        `day` identifies the trading day (see RuleEngine.evaluate). Alerts of ISINs for which `accept`
+        returns False are dropped, although their rule state is still updated.
+        """
+        fired: Dict[str, List[Alert]] = {}
+        for alert in self.rule_engine.evaluate(prices, day=day):
+            if accept is None or accept(alert.isin):
+                fired.setdefault(alert.isin, []).append(alert)
+        return [
+            TriggeredAlert(isin, alerts[0].price, tuple(alerts), self._one_shot[isin]) for isin, alerts in fired.items()
+        ]
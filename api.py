@@ -1,24 +1,93 @@
+import datetime
+import json
 import logging
+import math
+import os
+import secrets
+import zlib
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 
-from config_manager import config_lock, save_config, shared_config
+from compression import accepts_gzip
+from config_manager import ConfigEntry, config_store
+from config_view import ConfigQuery, config_view
+from event_stream import TooManySubscribers, event_broker
+from health import health_tracker
+from history_store import HISTORY_ENABLED, history_store
+from http_client import http_stats
+from metrics import REGISTRY
+from price_cache import price_cache
+from rules import RULE_FIELDS, validate_rules
+from stock_monitor import fetch_stock_price
 
 logger = logging.getLogger(__name__)
 
 api = Blueprint("api", __name__)
 
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", "10000"))  # max operations per bulk request
+BULK_OPERATIONS = ("upsert", "delete", "activate")
+HISTORY_DEFAULT_RANGE = 24 * 3600  # seconds of history returned when no start is given
+RESOLUTION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# The config version restarts at 1 with every process, so ETags also name the process that issued them
+_BOOT_ID = secrets.token_hex(4)
+
 
 def validate_isin(isin):
     # Basic ISIN validation: 12 alphanumeric characters
     return isinstance(isin, str) and len(isin) == 12 and isin.isalnum()
 
 
+def _isoformat(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat()
+
+
+def _config_etag(version, query):
+    # Weak, because the same listing is served plain or gzip-compressed
+    if query.is_full:
+        return f"config-{_BOOT_ID}-{version}"
+    return f"config-{_BOOT_ID}-{version}-{zlib.crc32(query.cache_key().encode()):08x}"
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
 @api.route("/api/config", methods=["GET"])
 def api_get_config():
-    # API endpoint to get the current config as JSON
-    with config_lock:
-        return jsonify(shared_config)
+    # API endpoint to get the current config as JSON.
+    # Optional query parameters: active (true/false), prefix (ISIN prefix), health (breaker state or unchecked),
+    # alert (triggered/clear), sort (field, "-" prefix for descending), page and per_page.
+    # The number of matching entries is returned in the X-Total-Count header.
+    # Responses that depend on the config only carry an ETag; If-None-Match answers 304 while the config is unchanged.
+    try:
+        query = ConfigQuery.from_args(request.args)
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid parameter: {e}"}, 400
+    if query.versioned:
+        etag = _config_etag(config_store.version, query)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+    if query.is_full:
+        # Served from the per-version cache, already compressed if the client accepts gzip
+        compressed = accepts_gzip()
+        version, total, body = config_view.full_json(compressed)
+        response = Response(body, mimetype="application/json")
+        if compressed:
+            response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+    else:
+        page = config_view.query(query)
+        version, total = page.version, page.total
+        response = jsonify([entry.to_dict() for entry in page.entries])
+    response.headers["X-Total-Count"] = str(total)
+    if query.versioned:
+        response.set_etag(_config_etag(version, query), weak=True)
+    response.cache_control.no_cache = True
+    return response
 
 
 @api.route("/api/config", methods=["POST"])
@@ -34,14 +103,301 @@ def api_update_config():
     try:
         upper = float(upper) if upper is not None else None
         lower = float(lower) if lower is not None else None
+        if not all(math.isfinite(value) for value in (upper, lower) if value is not None):
+            raise ValueError("not a finite number")
     except (TypeError, ValueError):
         logger.warning(f"Invalid threshold values for ISIN {isin}: upper={upper}, lower={lower}")
         return {"status": "error", "message": "Invalid threshold values."}, 400
-    with config_lock:
-        for entry in shared_config:
-            if entry["isin"] == isin:
-                entry["upper_threshold"] = upper
-                entry["lower_threshold"] = lower
-        save_config(shared_config)
+    if config_store.update(isin, upper_threshold=upper, lower_threshold=lower) is None:
+        logger.warning(f"Unknown ISIN received via API: {isin}")
+        return {"status": "error", "message": "Unknown ISIN."}, 404
     logger.info(f"Config updated via API for ISIN {isin}: upper={upper}, lower={lower}")
     return {"status": "ok"}
+
+
+def _parse_bulk_body():
+    # Parse a bulk request body: a JSON array or NDJSON (one JSON object per line).
+    # Returns the list of operations, or raises ValueError.
+    if request.mimetype in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+        operations = []
+        for line_no, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if line.strip():
+                try:
+                    operations.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_no}: {e}") from e
+        return operations
+    operations = request.get_json(silent=True)
+    if not isinstance(operations, list):
+        raise ValueError("Expected a JSON array of operations or an NDJSON body.")
+    return operations
+
+
+def _validate_bulk_operation(operation):
+    # Validate one bulk operation. Returns (normalized operation, None) or (None, error message).
+    if not isinstance(operation, dict):
+        return None, "Operation must be a JSON object."
+    op = operation.get("op")
+    if op not in BULK_OPERATIONS:
+        return None, f"Invalid op, expected one of: {', '.join(BULK_OPERATIONS)}."
+    isin = operation.get("isin")
+    isin = isin.strip().upper() if isinstance(isin, str) else isin
+    if not validate_isin(isin):
+        return None, "Invalid ISIN."
+    normalized = {"op": op, "isin": isin}
+    if op == "upsert":
+        for field in ("upper_threshold", "lower_threshold", "poll_interval") + RULE_FIELDS:
+            if field in operation:
+                value = operation[field]
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, str))):
+                    return None, f"Invalid {field}."
+                try:
+                    normalized[field] = float(value) if value is not None else None
+                except ValueError:
+                    return None, f"Invalid {field}."
+                # NaN and infinity would be stored and persisted, and are not valid JSON
+                if normalized[field] is not None and not math.isfinite(normalized[field]):
+                    return None, f"Invalid {field}, must be a finite number."
+        if normalized.get("poll_interval") is not None and normalized["poll_interval"] < 1:
+            return None, "Invalid poll_interval, must be at least 1 second."
+    if op in ("upsert", "activate") and "active" in operation:
+        if not isinstance(operation["active"], bool):
+            return None, "Invalid active flag, expected true or false."
+        normalized["active"] = operation["active"]
+    elif op == "activate":
+        normalized["active"] = True
+    return normalized, None
+
+
+def _upserted_entry(existing, isin, fields):
+    # The entry an upsert stores: its fields merged into the existing entry. Rules are validated on the
+    # merged entry, so an upsert may set e.g. only ma_long of an entry that already has ma_short.
+    # Returns (entry, None) or (None, error message).
+    entry = existing.replace(**fields) if existing else ConfigEntry(isin, **fields)
+    error = validate_rules({field: getattr(entry, field) for field in RULE_FIELDS})
+    if error:
+        return None, error
+    windows = {
+        field: int(getattr(entry, field)) for field in ("ma_short", "ma_long") if getattr(entry, field) is not None
+    }
+    return entry.replace(**windows), None
+
+
+class _RejectBulk(Exception):
+    # Raised in an atomic bulk request to discard the config transaction
+    pass
+
+
+@api.route("/api/config/bulk", methods=["POST"])
+def api_bulk_config():
+    # API endpoint to upsert, delete and (de)activate many ISINs in one request.
+    # Body: JSON array or NDJSON of {"op": "upsert"|"delete"|"activate", "isin": ..., ...}.
+    # All operations are validated first, then applied in one config transaction (one persist);
+    # the rules of an upsert are validated on the entry it produces.
+    # With ?atomic=true nothing is applied if any operation is invalid.
+    try:
+        operations = _parse_bulk_body()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    if len(operations) > BULK_MAX_OPERATIONS:
+        return {"status": "error", "message": f"Too many operations (max {BULK_MAX_OPERATIONS})."}, 413
+    atomic = request.args.get("atomic", "").lower() in ("1", "true", "yes")
+
+    results = []
+    valid = []
+    for index, operation in enumerate(operations):
+        normalized, error = _validate_bulk_operation(operation)
+        isin = operation.get("isin") if isinstance(operation, dict) else None
+        if error:
+            results.append({"index": index, "isin": isin, "status": "error", "message": error})
+        else:
+            results.append({"index": index, "isin": normalized["isin"], "op": normalized["op"], "status": "ok"})
+            valid.append((index, normalized))
+    failed = len(operations) - len(valid)
+    if atomic and failed:
+        logger.warning(f"Rejected atomic bulk config request: {failed} of {len(operations)} operation(s) invalid")
+        return {"status": "error", "message": "Invalid operations, nothing applied.", "results": results}, 400
+
+    try:
+        with config_store.transaction() as txn:
+            for index, operation in valid:
+                isin = operation["isin"]
+                fields = {key: value for key, value in operation.items() if key not in ("op", "isin")}
+                if operation["op"] == "upsert":
+                    existing = txn.get(isin)
+                    entry, error = _upserted_entry(existing, isin, fields)
+                    if error:
+                        results[index].update(status="error", message=error)
+                        if atomic:
+                            raise _RejectBulk()
+                        continue
+                    txn.put(entry)
+                    results[index]["result"] = "updated" if existing else "created"
+                elif operation["op"] == "delete":
+                    if txn.delete(isin) is None:
+                        results[index].update(status="error", message="Unknown ISIN.")
+                    else:
+                        results[index]["result"] = "deleted"
+                elif txn.update(isin, active=operation["active"]) is None:
+                    results[index].update(status="error", message="Unknown ISIN.")
+                else:
+                    results[index]["result"] = "activated" if operation["active"] else "deactivated"
+    except _RejectBulk:
+        logger.warning(f"Rejected atomic bulk config request of {len(operations)} operation(s): invalid rules")
+        for result in results:
+            result.pop("result", None)
+        return {"status": "error", "message": "Invalid operations, nothing applied.", "results": results}, 400
+    errors = sum(1 for result in results if result["status"] == "error")
+    logger.info(f"Bulk config request applied {len(results) - errors} of {len(results)} operation(s)")
+    return {"status": "ok" if not errors else "partial", "results": results}
+
+
+@api.route("/api/prices", methods=["GET"])
+def api_get_prices():
+    # API endpoint to get the last cached price and fetch time per configured ISIN.
+    # Optional query parameters: isin (repeatable) to restrict the result,
+    # refresh=true to fetch prices older than the cache TTL for the requested ISINs.
+    isins = [entry.isin for entry in config_store.snapshot()]
+    requested = request.args.getlist("isin")
+    if requested:
+        unknown = [isin for isin in requested if isin not in config_store]
+        if unknown:
+            return {"status": "error", "message": f"Unknown ISIN(s): {', '.join(unknown)}"}, 404
+        isins = requested
+    if request.args.get("refresh", "").lower() in ("1", "true", "yes"):
+        if not requested:
+            return {"status": "error", "message": "refresh requires at least one isin parameter."}, 400
+        for isin in isins:
+            price_cache.get_or_fetch(isin, fetch_stock_price)
+    prices = []
+    for isin in isins:
+        cached = price_cache.get(isin)
+        prices.append(
+            {
+                "isin": isin,
+                "price": cached.price if cached else None,
+                "fetched_at": _isoformat(cached.fetched_at) if cached else None,
+                "fresh": price_cache.get_fresh(isin) is not None,
+            }
+        )
+    return jsonify(prices)
+
+
+@api.route("/api/stream", methods=["GET"])
+def api_stream():
+    # Server-Sent Events endpoint: price, alert and active events as the monitoring loop sees them.
+    # Optional query parameter: isin (repeatable or comma-separated) to receive events of these ISINs only.
+    isins = [isin.strip().upper() for value in request.args.getlist("isin") for isin in value.split(",") if isin.strip()]
+    invalid = [isin for isin in isins if not validate_isin(isin)]
+    if invalid:
+        return {"status": "error", "message": f"Invalid ISIN(s): {', '.join(invalid)}"}, 400
+    try:
+        subscription = event_broker.subscribe(isins or None)
+    except TooManySubscribers as e:
+        return {"status": "error", "message": str(e)}, 503
+    response = Response(event_broker.stream(subscription), mimetype="text/event-stream")
+    # Also covers clients that disconnect before the first event is sent
+    response.call_on_close(lambda: event_broker.unsubscribe(subscription))
+    response.headers["Cache-Control"] = "no-cache"
+    # Keep reverse proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api.route("/api/stats/http", methods=["GET"])
+def api_http_stats():
+    # API endpoint to get HTTP connection reuse and transfer counters of the price scraper
+    return jsonify(http_stats())
+
+
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus scrape endpoint
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@api.route("/api/health", methods=["GET"])
+def api_health():
+    # API endpoint to get the circuit breaker state per ISIN and the consecutive price host failures.
+    # Optional query parameter: state (closed, open or half_open) to restrict the ISINs returned.
+    state = request.args.get("state")
+    breakers = []
+    for isin, breaker in health_tracker.snapshot().items():
+        if state and breaker["state"] != state:
+            continue
+        breakers.append(
+            {
+                "isin": isin,
+                "state": breaker["state"],
+                "failures": breaker["failures"],
+                "opened_at": _isoformat(breaker["opened_at"]),
+                "retry_at": _isoformat(breaker["retry_at"]),
+                "last_error": breaker["last_error"],
+                "last_success": _isoformat(breaker["last_success"]),
+            }
+        )
+    return jsonify({"host": health_tracker.host_status(), "isins": breakers})
+
+
+def _parse_time(value):
+    # Epoch seconds or ISO 8601 (naive times are UTC)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def _check_time(timestamp):
+    # The history is stored in daily segments, so a time must be a date that datetime can represent
+    if not math.isfinite(timestamp):
+        raise ValueError("times must be finite")
+    try:
+        datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    except (OverflowError, ValueError, OSError):
+        raise ValueError(f"time {timestamp:g} is out of range") from None
+    return timestamp
+
+
+def _parse_resolution(value):
+    # Seconds, optionally with a unit suffix: 30s, 5m, 1h, 1d
+    unit = RESOLUTION_UNITS.get(value[-1:].lower())
+    seconds = float(value[:-1]) * unit if unit else float(value)
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError("resolution must be a positive, finite number of seconds")
+    return seconds
+
+
+@api.route("/api/history/<isin>", methods=["GET"])
+def api_history(isin):
+    # API endpoint to get the recorded price history of an ISIN.
+    # Optional query parameters: start and end (epoch seconds or ISO 8601, default: the last 24 hours)
+    # and resolution (seconds or e.g. 5m, 1h, 1d) to return only the last price per interval.
+    if not HISTORY_ENABLED:
+        return {"status": "error", "message": "Price history is disabled."}, 404
+    if not validate_isin(isin):
+        return {"status": "error", "message": "Invalid ISIN."}, 400
+    try:
+        end = _parse_time(request.args["end"]) if "end" in request.args else datetime.datetime.now().timestamp()
+        start = _parse_time(request.args["start"]) if "start" in request.args else end - HISTORY_DEFAULT_RANGE
+        resolution = _parse_resolution(request.args["resolution"]) if "resolution" in request.args else None
+        _check_time(start)
+        _check_time(end)
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid parameter: {e}"}, 400
+    if start > end:
+        return {"status": "error", "message": "start must not be after end."}, 400
+    timestamps, prices = history_store.query(isin, start, end, resolution)
+    return jsonify(
+        {
+            "isin": isin,
+            "start": _isoformat(start),
+            "end": _isoformat(end),
+            "resolution": resolution,
+            "timestamps": timestamps,
+            "prices": prices,
+        }
+    )
@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks of the hot paths: price parsing, config store mutations, config persistence,
+rule evaluation and the price history store.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_micro [--isins 10000] [--repeat 5]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+from benchmarks.results import save_results
+from config_manager import ConfigEntry, ConfigStore, journal_path, load_config, save_config
+from history_store import HistoryStore
+from rules import RuleEngine
+from stock_monitor import extract_price
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def best_of(function, repeat: int, number: int = 1) -> float:
+    # Best (least disturbed) seconds per call
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def bench_parsing(repeat: int) -> dict:
+    results = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "orderbuch_umsaetze_*.html"))):
+        with open(path, "rb") as f:
+            content = f.read()
+        isin = os.path.basename(path)[len("orderbuch_umsaetze_") : -len(".html")]
+        results[f"extract_price_{isin}_seconds"] = best_of(lambda: extract_price(content, isin), repeat, 100)
+    return results
+
+
+def synthetic_config(count: int):
+    return [{"isin": f"XS{i:010d}", "upper_threshold": 1000.0, "lower_threshold": 1.0} for i in range(count)]
+
+
+def bench_config_store(count: int, repeat: int) -> dict:
+    config = synthetic_config(count)
+    isins = [entry["isin"] for entry in config]
+    store = ConfigStore()
+    results = {"load_seconds": best_of(lambda: store.load(config), repeat)}
+
+    def update_one():
+        store.update(random.choice(isins), upper_threshold=random.uniform(900, 1100))
+
+    def transaction_all():
+        with store.transaction() as transaction:
+            for isin in isins:
+                transaction.put(ConfigEntry(isin, upper_threshold=random.uniform(900, 1100)))
+
+    def toggle_all():
+        store.set_active(isins, False)
+        store.set_active(isins, True)
+
+    results["update_one_seconds"] = best_of(update_one, repeat, 1000)
+    results["transaction_put_all_seconds"] = best_of(transaction_all, repeat)
+    results["set_active_all_twice_seconds"] = best_of(toggle_all, repeat)
+    results["active_entries_seconds"] = best_of(store.active_entries, repeat, 10)
+    return results
+
+
+def bench_persistence(count: int, repeat: int, workdir: str) -> dict:
+    config = synthetic_config(count)
+    path = os.path.join(workdir, "config.json")
+    results = {"save_config_seconds": best_of(lambda: save_config(config, path), repeat)}
+    results["load_config_seconds"] = best_of(lambda: load_config(path), repeat)
+    # A journal of one change per ISIN on top of the config file
+    with open(journal_path(path), "w") as f:
+        for entry in config:
+            f.write(json.dumps({"op": "put", "entry": dict(entry, upper_threshold=999.0)}) + "\n")
+    results["load_config_with_journal_seconds"] = best_of(lambda: load_config(path), repeat)
+    return results
+
+
+def random_rules(rng: random.Random, isin: str) -> ConfigEntry:
+    fields = {}
+    for name, low, high in (
+        ("upper_threshold", 95, 115),
+        ("lower_threshold", 85, 105),
+        ("pct_change_open", 0.5, 4),
+        ("pct_change_alert", 0.5, 4),
+        ("trailing_stop_pct", 0.5, 5),
+    ):
+        if rng.random() < 0.5:
+            fields[name] = rng.uniform(low, high)
+    if rng.random() < 0.5:
+        fields["ma_short"] = rng.randint(1, 10)
+        fields["ma_long"] = rng.randint(fields["ma_short"] + 1, 40)
+    if rng.random() < 0.6:
+        fields["rearm_pct"] = rng.uniform(0, min(3, fields.get("pct_change_open", 6) / 2))
+    return ConfigEntry(isin, **fields)
+
+
+def check_rule_paths(steps: int = 2000) -> None:
+    # The array and the single-ISIN evaluation must agree: random rules and prices (with gaps, zero and
+    # NaN prices and new days) through both, comparing the alerts and the final state
+    rng = random.Random(0)
+    entries = [random_rules(rng, f"XS{i:010d}") for i in range(50)]
+    engines = (RuleEngine(window=50, small_batch=0), RuleEngine(window=50, small_batch=len(entries) + 1))
+    for engine in engines:
+        engine.sync(entries)
+    prices = dict.fromkeys((entry.isin for entry in entries), 100.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for step in range(steps):
+            batch = {}
+            for isin in prices:
+                if rng.random() < 0.7:
+                    prices[isin] *= 1 + rng.gauss(0, 0.01)
+                    if rng.random() < 0.01:
+                        prices[isin] = rng.choice([0.0, float("nan"), 100.0])
+                    batch[isin] = prices[isin]
+            alerts = [engine.evaluate(batch, day=step // 200) for engine in engines]
+            if alerts[0] != alerts[1]:
+                raise SystemExit(f"Rule evaluation paths disagree at step {step}: {alerts}")
+    arrays = [engine.export_arrays() for engine in engines]
+    for name, array in arrays[0].items():
+        if not np.array_equal(array, arrays[1][name], equal_nan=array.dtype.kind == "f"):
+            raise SystemExit(f"Rule evaluation paths disagree on the {name} state")
+
+
+def bench_rules(count: int, repeat: int) -> dict:
+    check_rule_paths()
+    entries = [
+        ConfigEntry(
+            f"XS{i:010d}",
+            upper_threshold=1000.0,
+            pct_change_open=5.0,
+            trailing_stop_pct=10.0,
+            ma_short=5,
+            ma_long=20,
+            rearm_pct=1.0,
+        )
+        for i in range(count)
+    ]
+    engine = RuleEngine()
+    engine.sync(entries)
+    rng = random.Random(0)
+    batches = [{entry.isin: rng.uniform(90, 110) for entry in entries} for _ in range(20)]
+    # Fill the price windows so the moving averages are defined
+    for batch in batches:
+        engine.evaluate(batch, day=1)
+    batch_iter = iter(batches * (repeat * 10 + 1))
+    return {
+        "sync_seconds": best_of(lambda: engine.sync(entries), repeat),
+        "evaluate_seconds": best_of(lambda: engine.evaluate(next(batch_iter), day=1), repeat, 10),
+        # One ISIN per batch, e.g. replaying the ticks of a single ISIN
+        "evaluate_single_seconds": best_of(lambda: engine.evaluate({entries[0].isin: 100.0}, day=1), repeat, 100),
+    }
+
+
+def bench_history(count: int, repeat: int, workdir: str) -> dict:
+    store = HistoryStore(directory=os.path.join(workdir, "history"))
+    isins = [f"XS{i:010d}" for i in range(count)]
+    clock = [time.time() - 86400]
+
+    def sweep():
+        clock[0] += 60
+        for isin in isins:
+            store.record(isin, 100.0, clock[0])
+        store.flush()
+
+    results = {"record_flush_sweep_seconds": best_of(sweep, repeat)}
+    # One ISIN with a day of one-minute prices
+    for _ in range(1440):
+        store.record(isins[0], 100.0, clock[0])
+        clock[0] += 60
+    store.flush()
+    results["query_day_seconds"] = best_of(lambda: store.query(isins[0], 0, clock[0]), repeat, 100)
+    results["query_day_hourly_seconds"] = best_of(lambda: store.query(isins[0], 0, clock[0], 3600), repeat, 100)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--isins", type=int, default=10000, help="ISINs in the synthetic config")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per benchmark (best is reported)")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results in benchmarks/results")
+    args = parser.parse_args()
+    # The config functions log every load and save
+    logging.disable(logging.INFO)
+
+    workdir = tempfile.mkdtemp(prefix="bench_micro_")
+    try:
+        results = {
+            "parsing": bench_parsing(args.repeat),
+            "config_store": bench_config_store(args.isins, args.repeat),
+            "persistence": bench_persistence(args.isins, args.repeat, workdir),
+            "rules": bench_rules(args.isins, args.repeat),
+            "history": bench_history(args.isins, args.repeat, workdir),
+        }
+    finally:
+        shutil.rmtree(workdir)
+    for group, values in results.items():
+        for name, seconds in values.items():
+            print(f"{group + '.' + name:<55} {seconds * 1e3:>10.3f} ms")
+    if not args.no_save:
+        print(f"Results saved to {save_results('micro', results, vars(args))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compare the price cell extractors of stock_monitor on the saved Tradegate pages in benchmarks/fixtures.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parser [--number 200]
+"""
+
+import argparse
+import glob
+import os
+import timeit
+
+from stock_monitor import FALLBACK_PRICE_PARSER, PRICE_PARSERS, extract_price
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="parse calls per parser and fixture")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "orderbuch_umsaetze_*.html")))
+    if not paths:
+        raise SystemExit(f"No fixture pages found in {FIXTURES_DIR}")
+
+    print(f"{'fixture':<45} {'size':>8} {'parser':<6} {'per call':>12} {'speedup':>8}")
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        name = os.path.basename(path)
+        # Both extractors must agree before their timings are worth comparing
+        results = {parser_name: parse(content) for parser_name, parse in PRICE_PARSERS.items()}
+        if len({(text or "").strip() for text in results.values()}) != 1:
+            raise SystemExit(f"Parsers disagree on {name}: {results}")
+        timings = {
+            parser_name: timeit.timeit(lambda: parse(content), number=args.number) / args.number
+            for parser_name, parse in PRICE_PARSERS.items()
+        }
+        # Speedup is relative to the BeautifulSoup fallback
+        baseline = timings[FALLBACK_PRICE_PARSER]
+        for parser_name, seconds in timings.items():
+            print(f"{name:<45} {len(content):>8} {parser_name:<6} {seconds * 1e6:>10.1f}us {baseline / seconds:>7.1f}x")
+        print(f"{name:<45} price: {extract_price(content, name)}")
+
+
+if __name__ == "__main__":
+    main()
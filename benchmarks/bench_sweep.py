@@ -0,0 +1,184 @@
+"""
+End-to-end sweep benchmark: runs the monitoring loop against the local Tradegate stand-in and SMTP sink.
+
+For every size, a synthetic config of that many ISINs is written and the service's main loop runs in a
+child process until it has completed the requested number of sweeps. A small fraction of the ISINs is
+priced above its threshold so alerts flow through the notifier to the sink. Reports sweep time, CPU time,
+peak RSS and alert latency (first response with the alerting price -> email accepted by the sink).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sweep [--sizes 10,100,1000,10000] [--sweeps 3] [--latency 0.02] [--error-rate 0.01]
+Further service settings (FETCH_WORKERS, FETCH_MAX_PER_HOST, ...) are passed through from the environment.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.results import save_results
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.stand_in import TradegateStandIn
+
+ALERT_PRICE = 2000.0  # above the threshold of every synthetic ISIN
+UPPER_THRESHOLD = 1000.0  # stand-in prices are below 500 otherwise
+_ISIN_PATTERN = re.compile(r"ISIN (\w{12})")
+
+
+def synthetic_isins(count: int):
+    return [f"XS{i:010d}" for i in range(count)]
+
+
+def run_child(count: int, sweeps: int, timeout: float, output: str) -> None:
+    # Runs in the child process: the environment points the service at the stand-in and the sink
+    import stock_alert
+    from metrics import SWEEP_SECONDS
+
+    # Benchmarks run at any time of day and on any day of the week
+    stock_alert.MarketCalendar.is_trading_day = lambda self, day: True
+    cpu_start = time.process_time()
+    thread = threading.Thread(target=stock_alert.main, name="monitor")
+    thread.start()
+
+    durations = []
+    seen, total = SWEEP_SECONDS.totals()
+    deadline = time.monotonic() + timeout
+    while len(durations) < sweeps and thread.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.005)
+        count_now, total_now = SWEEP_SECONDS.totals()
+        if count_now > seen:
+            # Sweeps are seconds apart, so at most one completes between two polls
+            durations.append((total_now - total) / (count_now - seen))
+            seen, total = count_now, total_now
+    stock_alert.handle_shutdown("benchmark", None)
+    thread.join()
+
+    import resource
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "sweep_seconds": durations,
+                "cpu_seconds": time.process_time() - cpu_start,
+                "peak_rss_mb": usage.ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+            },
+            f,
+        )
+
+
+def run_size(count: int, args) -> dict:
+    stand_in = TradegateStandIn(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, slow_rate=args.slow_rate, seed=count
+    ).start()
+    sink = SMTPSink().start()
+    isins = synthetic_isins(count)
+    alerting = isins[:: max(1, round(1 / args.alert_fraction))] if args.alert_fraction else []
+    for isin in alerting:
+        stand_in.prices[isin] = ALERT_PRICE
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_sweep_") as workdir:
+            config_path = os.path.join(workdir, "config.json")
+            with open(config_path, "w") as f:
+                json.dump([{"isin": isin, "upper_threshold": UPPER_THRESHOLD} for isin in isins], f)
+            output = os.path.join(workdir, "result.json")
+            env = dict(
+                os.environ,
+                TRADEGATE_BASE_URL=stand_in.base_url,
+                SMTP_SERVER="127.0.0.1",
+                SMTP_PORT=str(sink.port),
+                SMTP_STARTTLS="false",
+                SMTP_USERNAME="bench",
+                SMTP_PASSWORD="bench",
+                EMAIL_FROM="bench@localhost",
+                EMAIL_TO="bench@localhost",
+                CONFIG_PATH=config_path,
+                EMAIL_SPOOL_DIR=os.path.join(workdir, "spool"),
+                HISTORY_DIR=os.path.join(workdir, "history"),
+                # A fresh snapshot per run: resuming a previous run's state would skew the sweeps
+                RUNTIME_STATE_PATH=os.path.join(workdir, "runtime_state.npz"),
+                CHECK_INTERVAL="1",
+                PRICE_CACHE_TTL="0",
+                FETCH_RETRY_DELAY=os.environ.get("FETCH_RETRY_DELAY", "0.1"),
+                MARKET_OPEN="00:00",
+                MARKET_CLOSE="23:59",
+                MARKET_HOLIDAYS="",
+            )
+            command = [sys.executable, "-m", "benchmarks.bench_sweep", "--child", str(count)]
+            command += ["--sweeps", str(args.sweeps), "--timeout", str(args.timeout), "--output", output]
+            quiet = None if args.verbose else subprocess.DEVNULL
+            subprocess.run(command, env=env, stdout=quiet, stderr=quiet, check=True)
+            with open(output) as f:
+                result = json.load(f)
+    finally:
+        stand_in.stop()
+        sink.stop()
+
+    latencies = []
+    for message in sink.received():
+        for isin in set(_ISIN_PATTERN.findall(message.body)):
+            served = stand_in.first_served.get(isin)
+            if served is not None:
+                latencies.append(message.received_at - served)
+    sweep_seconds = result["sweep_seconds"]
+    return {
+        "sweeps": len(sweep_seconds),
+        "first_sweep_seconds": sweep_seconds[0] if sweep_seconds else None,
+        "median_sweep_seconds": statistics.median(sweep_seconds) if sweep_seconds else None,
+        "cpu_seconds": result["cpu_seconds"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "requests": stand_in.requests,
+        "server_errors": stand_in.errors,
+        "alerts_expected": len(alerting),
+        "alerts_received": len(latencies),
+        "median_alert_latency_seconds": statistics.median(latencies) if latencies else None,
+        "max_alert_latency_seconds": max(latencies) if latencies else None,
+    }
+
+
+def _format(value) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma-separated numbers of ISINs")
+    parser.add_argument("--sweeps", type=int, default=3, help="sweeps to measure per size")
+    parser.add_argument("--timeout", type=float, default=600, help="max seconds per size")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stand-in random +/- seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stand-in fraction of 500 responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="stand-in fraction of 5 s responses")
+    parser.add_argument("--alert-fraction", type=float, default=0.01, help="fraction of ISINs priced to alert")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results in benchmarks/results")
+    parser.add_argument("--verbose", action="store_true", help="show the service log")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        run_child(args.child, args.sweeps, args.timeout, args.output)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    columns = ["first_sweep_seconds", "median_sweep_seconds", "cpu_seconds", "peak_rss_mb"]
+    columns += ["alerts_received", "median_alert_latency_seconds"]
+    print(f"{'isins':>6} " + " ".join(f"{column:>14.14}" for column in columns))
+    results = {}
+    for size in sizes:
+        results[str(size)] = result = run_size(size, args)
+        print(f"{size:>6} " + " ".join(f"{_format(result[column]):>14}" for column in columns))
+    if not args.no_save:
+        parameters = {name: value for name, value in vars(args).items() if name not in ("child", "output", "verbose")}
+        print(f"Results saved to {save_results('sweep', results, parameters)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Store benchmark results per commit and compare two runs.
+
+Every benchmark writes benchmarks/results/<benchmark>-<timestamp>-<commit>.json.
+
+Usage (from the repository root):
+    python -m benchmarks.results compare OLD.json NEW.json [--threshold 10]
+    python -m benchmarks.results list
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Dict, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# Only results with these suffixes are compared (all of them: lower is better); counts are informational
+MEASUREMENT_SUFFIXES = ("_seconds", "_mb")
+
+
+def git_commit() -> Optional[str]:
+    # Short hash of HEAD, with a "+dirty" suffix if the working tree has uncommitted changes
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return commit + ("+dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(benchmark: str, results: Dict, parameters: Optional[Dict] = None) -> str:
+    """
+    Write benchmark results with the commit, time and platform they were measured on. Returns the file path.
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    commit = git_commit()
+    record = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "timestamp": now.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": parameters or {},
+        "results": results,
+    }
+    name = f"{benchmark}-{now:%Y%m%d-%H%M%S}-{(commit or 'unknown').replace('+', '-')}.json"
+    path = os.path.join(RESULTS_DIR, name)
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and name.endswith(MEASUREMENT_SUFFIXES):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str, threshold: float = 10.0) -> int:
+    """
+    Print the relative change of every measured result.
+    Returns the number of results that got worse by more than `threshold` percent.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["benchmark"] != new["benchmark"]:
+        raise SystemExit(f"Cannot compare {old['benchmark']} results with {new['benchmark']} results")
+    print(f"{old['benchmark']}: {old['commit']} ({old['timestamp']}) -> {new['commit']} ({new['timestamp']})")
+    old_values, new_values = _flatten(old["results"]), _flatten(new["results"])
+    regressions = 0
+    print(f"{'result':<50} {'old':>12} {'new':>12} {'change':>8}")
+    for name in sorted(old_values.keys() & new_values.keys()):
+        before, after = old_values[name], new_values[name]
+        change = (after - before) / before * 100 if before else 0.0
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            marker = "  improved"
+        print(f"{name:<50} {before:>12.6g} {after:>12.6g} {change:>+7.1f}%{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="percent change reported as regression")
+    commands.add_parser("list", help="list stored result files")
+    args = parser.parse_args()
+    if args.command == "list":
+        for path in sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json"))):
+            print(os.path.relpath(path))
+        return
+    sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Local SMTP sink for benchmarks and load tests: accepts every message (and any login) and keeps it in memory.
+
+Usage (from the repository root):
+    python -m benchmarks.smtp_sink [--port 8025]
+Then run the service with SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false.
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from typing import List, NamedTuple, Optional
+
+
+class ReceivedMessage(NamedTuple):
+    received_at: float  # wall-clock time the message was accepted
+    subject: str
+    body: str
+
+
+class SMTPSink:
+    """
+    Minimal threaded SMTP server speaking just enough of the protocol for smtplib:
+    EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP and QUIT. STARTTLS is not supported.
+    """
+
+    def __init__(self, port: int = 0):
+        self.messages: List[ReceivedMessage] = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def received(self) -> List[ReceivedMessage]:
+        with self._lock:
+            return list(self.messages)
+
+    def _store(self, data: bytes) -> None:
+        message = message_from_bytes(data)
+        body = message.get_payload(decode=True) or b""
+        received = ReceivedMessage(time.time(), message.get("Subject", ""), body.decode(errors="replace"))
+        with self._lock:
+            self.messages.append(received)
+
+    def _handler_class(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                self.reply("220 smtp-sink ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line[:4].upper()
+                    if command in (b"EHLO", b"HELO"):
+                        self.wfile.write(b"250-smtp-sink\r\n250 AUTH PLAIN LOGIN\r\n")
+                    elif command == b"AUTH":
+                        self.reply("235 Authentication successful")
+                    elif command == b"DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        self.receive_data()
+                    elif command == b"QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("250 OK")
+
+            def receive_data(self):
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b".\r\n":
+                        break
+                    # Undo dot-stuffing
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                sink._store(b"".join(lines))
+                self.reply("250 OK: message accepted")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    sink = SMTPSink(args.port).start()
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port}, press Ctrl+C to stop")
+    seen = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            messages = sink.received()
+            for message in messages[seen:]:
+                print(f"{time.strftime('%H:%M:%S', time.localtime(message.received_at))} {message.subject}")
+            seen = len(messages)
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
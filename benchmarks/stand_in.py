@@ -0,0 +1,184 @@
+"""
+Local stand-in for the Tradegate order book pages, for benchmarks and load tests.
+
+Serves a recorded orderbuch_umsaetze.php page from benchmarks/fixtures for every ISIN, with the price of the
+first trade row replaced by the price configured for that ISIN. Latency, error rate and slow responses are
+configurable. Point the service at it with TRADEGATE_BASE_URL=http://127.0.0.1:<port>.
+
+Usage (from the repository root):
+    python -m benchmarks.stand_in [--port 8080] [--latency 0.05] [--error-rate 0.01]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+DEFAULT_FIXTURE = os.path.join(FIXTURES_DIR, "orderbuch_umsaetze_US69608A1088.html")
+
+# Price cell of the first trade row: the last right-aligned cell before the first </tr> of the trades table
+_FIRST_PRICE_PATTERN = re.compile(
+    rb'(<tbody id="umsaetze_body">.*?<tr[^>]*>.*?)(<td class="right">)([^<]*?)(&nbsp;</td></tr>)', re.S
+)
+
+
+def load_template(path: str = DEFAULT_FIXTURE):
+    """
+    Split a recorded page around the price of its first trade row. Returns (prefix, suffix).
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    match = _FIRST_PRICE_PATTERN.search(content)
+    if match is None:
+        raise ValueError(f"No trade row found in {path}")
+    return content[: match.start(3)], content[match.end(3) :]
+
+
+def default_price(isin: str) -> float:
+    # Stable pseudo-random price between 10 and 500 per ISIN
+    digest = hashlib.blake2b(isin.encode(), digest_size=4).digest()
+    return 10 + int.from_bytes(digest, "big") % 49000 / 100
+
+
+class TradegateStandIn:
+    """
+    Threaded HTTP server answering /orderbuch_umsaetze.php?isin=... like Tradegate.
+    Every response is delayed by `latency` (+/- `jitter`) seconds; a `slow_rate` fraction is delayed by
+    `slow_latency` instead and an `error_rate` fraction is answered with 500 Internal Server Error.
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 5.0,
+        price: Callable[[str], float] = default_price,
+        fixture: str = DEFAULT_FIXTURE,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.price = price
+        self.prices: Dict[str, float] = {}  # overrides of `price` per ISIN
+        self.first_served: Dict[str, float] = {}  # ISIN -> wall-clock time of its first successful response
+        self.requests = 0
+        self.errors = 0
+        self._prefix, self._suffix = load_template(fixture)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "TradegateStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tradegate-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def page(self, isin: str) -> bytes:
+        price = self.prices.get(isin)
+        if price is None:
+            price = self.price(isin)
+        price_text = f"{price:.3f}".replace(".", ",")
+        return self._prefix + price_text.encode() + self._suffix
+
+    def _plan(self):
+        # Decide delay and outcome of one response
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            failed = roll < self.error_rate
+            if failed:
+                self.errors += 1
+            slow = self._random.random() < self.slow_rate
+            jitter = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        delay = self.slow_latency if slow else max(0.0, self.latency + jitter)
+        return delay, failed
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                isin = parse_qs(url.query).get("isin", [""])[0]
+                if url.path != "/orderbuch_umsaetze.php" or not isin:
+                    self._respond(404, b"Not Found")
+                    return
+                delay, failed = stand_in._plan()
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    self._respond(500, b"Internal Server Error")
+                    return
+                self._respond(200, stand_in.page(isin), "text/html; charset=utf-8")
+                with stand_in._lock:
+                    stand_in.first_served.setdefault(isin, time.time())
+
+            def _respond(self, status: int, body: bytes, content_type: str = "text/plain"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of slow responses")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="seconds a slow response takes")
+    args = parser.parse_args()
+    stand_in = TradegateStandIn(
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+    ).start()
+    print(f"Serving Tradegate stand-in at {stand_in.base_url}, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stand_in.stop()
+
+
+if __name__ == "__main__":
+    main()
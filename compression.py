@@ -0,0 +1,36 @@
+import gzip
+import os
+
+from flask import Response, request
+
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))  # 1 (fastest) to 9 (smallest)
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))  # smaller responses are sent uncompressed
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/html", "text/plain", "text/css", "text/javascript")
+
+
+def accepts_gzip() -> bool:
+    return request.accept_encodings["gzip"] > 0
+
+
+def compress_response(response: Response) -> Response:
+    """
+    after_request hook: gzip-compress buffered text and JSON responses for clients that accept it.
+    Streamed responses, files and responses that already carry a Content-Encoding are left alone.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or not accepts_gzip()
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(body, GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
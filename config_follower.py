@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from typing import Iterable, Optional, Set
+
+import requests
+
+from config_manager import ConfigStore
+from http_client import HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://127.0.0.1:5000")  # front end whose config workers follow
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "5"))  # seconds between config checks of a worker
+
+
+class ConfigFollower:
+    """
+    Keeps a worker's config store in sync with the front end, which is the only process that writes the config.
+    The config is polled with If-None-Match, so an unchanged config costs a 304 without a body.
+    Deactivations after one-shot alerts are applied locally at once and sent to the front end
+    through the bulk API, retried until the front end accepted them.
+    """
+
+    def __init__(self, store: ConfigStore, url: str = FRONTEND_URL, interval: float = CONFIG_POLL_INTERVAL):
+        self._store = store
+        self._url = url.rstrip("/")
+        self._interval = interval
+        self._session = requests.Session()
+        self._etag: Optional[str] = None
+        self._pending_deactivations: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config-follower", daemon=True)
+
+    def start(self) -> None:
+        """
+        Load the front end's config once (waiting for the front end if needed) and keep following it.
+        """
+        while not self._stop.is_set() and not self.refresh():
+            logger.info(f"Waiting for the front end at {self._url}...")
+            self._stop.wait(self._interval)
+        self._thread.start()
+        logger.info(f"Following the config of {self._url} every {self._interval}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        # Last attempt to hand deactivations to the front end
+        self._push_deactivations()
+        self._session.close()
+
+    def deactivate(self, isins: Iterable[str]) -> None:
+        """
+        Deactivate ISINs locally right away and on the front end in the background.
+        """
+        isins = set(isins)
+        with self._lock:
+            self._pending_deactivations |= isins
+        self._store.set_active(isins, False)
+        self._wakeup.set()
+
+    def refresh(self) -> bool:
+        """
+        Fetch the config if it changed since the last fetch. Returns False if the front end could not be reached.
+        """
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        try:
+            response = self._session.get(f"{self._url}/api/config", headers=headers, timeout=HTTP_TIMEOUT)
+            if response.status_code == 304:
+                return True
+            response.raise_for_status()
+            config = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Could not fetch the config from {self._url}: {e}")
+            return False
+        with self._lock:
+            pending = set(self._pending_deactivations)
+        # Deactivations the front end has not applied yet stay inactive here
+        for data in config:
+            if data.get("isin") in pending:
+                data["active"] = False
+        self._store.load(config)
+        self._etag = response.headers.get("ETag")
+        logger.info(f"Loaded {len(config)} config entries from {self._url}")
+        return True
+
+    def _push_deactivations(self) -> None:
+        with self._lock:
+            isins = sorted(self._pending_deactivations)
+        if not isins:
+            return
+        try:
+            response = self._session.post(
+                f"{self._url}/api/config/bulk",
+                json=[{"op": "activate", "isin": isin, "active": False} for isin in isins],
+                timeout=HTTP_TIMEOUT,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Could not send {len(isins)} deactivation(s) to {self._url}, retrying: {e}")
+            return
+        with self._lock:
+            self._pending_deactivations -= set(isins)
+        logger.info(f"Sent {len(isins)} deactivation(s) to {self._url}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._push_deactivations()
+            self.refresh()
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
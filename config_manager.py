@@ -1,17 +1,30 @@
 import json
 import logging
 import os
+import tempfile
 import threading
-from typing import Dict, List
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from metrics import CONFIG_LOCK_WAIT_SECONDS
 
 logger = logging.getLogger(__name__)
 
 CONFIG_PATH = os.getenv("CONFIG_PATH", "config.json")
 
 
+def journal_path(path: str = CONFIG_PATH) -> str:
+    """
+    Path of the append-only change journal that belongs to the config file at `path`.
+    """
+    return path + ".journal"
+
+
 def load_config(path: str = CONFIG_PATH) -> List[Dict]:
     """
     Load the configuration from a JSON file at the given path (defaults to CONFIG_PATH).
+    Changes recorded in the change journal next to it (if any) are replayed on top.
     Returns a list of ISIN config dicts.
     Logs the number of ISINs loaded.
     """
@@ -19,25 +32,359 @@ def load_config(path: str = CONFIG_PATH) -> List[Dict]:
         with open(path, "r") as f:
             config = json.load(f)
             logger.info(f"Loaded config from {path} with {len(config)} ISIN(s)")
-            return config
     except FileNotFoundError:
         logger.error(f"Config file not found: {path}")
         exit(1)
     except json.JSONDecodeError as e:
         logger.error(f"Error parsing config file '{path}': {e}")
         exit(1)
+    return replay_journal(config, journal_path(path))
+
+
+def replay_journal(config: List[Dict], path: str) -> List[Dict]:
+    """
+    Apply the records of a change journal to a list of ISIN config dicts.
+    Each journal line is either {"op": "put", "entry": {...}} or {"op": "delete", "isin": "..."}.
+    A truncated or corrupt line (e.g. from a crash during an append) ends the replay.
+    """
+    if not os.path.exists(path):
+        return config
+    by_isin = {entry["isin"]: entry for entry in config}
+    replayed = 0
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if record["op"] == "put":
+                    by_isin[record["entry"]["isin"]] = record["entry"]
+                elif record["op"] == "delete":
+                    by_isin.pop(record["isin"], None)
+                else:
+                    raise ValueError(f"unknown op {record['op']!r}")
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring config journal '{path}' from line {line_no} on: {e}")
+                break
+            replayed += 1
+    logger.info(f"Replayed {replayed} change(s) from config journal {path}")
+    return list(by_isin.values())
 
 
 def save_config(config: List[Dict], path: str = CONFIG_PATH) -> None:
     """
     Save the configuration to a JSON file at the given path (defaults to CONFIG_PATH).
+    The file is written to a temporary file in the same directory and renamed over the old one,
+    so readers and crashes never see a half-written config.
     Logs the number of ISINs saved.
     """
-    with open(path, "w") as f:
-        json.dump(config, f, indent=2)
+    directory = os.path.dirname(os.path.abspath(path))
+    with _save_lock:
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(config, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file as owner-only; keep the permissions of the file being replaced
+            try:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
     logger.info(f"Saved config to {path} with {len(config)} ISIN(s)")
 
 
+_save_lock = threading.Lock()
+
+
+class ConfigEntry:
+    """
+    Immutable config record for one ISIN. Use `replace` to derive a changed copy.
+    """
+
+    __slots__ = (
+        "isin",
+        "upper_threshold",
+        "lower_threshold",
+        "active",
+        "poll_interval",
+        "pct_change_open",
+        "pct_change_alert",
+        "trailing_stop_pct",
+        "ma_short",
+        "ma_long",
+        "rearm_pct",
+    )
+    # Optional fields are only written to config.json when set
+    _OPTIONAL_FIELDS = (
+        "poll_interval",
+        "pct_change_open",
+        "pct_change_alert",
+        "trailing_stop_pct",
+        "ma_short",
+        "ma_long",
+        "rearm_pct",
+    )
+
+    def __init__(
+        self,
+        isin: str,
+        upper_threshold: Optional[float] = None,
+        lower_threshold: Optional[float] = None,
+        active: bool = True,
+        poll_interval: Optional[float] = None,
+        pct_change_open: Optional[float] = None,
+        pct_change_alert: Optional[float] = None,
+        trailing_stop_pct: Optional[float] = None,
+        ma_short: Optional[int] = None,
+        ma_long: Optional[int] = None,
+        rearm_pct: Optional[float] = None,
+    ):
+        object.__setattr__(self, "isin", isin)
+        object.__setattr__(self, "upper_threshold", upper_threshold)
+        object.__setattr__(self, "lower_threshold", lower_threshold)
+        object.__setattr__(self, "active", active)
+        object.__setattr__(self, "poll_interval", poll_interval)
+        object.__setattr__(self, "pct_change_open", pct_change_open)
+        object.__setattr__(self, "pct_change_alert", pct_change_alert)
+        object.__setattr__(self, "trailing_stop_pct", trailing_stop_pct)
+        object.__setattr__(self, "ma_short", ma_short)
+        object.__setattr__(self, "ma_long", ma_long)
+        object.__setattr__(self, "rearm_pct", rearm_pct)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigEntry is immutable, use replace()")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"ConfigEntry({fields})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ConfigEntry):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ConfigEntry":
+        """
+        Create an entry from a config.json record. A missing 'active' field defaults to True.
+        """
+        return cls(
+            isin=data["isin"],
+            upper_threshold=data.get("upper_threshold"),
+            lower_threshold=data.get("lower_threshold"),
+            active=data.get("active", True),
+            **{name: data.get(name) for name in cls._OPTIONAL_FIELDS},
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in self._OPTIONAL_FIELDS or getattr(self, name) is not None
+        }
+
+    def replace(self, **changes) -> "ConfigEntry":
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return ConfigEntry(**fields)
+
+
+class ConfigChange(NamedTuple):
+    isin: str
+    old: Optional[ConfigEntry]  # None if the ISIN was added
+    new: Optional[ConfigEntry]  # None if the ISIN was deleted
+
+
+class _State(NamedTuple):
+    version: int
+    index: Dict[str, ConfigEntry]  # ISIN -> entry, in insertion order; never mutated once published
+    entries: Tuple[ConfigEntry, ...]
+
+
+class ConfigTransaction:
+    """
+    Batch of changes applied to a private copy of the ISIN index and published atomically on commit.
+    """
+
+    def __init__(self, index: Dict[str, ConfigEntry]):
+        self._index = index
+        self._copied = False
+        self.changes: List[ConfigChange] = []
+
+    def _writable(self) -> Dict[str, ConfigEntry]:
+        if not self._copied:
+            self._index = dict(self._index)
+            self._copied = True
+        return self._index
+
+    def get(self, isin: str) -> Optional[ConfigEntry]:
+        return self._index.get(isin)
+
+    def __contains__(self, isin: str) -> bool:
+        return isin in self._index
+
+    def put(self, entry: ConfigEntry) -> Optional[ConfigEntry]:
+        """
+        Add or replace the entry for `entry.isin`. Returns the previous entry, if any.
+        """
+        old = self._index.get(entry.isin)
+        if old != entry:
+            self._writable()[entry.isin] = entry
+            self.changes.append(ConfigChange(entry.isin, old, entry))
+        return old
+
+    def update(self, isin: str, **changes) -> Optional[ConfigEntry]:
+        """
+        Change fields of an existing entry. Returns the new entry, or None if the ISIN is unknown.
+        """
+        old = self._index.get(isin)
+        if old is None:
+            return None
+        new = old.replace(**changes)
+        self.put(new)
+        return new
+
+    def delete(self, isin: str) -> Optional[ConfigEntry]:
+        """
+        Remove the entry for an ISIN. Returns the removed entry, or None if the ISIN is unknown.
+        """
+        if isin not in self._index:
+            return None
+        old = self._writable().pop(isin)
+        self.changes.append(ConfigChange(isin, old, None))
+        return old
+
+
+class ConfigStore:
+    """
+    Thread-safe, ISIN-indexed config store using copy-on-write snapshots.
+    Writers are serialized by a lock and publish a new immutable snapshot with an incremented version;
+    readers (the monitoring loop, API and admin UI) never take the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = _State(0, {}, ())
+        self._listeners: List[Callable[[int, List[ConfigChange]], None]] = []
+
+    @property
+    def version(self) -> int:
+        """
+        Incremented on every committed change; compare versions to detect config changes cheaply.
+        """
+        return self._state.version
+
+    def __len__(self) -> int:
+        return len(self._state.entries)
+
+    def get(self, isin: str) -> Optional[ConfigEntry]:
+        return self._state.index.get(isin)
+
+    def __contains__(self, isin: str) -> bool:
+        return isin in self._state.index
+
+    def snapshot(self) -> Tuple[ConfigEntry, ...]:
+        """
+        Return all entries as an immutable tuple, consistent as of one version.
+        """
+        return self._state.entries
+
+    def versioned_snapshot(self) -> Tuple[int, Tuple[ConfigEntry, ...]]:
+        state = self._state
+        return state.version, state.entries
+
+    def active_entries(self) -> List[ConfigEntry]:
+        return [entry for entry in self._state.entries if entry.active]
+
+    def to_list(self) -> List[Dict]:
+        """
+        Return the config as a list of dicts in config.json format.
+        """
+        return [entry.to_dict() for entry in self._state.entries]
+
+    def subscribe(self, listener: Callable[[int, List[ConfigChange]], None]) -> None:
+        """
+        Register a callback invoked with (version, changes) after every commit.
+        Listeners run while the writer lock is held, so they see commits in order and must return quickly.
+        """
+        self._listeners.append(listener)
+
+    @contextmanager
+    def transaction(self) -> Iterator[ConfigTransaction]:
+        """
+        Apply several changes under one lock acquisition and publish them as one new version.
+        Nothing is published if the block raises.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            CONFIG_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+            txn = ConfigTransaction(self._state.index)
+            yield txn
+            if txn.changes:
+                self._publish(txn._index, txn.changes)
+
+    def _publish(self, index: Dict[str, ConfigEntry], changes: List[ConfigChange]) -> None:
+        version = self._state.version + 1
+        self._state = _State(version, index, tuple(index.values()))
+        for listener in self._listeners:
+            try:
+                listener(version, changes)
+            except Exception as e:
+                logger.error(f"Config listener {listener!r} failed: {e}", exc_info=True)
+
+    def load(self, config: Iterable[Dict]) -> None:
+        """
+        Replace the whole config with the given config.json records.
+        """
+        entries = [ConfigEntry.from_dict(data) for data in config]
+        isins = {entry.isin for entry in entries}
+        with self.transaction() as txn:
+            for isin in list(txn._index):
+                if isin not in isins:
+                    txn.delete(isin)
+            for entry in entries:
+                txn.put(entry)
+
+    def add(self, entry: ConfigEntry) -> bool:
+        """
+        Add a new entry. Returns False if the ISIN already exists.
+        """
+        with self.transaction() as txn:
+            if entry.isin in txn:
+                return False
+            txn.put(entry)
+            return True
+
+    def update(self, isin: str, **changes) -> Optional[ConfigEntry]:
+        """
+        Change fields of an existing entry. Returns the new entry, or None if the ISIN is unknown.
+        """
+        with self.transaction() as txn:
+            return txn.update(isin, **changes)
+
+    def delete(self, isin: str) -> bool:
+        """
+        Remove an entry. Returns False if the ISIN is unknown.
+        """
+        with self.transaction() as txn:
+            return txn.delete(isin) is not None
+
+    def set_active(self, isins: Iterable[str], active: bool) -> List[str]:
+        """
+        Set the active flag of several ISINs in one commit. Returns the ISINs that exist in the config.
+        """
+        updated = []
+        with self.transaction() as txn:
+            for isin in isins:
+                if txn.update(isin, active=active) is not None:
+                    updated.append(isin)
+        return updated
+
+
 # Thread-safe shared config
-shared_config: List[Dict] = []
-config_lock = threading.Lock()
+config_store = ConfigStore()
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config_manager import CONFIG_PATH, ConfigChange, ConfigEntry, ConfigStore, journal_path, save_config
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SAVE_DEBOUNCE = float(os.getenv("CONFIG_SAVE_DEBOUNCE", "1.0"))  # seconds to coalesce changes before writing
+CONFIG_JOURNAL = os.getenv("CONFIG_JOURNAL", "false").lower() in ("1", "true", "yes")
+CONFIG_JOURNAL_MAX_ENTRIES = int(os.getenv("CONFIG_JOURNAL_MAX_ENTRIES", "1000"))  # records before compaction
+
+
+class ConfigPersister:
+    """
+    Persists config store changes in a background thread.
+    Changes are coalesced over a debounce window and then written either as a full atomic rewrite
+    of the config file or, in journal mode, appended to a change journal that is compacted into the
+    config file once it grows beyond `journal_max_entries` records (and on shutdown).
+    """
+
+    def __init__(
+        self,
+        store: ConfigStore,
+        path: str = CONFIG_PATH,
+        debounce: float = CONFIG_SAVE_DEBOUNCE,
+        journal: bool = CONFIG_JOURNAL,
+        journal_max_entries: int = CONFIG_JOURNAL_MAX_ENTRIES,
+    ):
+        self._store = store
+        self._path = path
+        self._journal_path = journal_path(path)
+        self._debounce = debounce
+        self._journal = journal
+        self._journal_max_entries = max(1, journal_max_entries)
+        self._journal_entries = self._count_journal_entries()
+        self._pending: Dict[str, Optional[ConfigEntry]] = {}  # ISIN -> latest entry, None if deleted
+        self._dirty_since: Optional[float] = None
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="config-persister", daemon=True)
+        store.subscribe(self._on_change)
+
+    def _count_journal_entries(self) -> int:
+        try:
+            with open(self._journal_path, "rb") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def start(self) -> None:
+        self._thread.start()
+        mode = f"journal {self._journal_path}" if self._journal else "full rewrites"
+        logger.info(f"Config persister started for {self._path} ({mode}, debounce {self._debounce}s)")
+
+    def _on_change(self, version: int, changes: List[ConfigChange]) -> None:
+        # Called by the store under its writer lock: only record the change and wake the writer thread
+        with self._condition:
+            for change in changes:
+                self._pending[change.isin] = change.new
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._dirty_since is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                # Coalesce everything that arrives within the debounce window into one write
+                remaining = self._dirty_since + self._debounce - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                pending = self._take_pending()
+            try:
+                self._write(pending)
+            except Exception as e:
+                logger.error(f"Failed to persist config to {self._path}: {e}", exc_info=True)
+                # Keep the changes so the next write retries them
+                with self._condition:
+                    for isin, entry in pending.items():
+                        self._pending.setdefault(isin, entry)
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                    self._condition.wait(self._debounce)
+
+    def _take_pending(self) -> Dict[str, Optional[ConfigEntry]]:
+        pending = self._pending
+        self._pending = {}
+        self._dirty_since = None
+        return pending
+
+    def _write(self, pending: Dict[str, Optional[ConfigEntry]]) -> None:
+        if not pending:
+            return
+        if not self._journal or self._journal_entries + len(pending) > self._journal_max_entries:
+            self.compact()
+            return
+        with open(self._journal_path, "a") as f:
+            for isin, entry in pending.items():
+                if entry is None:
+                    record = {"op": "delete", "isin": isin}
+                else:
+                    record = {"op": "put", "entry": entry.to_dict()}
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += len(pending)
+        logger.info(f"Appended {len(pending)} change(s) to config journal {self._journal_path}")
+
+    def compact(self) -> None:
+        """
+        Write the full current config atomically and drop the change journal.
+        Journal records newer than the written snapshot are re-applied idempotently on the next load.
+        """
+        save_config(self._store.to_list(), self._path)
+        if self._journal_entries:
+            try:
+                os.unlink(self._journal_path)
+            except FileNotFoundError:
+                pass
+            logger.info(f"Compacted config journal {self._journal_path} into {self._path}")
+            self._journal_entries = 0
+
+    def stop(self) -> None:
+        """
+        Stop the writer thread and write any pending changes as a compacted full config file.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._condition:
+            pending = self._take_pending()
+        if pending or self._journal_entries:
+            self.compact()
@@ -0,0 +1,204 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from compression import GZIP_LEVEL
+from config_manager import ConfigEntry, ConfigStore, config_store
+from health import CLOSED, HALF_OPEN, OPEN, health_tracker
+from price_cache import price_cache
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PAGE_SIZE = int(os.getenv("CONFIG_PAGE_SIZE", "100"))  # default rows per admin page
+CONFIG_MAX_PAGE_SIZE = int(os.getenv("CONFIG_MAX_PAGE_SIZE", "1000"))  # max rows per API or admin page
+
+SORT_FIELDS = ("isin", "upper_threshold", "lower_threshold", "poll_interval", "active")
+UNCHECKED = "unchecked"  # health filter for ISINs without a circuit breaker yet
+HEALTH_STATES = (CLOSED, OPEN, HALF_OPEN, UNCHECKED)
+TRIGGERED = "triggered"  # last known price is at or beyond a threshold
+CLEAR = "clear"
+ALERT_STATES = (TRIGGERED, CLEAR)
+_TRUE = ("1", "true", "yes")
+_FALSE = ("0", "false", "no")
+
+
+class ConfigQuery(NamedTuple):
+    """
+    Filter, sort order and page of a config listing. `per_page` None returns all matching entries.
+    """
+
+    active: Optional[bool] = None
+    prefix: str = ""
+    health: Optional[str] = None
+    alert: Optional[str] = None
+    sort: Optional[str] = None  # None keeps the config file order
+    descending: bool = False
+    page: int = 1
+    per_page: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str], per_page: Optional[int] = None) -> "ConfigQuery":
+        """
+        Parse query string arguments: active, prefix, health, alert, sort (a field, "-" prefix for descending),
+        page and per_page. Raises ValueError for invalid values.
+        """
+        active = args.get("active", "").lower()
+        if active and active not in _TRUE + _FALSE:
+            raise ValueError("active must be true or false")
+        health = args.get("health") or None
+        if health is not None and health not in HEALTH_STATES:
+            raise ValueError(f"health must be one of: {', '.join(HEALTH_STATES)}")
+        alert = args.get("alert") or None
+        if alert is not None and alert not in ALERT_STATES:
+            raise ValueError(f"alert must be one of: {', '.join(ALERT_STATES)}")
+        sort = args.get("sort") or None
+        descending = sort is not None and sort.startswith("-")
+        sort = sort.lstrip("-") if sort is not None else None
+        if sort is not None and sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+        page = int(args.get("page") or 1)
+        if args.get("per_page"):
+            per_page = int(args["per_page"])
+        if page < 1 or (per_page is not None and not 1 <= per_page <= CONFIG_MAX_PAGE_SIZE):
+            raise ValueError(f"page must be at least 1 and per_page between 1 and {CONFIG_MAX_PAGE_SIZE}")
+        if per_page is None and page > 1:
+            raise ValueError("page requires per_page")
+        return cls(
+            active=(active in _TRUE) if active else None,
+            prefix=args.get("prefix", "").strip().upper(),
+            health=health,
+            alert=alert,
+            sort=sort,
+            descending=descending,
+            page=page,
+            per_page=per_page,
+        )
+
+    @property
+    def versioned(self) -> bool:
+        """
+        True if the result depends on the config version only (not on prices or health), so it can be cached.
+        """
+        return self.health is None and self.alert is None
+
+    @property
+    def is_full(self) -> bool:
+        # The whole config in its stored order
+        return self == ConfigQuery()
+
+    def cache_key(self) -> str:
+        active = "" if self.active is None else str(self.active).lower()
+        order = ("-" if self.descending else "") + (self.sort or "")
+        return f"{active}:{self.prefix}:{order}:{self.page}:{self.per_page or ''}"
+
+
+class ConfigPage(NamedTuple):
+    version: int
+    total: int  # matching entries on all pages
+    entries: List[ConfigEntry]
+
+
+class _Cached:
+    """
+    Everything derived from one config version: the serialized config.json list (plain and gzip-compressed,
+    the latter built on first use) and the entries in each requested sort order.
+    """
+
+    __slots__ = ("version", "entries", "json", "_gzip", "_orders", "_lock")
+
+    def __init__(self, version: int, entries: Tuple[ConfigEntry, ...]):
+        self.version = version
+        self.entries = entries
+        # Same layout as Flask's jsonify: sorted keys, no whitespace
+        self.json = json.dumps([entry.to_dict() for entry in entries], sort_keys=True, separators=(",", ":")).encode()
+        self._gzip: Optional[bytes] = None
+        self._orders: Dict[Tuple[str, bool], List[ConfigEntry]] = {}
+        self._lock = threading.Lock()
+
+    def gzip(self) -> bytes:
+        with self._lock:
+            if self._gzip is None:
+                self._gzip = gzip.compress(self.json, GZIP_LEVEL)
+            return self._gzip
+
+    def ordered(self, sort: str, descending: bool) -> List[ConfigEntry]:
+        key = (sort, descending)
+        with self._lock:
+            order = self._orders.get(key)
+            if order is None:
+                # Entries without a value sort last in both directions
+                present = [entry for entry in self.entries if getattr(entry, sort) is not None]
+                missing = [entry for entry in self.entries if getattr(entry, sort) is None]
+                present.sort(key=lambda entry: (getattr(entry, sort), entry.isin), reverse=descending)
+                order = self._orders[key] = present + missing
+            return order
+
+
+class ConfigView:
+    """
+    Read side of the config store for the API and admin UI: filtered, sorted and paginated listings,
+    with everything that depends only on the config version cached until the next change.
+    """
+
+    def __init__(self, store: ConfigStore):
+        self._store = store
+        self._cached: Optional[_Cached] = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> _Cached:
+        version, entries = self._store.versioned_snapshot()
+        cached = self._cached
+        if cached is not None and cached.version == version:
+            return cached
+        with self._lock:
+            # Another request may have rebuilt it while this one waited
+            if self._cached is None or self._cached.version != version:
+                self._cached = _Cached(version, entries)
+                logger.debug(f"Rebuilt config listing cache for version {version} ({len(entries)} ISIN(s))")
+            return self._cached
+
+    def full_json(self, compressed: bool = False) -> Tuple[int, int, bytes]:
+        """
+        Return (version, number of entries, the whole config as config.json bytes), gzip-compressed if requested.
+        """
+        cached = self._current()
+        return cached.version, len(cached.entries), cached.gzip() if compressed else cached.json
+
+    def query(self, query: ConfigQuery) -> ConfigPage:
+        cached = self._current()
+        entries = cached.ordered(query.sort, query.descending) if query.sort is not None else cached.entries
+        if query.active is not None:
+            entries = [entry for entry in entries if entry.active == query.active]
+        if query.prefix:
+            entries = [entry for entry in entries if entry.isin.startswith(query.prefix)]
+        if query.health is not None:
+            states = health_tracker.states()
+            entries = [entry for entry in entries if states.get(entry.isin, UNCHECKED) == query.health]
+        if query.alert is not None:
+            entries = [entry for entry in entries if alert_state(entry) == query.alert]
+        total = len(entries)
+        if query.per_page is not None:
+            start = (query.page - 1) * query.per_page
+            entries = entries[start : start + query.per_page]
+        return ConfigPage(cached.version, total, list(entries))
+
+
+def alert_state(entry: ConfigEntry) -> str:
+    """
+    TRIGGERED if the last known price of the entry is at or beyond one of its thresholds, else CLEAR.
+    """
+    cached = price_cache.get(entry.isin)
+    if cached is None:
+        return CLEAR
+    if entry.upper_threshold is not None and cached.price >= entry.upper_threshold:
+        return TRIGGERED
+    if entry.lower_threshold is not None and cached.price <= entry.lower_threshold:
+        return TRIGGERED
+    return CLEAR
+
+
+# Shared listing cache of the shared config store
+config_view = ConfigView(config_store)
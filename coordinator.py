@@ -0,0 +1,276 @@
+import bisect
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+# Stable name of this worker, required in worker mode: its email spool and runtime state are found by it after a restart
+WORKER_ID = os.getenv("WORKER_ID", "")
+COORDINATION_DB = os.getenv("COORDINATION_DB", "coordination.db")  # SQLite file shared by all workers
+WORKER_LEASE = float(os.getenv("WORKER_LEASE", "30"))  # seconds a heartbeat or ISIN lease stays valid
+WORKER_VNODES = int(os.getenv("WORKER_VNODES", "64"))  # points per worker on the hash ring
+
+# A lease counts as lost this many seconds before it expires, covering clock skew between processes
+_LEASE_MARGIN = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL, started REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (isin TEXT PRIMARY KEY, worker_id TEXT, expires REAL NOT NULL, state TEXT);
+CREATE INDEX IF NOT EXISTS leases_worker ON leases (worker_id);
+"""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring: every member owns the keys between its points and the previous point.
+    Adding or removing a member only moves the keys of the ring segments it takes or gives up.
+    """
+
+    def __init__(self, members: Iterable[str], vnodes: int = WORKER_VNODES):
+        points = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(max(1, vnodes)))
+        self._hashes = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._members[index]
+
+
+class Coordinator:
+    """
+    Partitions the ISINs across worker processes that share a SQLite database.
+    Every worker heartbeats in the `workers` table; the live workers form a consistent hash ring that
+    decides which worker should own each ISIN. Ownership itself is a lease per ISIN in the `leases` table:
+    a worker polls and alerts an ISIN only while it holds the lease, and it claims an ISIN only once the
+    previous owner released it or its lease expired, so no two workers ever handle the same ISIN.
+    When workers join or leave, ISINs that move are released with their rule state (`state_provider`)
+    so the new owner continues where the old one stopped.
+    """
+
+    def __init__(
+        self,
+        path: str = COORDINATION_DB,
+        worker_id: str = WORKER_ID,
+        lease: float = WORKER_LEASE,
+        vnodes: int = WORKER_VNODES,
+        on_change: Optional[Callable[[], None]] = None,
+        state_provider: Optional[Callable[[Sequence[str]], Dict[str, Dict]]] = None,
+    ):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease = lease
+        self.vnodes = vnodes
+        self._on_change = on_change
+        self._state_provider = state_provider
+        self._isins: Set[str] = set()  # ISINs that need an owner (the active ones)
+        self._held: Set[str] = set()
+        self._lease_until = 0.0
+        self._members: List[str] = []
+        self._handover: Dict[str, Dict] = {}  # rule state received with newly claimed ISINs
+        self._version = 0
+        # Held by the monitoring loop while it alerts, so leases are never released mid-alert
+        self._ownership_lock = threading.RLock()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="coordinator", daemon=True)
+
+    @property
+    def version(self) -> int:
+        """
+        Incremented whenever the set of owned ISINs changes.
+        """
+        return self._version
+
+    def owns(self, isin: str) -> bool:
+        return isin in self._held and time.time() < self._lease_until - _LEASE_MARGIN
+
+    def owned(self) -> Set[str]:
+        """
+        The ISINs this worker holds leases for; `owns` additionally checks that the leases are still valid.
+        """
+        return set(self._held)
+
+    def members(self) -> List[str]:
+        return list(self._members)
+
+    def set_isins(self, isins: Iterable[str]) -> None:
+        """
+        Set the ISINs that need an owner; ownership is updated right away in the background.
+        """
+        with self._lock:
+            self._isins = set(isins)
+        self._wakeup.set()
+
+    def take_handover(self) -> Dict[str, Dict]:
+        """
+        Return and clear the rule state handed over with ISINs claimed since the last call.
+        """
+        with self._lock:
+            handover, self._handover = self._handover, {}
+        return handover
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[None]:
+        """
+        Keep the owned ISINs from being released while the block runs.
+        """
+        with self._ownership_lock:
+            yield
+
+    def _connect(self) -> sqlite3.Connection:
+        # Used by the coordinator thread and by stop(); access is serialized by the ownership lock
+        connection = sqlite3.connect(
+            self.path, timeout=self.lease / 2, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def start(self) -> None:
+        """
+        Register this worker and take ownership of its ISINs once before returning.
+        """
+        self._connection = self._connect()
+        self._cycle()
+        self._thread.start()
+        logger.info(
+            f"Worker {self.worker_id} joined {len(self._members)} worker(s) via {self.path}, "
+            f"owning {len(self._held)} ISIN(s)"
+        )
+
+    def stop(self) -> None:
+        """
+        Leave the ring and release all leases (with their rule state) so other workers take over immediately.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        try:
+            with self._ownership_lock:
+                states = self._states(sorted(self._held))
+                with self._transaction() as connection:
+                    connection.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+                    self._release(connection, self._held, states)
+                self._held = set()
+        except sqlite3.Error as e:
+            logger.error(f"Worker {self.worker_id} could not release its leases: {e}")
+        self._connection.close()
+        logger.info(f"Worker {self.worker_id} left")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.lease / 3)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self._cycle()
+            except sqlite3.Error as e:
+                # Leases run out on their own if this persists; owns() turns False before they expire
+                logger.error(f"Worker {self.worker_id} coordination failed: {e}")
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _states(self, isins: Sequence[str]) -> Dict[str, Dict]:
+        if not isins or self._state_provider is None:
+            return {}
+        try:
+            return self._state_provider(isins)
+        except Exception as e:
+            logger.error(f"Could not export the rule state of released ISINs: {e}", exc_info=True)
+            return {}
+
+    def _release(self, connection: sqlite3.Connection, isins: Iterable[str], states: Dict[str, Dict]) -> None:
+        # Expire the leases right away and leave the rule state for the next owner
+        connection.executemany(
+            "UPDATE leases SET worker_id = NULL, expires = 0, state = ? WHERE isin = ? AND worker_id = ?",
+            [(json.dumps(states[isin]) if isin in states else None, isin, self.worker_id) for isin in isins],
+        )
+
+    def _cycle(self) -> None:
+        # One heartbeat: refresh membership, release ISINs that moved away, claim and renew the own ones
+        with self._lock:
+            isins = set(self._isins)
+        with self._ownership_lock:
+            now = time.time()
+            with self._transaction() as connection:
+                connection.execute(
+                    "INSERT INTO workers (worker_id, heartbeat, started) VALUES (?, ?, ?) "
+                    "ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (self.worker_id, now, now),
+                )
+                connection.execute("DELETE FROM workers WHERE heartbeat < ?", (now - self.lease,))
+                members = sorted(row[0] for row in connection.execute("SELECT worker_id FROM workers"))
+                ring = HashRing(members, self.vnodes)
+                wanted = {isin for isin in isins if ring.owner(isin) == self.worker_id}
+                lost = self._held - wanted
+                if lost:
+                    self._release(connection, lost, self._states(sorted(lost)))
+                expires = now + self.lease
+                connection.execute(
+                    "UPDATE leases SET expires = ? WHERE worker_id = ?", (expires, self.worker_id)
+                )
+                # Claim ISINs that are free or whose owner's lease ran out
+                claimable = sorted(wanted - self._held)
+                connection.executemany(
+                    "INSERT INTO leases (isin, worker_id, expires) VALUES (?, ?, ?) "
+                    "ON CONFLICT (isin) DO UPDATE SET worker_id = excluded.worker_id, expires = excluded.expires "
+                    "WHERE leases.worker_id IS NULL OR leases.expires < ?",
+                    [(isin, self.worker_id, expires, now) for isin in claimable],
+                )
+                held = {row[0] for row in connection.execute("SELECT isin FROM leases WHERE worker_id = ?", (self.worker_id,))}
+                # ISINs no longer configured need no lease
+                connection.executemany(
+                    "DELETE FROM leases WHERE isin = ? AND worker_id = ?",
+                    [(isin, self.worker_id) for isin in held - isins],
+                )
+                held &= isins
+                claimed = held - self._held
+                handover = {}
+                for isin in claimed:
+                    row = connection.execute("SELECT state FROM leases WHERE isin = ?", (isin,)).fetchone()
+                    if row is not None and row[0]:
+                        handover[isin] = json.loads(row[0])
+                if handover:
+                    connection.executemany("UPDATE leases SET state = NULL WHERE isin = ?", [(isin,) for isin in handover])
+            changed = held != self._held
+            if members != self._members:
+                logger.info(f"Workers: {', '.join(members)}")
+            if changed:
+                logger.info(
+                    f"Worker {self.worker_id} owns {len(held)} ISIN(s): claimed {len(claimed)}, released {len(lost)}"
+                    + (f", {len(wanted - held)} waiting for their previous owner" if wanted - held else "")
+                )
+            with self._lock:
+                self._handover.update(handover)
+            self._members = members
+            self._held = held
+            self._lease_until = expires
+            if changed:
+                self._version += 1
+        if changed and self._on_change is not None:
+            self._on_change()
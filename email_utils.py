@@ -2,6 +2,7 @@ import logging
 import os
 import smtplib
 from email.mime.text import MIMEText
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -11,25 +12,71 @@ SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))  # seconds
 
 # Ensure all required environment variables are set
 if not all([EMAIL_TO, EMAIL_FROM, SMTP_SERVER, SMTP_USERNAME, SMTP_PASSWORD]):
     raise Exception("Missing required email environment variables.")
 
 
-def send_email(subject: str, body: str):
-    logger.info(f"Attempting to send email to {EMAIL_TO} with subject: '{subject}'")
+def build_message(subject: str, body: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
     msg["From"] = EMAIL_FROM
     msg["To"] = EMAIL_TO
+    return msg
+
+
+def _open_smtp() -> smtplib.SMTP:
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+        if SMTP_STARTTLS:
             server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.sendmail(EMAIL_FROM, EMAIL_TO, msg.as_string())
-        logger.info(f"Email sent successfully to {EMAIL_TO} with subject: '{subject}'")
-    except smtplib.SMTPException as e:
-        logger.error(f"SMTP error sending email to {EMAIL_TO} with subject: '{subject}': {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending email to {EMAIL_TO} with subject: '{subject}': {e}", exc_info=True)
+        server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class SMTPConnection:
+    """
+    Persistent SMTP connection: STARTTLS and login happen once, and the connection
+    is re-established transparently if the server dropped it in the meantime.
+    Not thread-safe; meant to be owned by a single sender thread.
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+
+    def send(self, msg: MIMEText) -> None:
+        """
+        Send a message, reconnecting once if the connection turns out to be closed.
+        Raises smtplib.SMTPException or OSError if sending fails.
+        """
+        for attempt in (1, 2):
+            if self._server is None:
+                logger.info(f"Opening SMTP connection to {SMTP_SERVER}:{SMTP_PORT}")
+                self._server = _open_smtp()
+            try:
+                self._server.sendmail(EMAIL_FROM, EMAIL_TO, msg.as_string())
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self.close()
+                if attempt == 2:
+                    raise
+                logger.info(f"SMTP connection was closed ({e}), reconnecting")
+            except Exception:
+                self.close()
+                raise
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
@@ -0,0 +1,155 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from config_manager import ConfigChange
+from metrics import STREAM_DROPPED_CLIENTS
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))  # events buffered per client before it is dropped
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "50"))  # concurrent /api/stream connections
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))  # seconds between keep-alive comments
+
+PRICE = "price"
+ALERT = "alert"
+ACTIVE = "active"
+
+
+class Subscription:
+    """
+    One stream client: a bounded queue of formatted events, optionally restricted to a set of ISINs.
+    """
+
+    __slots__ = ("isins", "queue", "dropped")
+
+    def __init__(self, isins: Optional[Set[str]], max_queue: int):
+        self.isins = isins  # None: all ISINs
+        self.queue: "queue.Queue[str]" = queue.Queue(max(1, max_queue))
+        self.dropped = False
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class EventBroker:
+    """
+    Fans out price updates, alerts and active-state changes from the monitoring loop to stream clients.
+    Publishing never blocks: a client whose queue is full is dropped (its stream ends and the browser
+    reconnects) instead of buffering without limit.
+    """
+
+    def __init__(self, max_queue: int = STREAM_QUEUE_SIZE, max_clients: int = STREAM_MAX_CLIENTS):
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self._all: Set[Subscription] = set()  # subscribed to every ISIN
+        self._by_isin: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._listeners: List[Callable[[str, str, Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def subscribe(self, isins: Optional[Iterable[str]] = None) -> Subscription:
+        """
+        Register a client for all ISINs or only the given ones. Raises TooManySubscribers at the client limit.
+        """
+        subscription = Subscription(set(isins) if isins is not None else None, self.max_queue)
+        with self._lock:
+            if self._count >= self.max_clients:
+                raise TooManySubscribers(f"Too many stream clients (max {self.max_clients})")
+            if subscription.isins is None:
+                self._all.add(subscription)
+            else:
+                for isin in subscription.isins:
+                    self._by_isin.setdefault(isin, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def add_listener(self, listener: Callable[[str, str, Dict], None]) -> None:
+        """
+        Call `listener(event, isin, data)` for every published event, whether or not clients are subscribed.
+        Listeners run in the publishing thread and must not block.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._remove(subscription)
+
+    def _remove(self, subscription: Subscription) -> None:
+        if subscription.isins is None:
+            if subscription not in self._all:
+                return
+            self._all.discard(subscription)
+        else:
+            removed = False
+            for isin in subscription.isins:
+                subscribers = self._by_isin.get(isin)
+                if subscribers is not None and subscription in subscribers:
+                    removed = True
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_isin[isin]
+            if not removed:
+                return
+        self._count -= 1
+
+    def publish(self, event: str, isin: str, data: Dict) -> None:
+        """
+        Send one event about an ISIN to every client subscribed to it.
+        """
+        for listener in self._listeners:
+            listener(event, isin, data)
+        if not self._count:
+            return
+        with self._lock:
+            subscribers = list(self._all)
+            subscribers.extend(self._by_isin.get(isin, ()))
+            if not subscribers:
+                return
+            message = f"id: {next(self._ids)}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            for subscription in subscribers:
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    # A slow consumer: end its stream rather than buffer without limit
+                    subscription.dropped = True
+                    self._remove(subscription)
+                    STREAM_DROPPED_CLIENTS.inc()
+                    logger.warning(f"Dropped stream client that fell {self.max_queue} events behind")
+
+    def on_config_change(self, version: int, changes: List[ConfigChange]) -> None:
+        # Config store listener: publish activation, deactivation, addition and deletion of ISINs
+        for change in changes:
+            if change.new is None:
+                self.publish(ACTIVE, change.isin, {"isin": change.isin, "active": False, "deleted": True})
+            elif change.old is None or change.old.active != change.new.active:
+                self.publish(ACTIVE, change.isin, {"isin": change.isin, "active": change.new.active})
+
+    def stream(self, subscription: Subscription, heartbeat: float = STREAM_HEARTBEAT) -> Iterator[str]:
+        """
+        Yield the Server-Sent Events of a subscription, with keep-alive comments while idle.
+        Unsubscribes when the client disconnects (the generator is closed) or is dropped.
+        """
+        try:
+            # Tell the browser how long to wait before reconnecting, e.g. after being dropped
+            yield "retry: 2000\n\n"
+            while not subscription.dropped:
+                try:
+                    yield subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Shared broker of the monitoring loop and the API
+event_broker = EventBroker()
@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Mapping, Optional
+
+from config_manager import ConfigChange
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))  # failed checks before an ISIN is quarantined
+BREAKER_BASE_BACKOFF = float(os.getenv("BREAKER_BASE_BACKOFF", "300"))  # seconds before the first probe, doubled after
+BREAKER_MAX_BACKOFF = float(os.getenv("BREAKER_MAX_BACKOFF", "21600"))  # upper limit for the quarantine period
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Health of one ISIN.
+    closed: checked normally. open: quarantined after repeated instrument failures, not checked until `retry_at`.
+    half_open: `retry_at` has passed and one probe is allowed; success closes the breaker, failure reopens it
+    with a doubled backoff.
+    """
+
+    __slots__ = ("state", "failures", "opens", "opened_at", "retry_at", "last_error", "last_success")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # consecutive failed checks
+        self.opens = 0  # consecutive times the breaker opened, drives the backoff
+        self.opened_at: Optional[float] = None  # wall-clock times (epoch seconds)
+        self.retry_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class HealthTracker:
+    """
+    Per-ISIN circuit breakers plus a counter of consecutive checks in which the price host was unreachable.
+    Only failures caused by the instrument (unknown ISIN, no price on the page) count against a breaker;
+    an unreachable host is a systemic failure and is tracked separately.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        base_backoff: float = BREAKER_BASE_BACKOFF,
+        max_backoff: float = BREAKER_MAX_BACKOFF,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._host_failures = 0
+        self._host_last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def allow(self, isin: str, now: Optional[float] = None) -> bool:
+        """
+        Return True if the ISIN may be checked now. An open breaker whose backoff has expired turns half-open.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            breaker = self._breakers.get(isin)
+            if breaker is None or breaker.state != OPEN:
+                return True
+            if now < breaker.retry_at:
+                return False
+            breaker.state = HALF_OPEN
+            logger.info(f"Circuit breaker for ISIN {isin} is half-open, probing once")
+            return True
+
+    def is_probe(self, isin: str) -> bool:
+        with self._lock:
+            breaker = self._breakers.get(isin)
+            return breaker is not None and breaker.state == HALF_OPEN
+
+    def retry_at(self, isin: str) -> Optional[float]:
+        """
+        Wall-clock time at which a quarantined ISIN may be probed again, or None if its breaker is not open.
+        """
+        with self._lock:
+            breaker = self._breakers.get(isin)
+            return breaker.retry_at if breaker is not None and breaker.state == OPEN else None
+
+    def record_success(self, isin: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._host_failures = 0
+            breaker = self._breakers.get(isin)
+            if breaker is None:
+                breaker = self._breakers[isin] = CircuitBreaker()
+            elif breaker.state != CLOSED:
+                logger.info(f"Circuit breaker for ISIN {isin} closed after successful probe")
+            breaker.state = CLOSED
+            breaker.failures = 0
+            breaker.opens = 0
+            breaker.opened_at = None
+            breaker.retry_at = None
+            breaker.last_success = now
+
+    def record_failure(self, isin: str, error: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        Record a failed check caused by the instrument. Returns the breaker's `retry_at` if it is (re)opened.
+        The host answered, so this also ends a streak of host failures.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._host_failures = 0
+            breaker = self._breakers.setdefault(isin, CircuitBreaker())
+            breaker.failures += 1
+            breaker.last_error = error
+            if breaker.state == HALF_OPEN or breaker.failures >= self.failure_threshold:
+                breaker.opens += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (breaker.opens - 1))
+                breaker.state = OPEN
+                breaker.opened_at = now
+                breaker.retry_at = now + backoff
+                logger.warning(
+                    f"Circuit breaker for ISIN {isin} opened after {breaker.failures} failed check(s), "
+                    f"next probe in {backoff:g} seconds: {error}"
+                )
+                return breaker.retry_at
+            return None
+
+    def record_host_failure(self, error: str) -> int:
+        """
+        Record a check in which the price host could not be reached. Returns the number of consecutive ones.
+        """
+        with self._lock:
+            self._host_failures += 1
+            self._host_last_error = error
+            return self._host_failures
+
+    def forget(self, isin: str) -> None:
+        with self._lock:
+            self._breakers.pop(isin, None)
+
+    def on_config_change(self, version: int, changes: List[ConfigChange]) -> None:
+        # Config store listener: deleting or re-activating an ISIN resets its breaker
+        for change in changes:
+            if change.new is None or (change.new.active and change.old is not None and not change.old.active):
+                self.forget(change.isin)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Return the breaker state of every tracked ISIN as dicts keyed by ISIN.
+        """
+        with self._lock:
+            return {isin: breaker.to_dict() for isin, breaker in self._breakers.items()}
+
+    def get(self, isin: str) -> Optional[Dict]:
+        """
+        Return the breaker state of one ISIN as a dict, or None if it has not been checked yet.
+        """
+        with self._lock:
+            breaker = self._breakers.get(isin)
+            return breaker.to_dict() if breaker is not None else None
+
+    def states(self) -> Dict[str, str]:
+        """
+        Return the breaker state name per tracked ISIN.
+        """
+        with self._lock:
+            return {isin: breaker.state for isin, breaker in self._breakers.items()}
+
+    def export_state(self) -> Dict:
+        """
+        Return all breakers and the host failure streak as a JSON-serializable dict, e.g. to persist them.
+        """
+        with self._lock:
+            return {
+                "breakers": {isin: breaker.to_dict() for isin, breaker in self._breakers.items()},
+                "host_failures": self._host_failures,
+                "host_last_error": self._host_last_error,
+            }
+
+    def import_state(self, state: Mapping, replace: bool = False) -> None:
+        """
+        Restore breakers and the host failure streak exported by `export_state`.
+        With `replace`, breakers missing from `state` are dropped.
+        """
+        with self._lock:
+            if replace:
+                self._breakers = {}
+            for isin, values in state.get("breakers", {}).items():
+                breaker = CircuitBreaker()
+                for name in CircuitBreaker.__slots__:
+                    if name in values:
+                        setattr(breaker, name, values[name])
+                self._breakers[isin] = breaker
+            self._host_failures = int(state.get("host_failures", 0))
+            self._host_last_error = state.get("host_last_error")
+
+    def host_status(self) -> Dict:
+        with self._lock:
+            return {"consecutive_failures": self._host_failures, "last_error": self._host_last_error}
+
+
+# Shared health tracker
+health_tracker = HealthTracker()
@@ -0,0 +1,319 @@
+import bisect
+import datetime
+import logging
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "365"))  # days of history kept at all
+HISTORY_RAW_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "31"))  # days kept at full resolution before downsampling
+HISTORY_DOWNSAMPLE_INTERVAL = float(os.getenv("HISTORY_DOWNSAMPLE_INTERVAL", "900"))  # bucket size of older data
+HISTORY_MAP_CACHE = int(os.getenv("HISTORY_MAP_CACHE", "256"))  # segments kept memory-mapped
+
+# A segment is a flat array of little-endian float64 pairs: (epoch seconds, price), ordered by time
+_RECORD_SIZE = 16
+_RAW_SUFFIX = ".bin"
+_DOWNSAMPLED_SUFFIX = ".ds.bin"
+
+
+def _to_le_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _cast_le(buffer) -> memoryview:
+    view = memoryview(buffer).cast("d")
+    if sys.byteorder != "little":
+        # Big-endian hosts cannot read the segment in place
+        swapped = array("d", view)
+        swapped.byteswap()
+        return memoryview(swapped)
+    return view
+
+
+class HistorySlice(NamedTuple):
+    """
+    Observations of one segment inside a queried time range, as views into the memory-mapped file.
+    `data` holds interleaved (timestamp, price) float64 values; `timestamps` and `prices` are strided views on it.
+    """
+
+    data: memoryview
+
+    @property
+    def timestamps(self) -> memoryview:
+        return self.data[0::2]
+
+    @property
+    def prices(self) -> memoryview:
+        return self.data[1::2]
+
+    def __len__(self) -> int:
+        return len(self.data) // 2
+
+
+class HistoryStore:
+    """
+    Append-only price history with one directory per ISIN and one segment file per UTC day.
+    Observations are buffered in memory and appended once per sweep (`flush`). Reads memory-map the
+    segments and return zero-copy slices. Once a day, segments older than `raw_days` are downsampled
+    to the last price per `downsample_interval` bucket and segments older than `retention_days` are deleted.
+    """
+
+    def __init__(
+        self,
+        directory: str = HISTORY_DIR,
+        retention_days: int = HISTORY_RETENTION_DAYS,
+        raw_days: int = HISTORY_RAW_DAYS,
+        downsample_interval: float = HISTORY_DOWNSAMPLE_INTERVAL,
+        map_cache: int = HISTORY_MAP_CACHE,
+    ):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.raw_days = raw_days
+        self.downsample_interval = downsample_interval
+        self._map_cache_size = max(1, map_cache)
+        self._pending: Dict[str, array] = defaultdict(lambda: array("d"))
+        self._last_timestamp: Dict[str, float] = {}
+        self._maps: "OrderedDict[str, Tuple[int, memoryview]]" = OrderedDict()  # path -> (size, view)
+        self._maintained_day: Optional[datetime.date] = None
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._map_lock = threading.Lock()
+
+    @staticmethod
+    def _day(timestamp: float) -> datetime.date:
+        return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).date()
+
+    def _isin_dir(self, isin: str) -> str:
+        return os.path.join(self.directory, isin)
+
+    def _segments(self, isin: str) -> List[Tuple[datetime.date, str]]:
+        # (day, path) of all segments of an ISIN, oldest first
+        try:
+            names = os.listdir(self._isin_dir(isin))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            if not name.endswith(_RAW_SUFFIX):
+                continue
+            try:
+                day = datetime.datetime.strptime(name[:8], "%Y%m%d").date()
+            except ValueError:
+                continue
+            segments.append((day, os.path.join(self._isin_dir(isin), name)))
+        segments.sort()
+        return segments
+
+    def record(self, isin: str, price: float, timestamp: Optional[float] = None) -> None:
+        """
+        Buffer one observation. Observations not newer than the last one recorded for the ISIN are ignored.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._pending_lock:
+            if timestamp <= self._last_timestamp.get(isin, float("-inf")):
+                return
+            self._last_timestamp[isin] = timestamp
+            self._pending[isin].extend((timestamp, price))
+
+    def flush(self) -> None:
+        """
+        Append all buffered observations to their day segments, then run the daily maintenance if due.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, defaultdict(lambda: array("d"))
+        with self._write_lock:
+            written = 0
+            for isin, values in pending.items():
+                try:
+                    written += self._append(isin, values)
+                except OSError as e:
+                    logger.error(f"Could not write price history for ISIN {isin}: {e}")
+            if written:
+                logger.debug(f"Appended {written} observation(s) to price history")
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            if self._maintained_day != today:
+                self._maintained_day = today
+                self._maintain(today)
+
+    def _append(self, isin: str, values: array) -> int:
+        os.makedirs(self._isin_dir(isin), exist_ok=True)
+        # Split the buffered pairs by UTC day, a sweep around midnight may span two segments
+        by_day: Dict[datetime.date, array] = defaultdict(lambda: array("d"))
+        for i in range(0, len(values), 2):
+            by_day[self._day(values[i])].extend(values[i : i + 2])
+        for day, day_values in by_day.items():
+            path = os.path.join(self._isin_dir(isin), f"{day:%Y%m%d}{_RAW_SUFFIX}")
+            with open(path, "ab") as f:
+                f.write(_to_le_bytes(day_values))
+        return len(values) // 2
+
+    def read(self, isin: str, start: float, end: float) -> List[HistorySlice]:
+        """
+        Return the observations of an ISIN with start <= timestamp <= end as zero-copy slices, oldest first.
+        """
+        slices = []
+        first_day, last_day = self._day(start), self._day(end)
+        for day, path in self._segments(isin):
+            if first_day <= day <= last_day:
+                part = self._slice(path, start, end)
+                if part is not None:
+                    slices.append(part)
+        return slices
+
+    def _slice(self, path: str, start: float, end: float) -> Optional[HistorySlice]:
+        view = self._map(path)
+        if view is None:
+            return None
+        timestamps = view[0::2]
+        lo = bisect.bisect_left(timestamps, start)
+        hi = bisect.bisect_right(timestamps, end)
+        return HistorySlice(view[2 * lo : 2 * hi]) if hi > lo else None
+
+    def isins(self) -> List[str]:
+        """
+        Return the ISINs with recorded history, sorted.
+        """
+        try:
+            return sorted(name for name in os.listdir(self.directory) if os.path.isdir(self._isin_dir(name)))
+        except FileNotFoundError:
+            return []
+
+    def iterate(self, isin: str, start: float, end: float) -> Iterator[Tuple[float, float]]:
+        """
+        Yield the (timestamp, price) observations of an ISIN with start <= timestamp <= end, oldest first.
+        Segments are mapped one at a time, so iterating years of history keeps memory bounded.
+        """
+        first_day, last_day = self._day(start), self._day(end)
+        for day, path in self._segments(isin):
+            if first_day <= day <= last_day:
+                part = self._slice(path, start, end)
+                if part is not None:
+                    yield from zip(part.timestamps.tolist(), part.prices.tolist())
+
+    def query(
+        self, isin: str, start: float, end: float, resolution: Optional[float] = None
+    ) -> Tuple[List[float], List[float]]:
+        """
+        Return (timestamps, prices) of an ISIN between start and end. With a resolution in seconds,
+        only the last observation of every bucket of that size is returned.
+        """
+        timestamps: List[float] = []
+        prices: List[float] = []
+        if not resolution:
+            for part in self.read(isin, start, end):
+                timestamps.extend(part.timestamps.tolist())
+                prices.extend(part.prices.tolist())
+            return timestamps, prices
+        for part in self.read(isin, start, end):
+            part_timestamps, part_prices = part.timestamps, part.prices
+            for i in range(len(part)):
+                bucket = part_timestamps[i] // resolution
+                if timestamps and timestamps[-1] // resolution == bucket:
+                    timestamps[-1], prices[-1] = part_timestamps[i], part_prices[i]
+                else:
+                    timestamps.append(part_timestamps[i])
+                    prices.append(part_prices[i])
+        return timestamps, prices
+
+    def _map(self, path: str) -> Optional[memoryview]:
+        # Memory-map a segment read-only; the segment of the current day is remapped once it has grown
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        size -= size % _RECORD_SIZE  # ignore a partially written trailing record
+        with self._map_lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == size:
+                self._maps.move_to_end(path)
+                return cached[1]
+        if size == 0:
+            return None
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = _cast_le(mapped)
+        with self._map_lock:
+            # Evicted mappings are closed by the garbage collector once no slice refers to them any more
+            self._maps[path] = (size, view)
+            self._maps.move_to_end(path)
+            while len(self._maps) > self._map_cache_size:
+                self._maps.popitem(last=False)
+        return view
+
+    def _forget_map(self, path: str) -> None:
+        with self._map_lock:
+            self._maps.pop(path, None)
+
+    def maintain(self) -> None:
+        """
+        Apply retention and downsampling to all segments now.
+        """
+        with self._write_lock:
+            self._maintain(datetime.datetime.now(datetime.timezone.utc).date())
+
+    def _maintain(self, today: datetime.date) -> None:
+        try:
+            isins = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        expire_before = today - datetime.timedelta(days=self.retention_days)
+        downsample_before = today - datetime.timedelta(days=self.raw_days)
+        expired = downsampled = 0
+        for isin in isins:
+            for day, path in self._segments(isin):
+                try:
+                    if day < expire_before:
+                        self._forget_map(path)
+                        os.unlink(path)
+                        expired += 1
+                    elif day < downsample_before and not path.endswith(_DOWNSAMPLED_SUFFIX):
+                        self._downsample(path)
+                        downsampled += 1
+                except FileNotFoundError:
+                    # Already maintained by another worker process sharing the directory
+                    continue
+                except OSError as e:
+                    logger.error(f"Price history maintenance failed for {path}: {e}")
+        if expired or downsampled:
+            logger.info(f"Price history maintenance: {expired} segment(s) expired, {downsampled} downsampled")
+
+    def _downsample(self, path: str) -> None:
+        # Keep the last observation per bucket, write it atomically next to the raw segment and drop the raw one
+        with open(path, "rb") as f:
+            data = f.read()
+        data = data[: len(data) - len(data) % _RECORD_SIZE]
+        values = array("d", _cast_le(data)) if data else array("d")
+        result = array("d")
+        for i in range(0, len(values), 2):
+            bucket = values[i] // self.downsample_interval
+            if result and result[-2] // self.downsample_interval == bucket:
+                result[-2], result[-1] = values[i], values[i + 1]
+            else:
+                result.extend(values[i : i + 2])
+        target = path[: -len(_RAW_SUFFIX)] + _DOWNSAMPLED_SUFFIX
+        fd, tmp_path = tempfile.mkstemp(prefix=".segment-", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_to_le_bytes(result))
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._forget_map(path)
+        os.unlink(path)
+
+
+# Shared price history
+history_store = HistoryStore()
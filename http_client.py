@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from metrics import HTTP_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # number of hosts to keep connection pools for
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))  # keep-alive connections per host
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))  # seconds
+HTTP_CONDITIONAL = os.getenv("HTTP_CONDITIONAL", "true").lower() in ("1", "true", "yes")
+
+T = TypeVar("T")
+
+# Thread-safe transfer counters
+_stats: Dict[str, int] = {
+    "requests": 0,
+    "not_modified": 0,
+    "connections_opened": 0,
+    "bytes_downloaded": 0,
+    "bytes_decoded": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _increment(name: str, value: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += value
+
+
+def http_stats() -> Dict[str, int]:
+    """
+    Return a copy of the HTTP transfer counters.
+    `connections_reused` is the number of requests that did not need a new TCP/TLS connection.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["connections_reused"] = max(0, stats["requests"] - stats["connections_opened"])
+    return stats
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _increment("connections_opened")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _increment("connections_opened")
+        return super()._new_conn()
+
+
+class _CountingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools count every new connection they open.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = _CountingAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    logger.info(f"HTTP session created with pool size {HTTP_POOL_SIZE} for up to {HTTP_POOL_CONNECTIONS} host(s)")
+    return session
+
+
+# Shared session: connections are kept alive and reused across polls and fetch threads
+session = _create_session()
+
+# url -> (ETag, Last-Modified, parsed value of the last full response)
+_validators: Dict[str, Tuple[Optional[str], Optional[str], object]] = {}
+_validators_lock = threading.Lock()
+
+
+def conditional_get(url: str, parse: Callable[[bytes], Optional[T]], timeout: float = HTTP_TIMEOUT) -> Optional[T]:
+    """
+    GET `url` through the shared session and return `parse(content)`.
+    If the server supplied an ETag or Last-Modified header for the last successfully parsed response,
+    a conditional request is sent and a 304 answer returns the previously parsed value without downloading the page.
+    Raises requests exceptions for transport errors and HTTP error statuses.
+    """
+    headers = {}
+    cached = None
+    if HTTP_CONDITIONAL:
+        with _validators_lock:
+            cached = _validators.get(url)
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+    start = time.perf_counter()
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+    except requests.exceptions.RequestException:
+        HTTP_REQUEST_SECONDS.labels("error").observe(time.perf_counter() - start)
+        raise
+    if response.status_code == 304:
+        outcome = "not_modified"
+    else:
+        outcome = "ok" if response.ok else "error"
+    HTTP_REQUEST_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+    _increment("requests")
+    logger.debug(f"HTTP status code for {url}: {response.status_code}")
+    if response.status_code == 304 and cached:
+        _increment("not_modified")
+        return cached[2]
+    response.raise_for_status()
+
+    content = response.content
+    try:
+        wire_bytes = response.raw.tell() or len(content)
+    except Exception:
+        wire_bytes = len(content)
+    _increment("bytes_downloaded", wire_bytes)
+    _increment("bytes_decoded", len(content))
+
+    value = parse(content)
+    if HTTP_CONDITIONAL:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with _validators_lock:
+            if value is not None and (etag or last_modified):
+                _validators[url] = (etag, last_modified, value)
+            else:
+                _validators.pop(url, None)
+    return value
@@ -0,0 +1,313 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds, from 1 ms to 1 minute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# A collected metric: (name, type, documentation, samples as (name suffix, label text, value))
+Family = Tuple[str, str, str, List[Tuple[str, str, float]]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _add_label(label_text: str, pair: str) -> str:
+    return "{" + pair + ("," + label_text[1:] if label_text else "}")
+
+
+def _render_family(name: str, type_: str, documentation: str, samples: Sequence[Tuple[str, str, float]]) -> str:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {type_}"]
+    for suffix, label_text, value in samples:
+        lines.append(f"{name}{suffix}{label_text} {_format_value(value)}")
+    return "\n".join(lines)
+
+
+class _Timer:
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+
+
+class _CounterValue:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def samples(self, labels: Callable[[str], str]) -> List[Tuple[str, str, float]]:
+        return [("", labels(""), self._value)]
+
+
+class _GaugeValue:
+    __slots__ = ("_value", "_lock", "_function")
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def samples(self, labels: Callable[[str], str]) -> List[Tuple[str, str, float]]:
+        value = self._function() if self._function is not None else self._value
+        return [("", labels(""), value)]
+
+
+class _HistogramValue:
+    __slots__ = ("_buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # the last one counts values above all buckets (+Inf)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> _Timer:
+        """
+        Context manager observing the duration of its block in seconds.
+        """
+        return _Timer(self.observe)
+
+    def totals(self) -> Tuple[int, float]:
+        """
+        Return (number of observations, sum of observed values).
+        """
+        with self._lock:
+            return sum(self._counts), self._sum
+
+    def samples(self, labels: Callable[[str], str]) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(("_bucket", labels(f'le="{_format_value(bound)}"'), cumulative))
+        samples.append(("_sum", labels(""), total))
+        samples.append(("_count", labels(""), cumulative))
+        return samples
+
+
+class _Metric:
+    """
+    A named metric with help text and optional label names.
+    Without labels the metric records values itself; with labels, `labels(...)` returns the value
+    holder of one label combination, created on first use.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_value()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_value())
+        return child
+
+    def collect(self) -> Family:
+        with self._lock:
+            children = sorted(self._children.items())
+        samples = []
+        for values, child in children:
+            samples.extend(child.samples(functools.partial(_format_labels, self.labelnames, values)))
+        return self.name, self.type, self.documentation, samples
+
+    def render(self) -> str:
+        return _render_family(*self.collect())
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, *args, **kwargs):
+        # Counter samples carry the _total suffix, and the text format expects HELP/TYPE to use the sample name
+        super().__init__(name if name.endswith("_total") else name + "_total", *args, **kwargs)
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Gauge set explicitly or, with `function`, read from a callback when the metrics are rendered.
+    """
+
+    type = "gauge"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs):
+        self._function = function
+        super().__init__(*args, **kwargs)
+
+    def _new_value(self):
+        return _GaugeValue(self._function)
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        self._buckets = tuple(sorted(buckets))
+        super().__init__(*args, **kwargs)
+
+    def _new_value(self):
+        return _HistogramValue(self._buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def time(self) -> _Timer:
+        """
+        Context manager observing the duration of its block in seconds.
+        """
+        return _Timer(self._children[()].observe)
+
+    def totals(self) -> Tuple[int, float]:
+        return self._children[()].totals()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._providers: List[Callable[[], Mapping[str, Sequence[Family]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def include(self, provider: Callable[[], Mapping[str, Sequence[Family]]]) -> None:
+        """
+        Add the metrics of other processes to `render`. `provider` returns the metrics collected in each
+        process keyed by worker ID, which is added to their samples as the `worker` label.
+        """
+        with self._lock:
+            self._providers.append(provider)
+
+    def collect(self) -> List[Family]:
+        """
+        Return the current values of all metrics of this process, e.g. to send them to another process.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        return [metric.collect() for metric in metrics]
+
+    def render(self) -> str:
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        families = {name: (type_, documentation, samples) for name, type_, documentation, samples in self.collect()}
+        with self._lock:
+            providers = list(self._providers)
+        for provider in providers:
+            for worker, collected in provider().items():
+                label = f'worker="{_escape(worker)}"'
+                for name, type_, documentation, samples in collected:
+                    family = families.setdefault(name, (type_, documentation, []))
+                    family[2].extend(
+                        (suffix, _add_label(label_text, label), value) for suffix, label_text, value in samples
+                    )
+        return "\n".join(_render_family(name, *family) for name, family in families.items()) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics shared by the modules of the service
+HTTP_REQUEST_SECONDS = Histogram(
+    "stock_alert_http_request_seconds", "Duration of price page requests.", ["outcome"]
+)
+PARSE_SECONDS = Histogram("stock_alert_parse_seconds", "Duration of extracting the price from a page.")
+RULE_EVALUATION_SECONDS = Histogram(
+    "stock_alert_rule_evaluation_seconds", "Duration of evaluating the alert rules of one batch of prices."
+)
+EMAIL_SEND_SECONDS = Histogram("stock_alert_email_send_seconds", "Duration of sending one email.", ["outcome"])
+SWEEP_SECONDS = Histogram(
+    "stock_alert_sweep_seconds",
+    "Duration of one sweep over the due ISINs.",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+SWEEP_ISINS = Counter("stock_alert_sweep_isins", "ISINs checked by sweeps.")
+SWEEP_LAG_SECONDS = Gauge(
+    "stock_alert_sweep_lag_seconds", "Delay of the last sweep start behind the earliest due time of its ISINs."
+)
+RETRIED_FETCHES = Counter("stock_alert_fetch_retries", "Price retrieval attempts that were retried.")
+FETCH_FAILURES = Counter(
+    "stock_alert_fetch_failures", "Price retrievals that failed after all attempts.", ["reason"]
+)
+ALERTS = Counter("stock_alert_alerts", "Alerts fired by the rule engine.", ["rule"])
+CONFIG_LOCK_WAIT_SECONDS = Histogram(
+    "stock_alert_config_lock_wait_seconds",
+    "Time config writers waited for the config store lock.",
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1),
+)
+STREAM_DROPPED_CLIENTS = Counter(
+    "stock_alert_stream_dropped_clients", "Event stream clients dropped because they fell too far behind."
+)
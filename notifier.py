@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from email_utils import EMAIL_TO, SMTPConnection, build_message
+from metrics import EMAIL_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+EMAIL_DIGEST = os.getenv("EMAIL_DIGEST", "true").lower() in ("1", "true", "yes")  # one email per sweep
+EMAIL_DIGEST_WINDOW = float(os.getenv("EMAIL_DIGEST_WINDOW", "10"))  # max seconds to wait for the end of a sweep
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "5"))  # send attempts before a notification is given up
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "10"))  # seconds before the first retry, doubled after
+EMAIL_RETRY_MAX_BACKOFF = float(os.getenv("EMAIL_RETRY_MAX_BACKOFF", "600"))
+EMAIL_SPOOL_DIR = os.getenv("EMAIL_SPOOL_DIR", "spool")  # pending notifications survive restarts here
+
+
+class Notification:
+    """
+    One queued email. Persisted as a JSON file in the spool directory until it is sent or given up.
+    """
+
+    __slots__ = ("id", "subject", "body", "created_at", "attempts", "next_attempt")
+
+    def __init__(
+        self,
+        subject: str,
+        body: str,
+        id: Optional[str] = None,
+        created_at: Optional[float] = None,
+        attempts: int = 0,
+    ):
+        self.id = id or f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        self.subject = subject
+        self.body = body
+        self.created_at = created_at or time.time()
+        self.attempts = attempts
+        self.next_attempt = 0.0  # monotonic time before which no retry is made
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "subject": self.subject,
+            "body": self.body,
+            "created_at": self.created_at,
+            "attempts": self.attempts,
+        }
+
+
+class Notifier:
+    """
+    Outbound notification queue with a background sender thread.
+    Alerts are spooled to disk when queued and sent over a persistent SMTP connection.
+    With digest mode enabled, all alerts queued up to a `flush()` (the end of a sweep) are sent as one email.
+    Failed sends are retried with exponential backoff up to `max_retries` attempts.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str = EMAIL_SPOOL_DIR,
+        digest: bool = EMAIL_DIGEST,
+        digest_window: float = EMAIL_DIGEST_WINDOW,
+        max_retries: int = EMAIL_MAX_RETRIES,
+        retry_backoff: float = EMAIL_RETRY_BACKOFF,
+        retry_max_backoff: float = EMAIL_RETRY_MAX_BACKOFF,
+        connection_factory: Callable[[], SMTPConnection] = SMTPConnection,
+    ):
+        self._spool_dir = spool_dir
+        self._digest = digest
+        self._digest_window = digest_window
+        self._max_retries = max(1, max_retries)
+        self._retry_backoff = retry_backoff
+        self._retry_max_backoff = retry_max_backoff
+        self._connection = connection_factory()
+        self._pending: List[Notification] = []
+        self._flush_requested = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, spool_dir: Optional[str] = None) -> None:
+        """
+        Load notifications left in the spool by a previous run and start the sender thread.
+        `spool_dir` overrides the spool directory given to the constructor.
+        """
+        if spool_dir is not None:
+            self._spool_dir = spool_dir
+        os.makedirs(self._spool_dir, exist_ok=True)
+        spooled = self._load_spool()
+        with self._condition:
+            self._pending[:0] = spooled
+            self._flush_requested = bool(spooled)
+        if spooled:
+            logger.info(f"Loaded {len(spooled)} unsent notification(s) from spool {self._spool_dir}")
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+        logger.info(f"Notifier started (digest={self._digest}, spool={self._spool_dir})")
+
+    def notify(self, subject: str, body: str) -> None:
+        """
+        Queue an email. Returns immediately; the notification is spooled to disk before it is queued.
+        """
+        notification = Notification(subject, body)
+        try:
+            self._spool(notification)
+        except OSError as e:
+            logger.error(f"Could not spool notification '{subject}': {e}")
+        with self._condition:
+            self._pending.append(notification)
+            self._condition.notify()
+        logger.info(f"Queued notification to {EMAIL_TO} with subject: '{subject}'")
+
+    def flush(self) -> None:
+        """
+        Mark the end of a batch (e.g. a monitoring sweep): queued notifications are sent now
+        instead of waiting for the digest window to expire.
+        """
+        with self._condition:
+            if self._pending:
+                self._flush_requested = True
+                self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def stop(self, timeout: float = 30) -> None:
+        """
+        Stop the sender thread after one last attempt to send everything pending.
+        Notifications that still could not be sent stay in the spool for the next start.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._connection.close()
+
+    def _spool_path(self, notification: Notification) -> str:
+        return os.path.join(self._spool_dir, f"{notification.id}.json")
+
+    def _spool(self, notification: Notification) -> None:
+        os.makedirs(self._spool_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".notification-", suffix=".tmp", dir=self._spool_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(notification.to_dict(), f)
+        os.replace(tmp_path, self._spool_path(notification))
+
+    def _unspool(self, notification: Notification, suffix: Optional[str] = None) -> None:
+        path = self._spool_path(notification)
+        try:
+            if suffix:
+                os.replace(path, path + suffix)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _load_spool(self) -> List[Notification]:
+        notifications = []
+        for name in sorted(os.listdir(self._spool_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._spool_dir, name)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                notifications.append(Notification(**data))
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Skipping unreadable spooled notification {path}: {e}")
+        return notifications
+
+    def _next_batch(self) -> Optional[List[Notification]]:
+        # Wait (holding the condition) until a batch is ready to send; returns None once stopped
+        while True:
+            now = time.monotonic()
+            if self._stopping:
+                batch, self._pending = self._pending, []
+                return batch or None
+            due = [n for n in self._pending if n.next_attempt <= now]
+            if due:
+                oldest_new = min((n.created_at for n in due if n.attempts == 0), default=None)
+                window_expired = oldest_new is None or time.time() - oldest_new >= self._digest_window
+                if not self._digest or self._flush_requested or window_expired:
+                    self._flush_requested = False
+                    self._pending = [n for n in self._pending if n.next_attempt > now]
+                    return due
+            timeouts = [n.next_attempt - now for n in self._pending if n.next_attempt > now]
+            if due:
+                timeouts.append(self._digest_window - (time.time() - oldest_new))
+            self._condition.wait(max(0.05, min(timeouts)) if timeouts else None)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                final = self._stopping
+            if batch is None:
+                return
+            if self._digest and len(batch) > 1:
+                sent = self._send(batch, *self._digest_message(batch))
+            else:
+                results = [self._send([n], n.subject, n.body) for n in batch]
+                sent = all(results)
+            if final:
+                # Only one last attempt on shutdown; whatever failed stays in the spool
+                if not sent:
+                    logger.warning("Notifier stopped with unsent notifications; they remain spooled for the next start")
+                return
+
+    def _digest_message(self, batch: List[Notification]):
+        subject = f"Stock Alert: {len(batch)} notifications"
+        parts = [f"{n.subject}\n{'-' * len(n.subject)}\n{n.body}" for n in batch]
+        return subject, "\n\n".join(parts)
+
+    def _send(self, batch: List[Notification], subject: str, body: str) -> bool:
+        start = time.perf_counter()
+        try:
+            self._connection.send(build_message(subject, body))
+        except Exception as e:
+            EMAIL_SEND_SECONDS.labels("error").observe(time.perf_counter() - start)
+            logger.error(f"Error sending email to {EMAIL_TO} with subject: '{subject}': {e}")
+            self._reschedule(batch)
+            return False
+        EMAIL_SEND_SECONDS.labels("ok").observe(time.perf_counter() - start)
+        for notification in batch:
+            self._unspool(notification)
+        logger.info(f"Email sent successfully to {EMAIL_TO} with subject: '{subject}'")
+        return True
+
+    def _reschedule(self, batch: List[Notification]) -> None:
+        retry = []
+        now = time.monotonic()
+        for notification in batch:
+            notification.attempts += 1
+            if notification.attempts >= self._max_retries:
+                logger.error(
+                    f"Giving up on notification '{notification.subject}' after {notification.attempts} attempt(s)"
+                )
+                self._unspool(notification, suffix=".failed")
+                continue
+            backoff = min(self._retry_max_backoff, self._retry_backoff * 2 ** (notification.attempts - 1))
+            notification.next_attempt = now + backoff
+            retry.append(notification)
+            try:
+                self._spool(notification)
+            except OSError as e:
+                logger.error(f"Could not update spooled notification '{notification.subject}': {e}")
+        if retry:
+            logger.info(f"Retrying {len(retry)} notification(s) in {backoff:g} seconds")
+            with self._condition:
+                self._pending.extend(retry)
+
+
+# Shared notification queue
+notifier = Notifier()
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "15"))  # seconds a fetched price counts as current
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", "10000"))  # max number of ISINs kept in the cache
+
+
+class CachedPrice(NamedTuple):
+    price: float
+    fetched_at: float  # wall-clock time (epoch seconds) of the fetch
+    fetched_monotonic: float  # monotonic time of the fetch, used for the TTL
+
+
+class _InFlight:
+    """
+    A fetch that is currently running; concurrent callers for the same ISIN wait for its result.
+    """
+
+    __slots__ = ("done", "price", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.price: Optional[float] = None
+        self.error: Optional[BaseException] = None
+
+
+class PriceCache:
+    """
+    In-process price cache keyed by ISIN, shared by the monitoring loop, the API and the admin UI.
+    Prices are current for `ttl` seconds; the last known price stays available for display afterwards
+    until the entry is evicted (least recently used first) once more than `max_size` ISINs are cached.
+    Concurrent `get_or_fetch` calls for the same ISIN share one in-flight fetch.
+    """
+
+    def __init__(self, ttl: float = PRICE_CACHE_TTL, max_size: int = PRICE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[str, CachedPrice]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, isin: str) -> Optional[CachedPrice]:
+        """
+        Return the last known price for an ISIN regardless of its age, or None if it is not cached.
+        """
+        with self._lock:
+            return self._entries.get(isin)
+
+    def get_fresh(self, isin: str) -> Optional[CachedPrice]:
+        """
+        Return the cached price for an ISIN if it is younger than the TTL, else None.
+        """
+        with self._lock:
+            return self._get_fresh(isin)
+
+    def _get_fresh(self, isin: str) -> Optional[CachedPrice]:
+        cached = self._entries.get(isin)
+        if cached is None or time.monotonic() - cached.fetched_monotonic > self.ttl:
+            return None
+        self._entries.move_to_end(isin)
+        return cached
+
+    def put(self, isin: str, price: float, fetched_at: Optional[float] = None) -> None:
+        """
+        Store a price fetched at `fetched_at` (default: now), evicting the least recently used ISINs if the
+        cache is full. Older prices, e.g. restored after a restart, are only fresh for the rest of the TTL.
+        """
+        with self._lock:
+            self._put(isin, price, fetched_at)
+
+    def _put(self, isin: str, price: float, fetched_at: Optional[float] = None) -> None:
+        now = time.time()
+        fetched_at = fetched_at or now
+        # Age the monotonic fetch time accordingly, so the TTL counts from the actual fetch
+        self._entries[isin] = CachedPrice(price, fetched_at, time.monotonic() - max(0.0, now - fetched_at))
+        self._entries.move_to_end(isin)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            logger.debug(f"Evicted ISIN {evicted} from price cache")
+
+    def get_or_fetch(self, isin: str, fetch: Callable[[str], Optional[float]]) -> Optional[float]:
+        """
+        Return the current price for an ISIN, calling `fetch(isin)` only if no fresh price is cached
+        and no other thread is already fetching it. Failed fetches (None or an exception) are not cached;
+        an exception raised by `fetch` is re-raised in every caller waiting for that fetch.
+        """
+        with self._lock:
+            cached = self._get_fresh(isin)
+            if cached is not None:
+                return cached.price
+            call = self._in_flight.get(isin)
+            leader = call is None
+            if leader:
+                call = self._in_flight[isin] = _InFlight()
+        if not leader:
+            logger.debug(f"Waiting for in-flight price fetch of ISIN {isin}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.price
+        try:
+            call.price = fetch(isin)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if call.price is not None:
+                    self._put(isin, call.price)
+                del self._in_flight[isin]
+            call.done.set()
+        return call.price
+
+    def snapshot(self) -> Dict[str, CachedPrice]:
+        """
+        Return a copy of all cached prices keyed by ISIN.
+        """
+        with self._lock:
+            return dict(self._entries)
+
+
+# Shared price cache
+price_cache = PriceCache()
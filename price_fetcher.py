@@ -0,0 +1,197 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Collection, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from metrics import FETCH_FAILURES, RETRIED_FETCHES
+from stock_monitor import PriceFetchError, fetch_stock_price, get_tradegate_url
+
+logger = logging.getLogger(__name__)
+
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))  # size of the fetch thread pool
+FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "4"))  # max concurrent requests against one host
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))  # attempts per ISIN and sweep
+FETCH_RETRY_DELAY = float(os.getenv("FETCH_RETRY_DELAY", "30"))  # seconds before a failed fetch is retried
+
+# How often the coordinator wakes up to check the stop event while waiting for results
+_POLL_INTERVAL = 0.5
+
+
+class FetchResult(NamedTuple):
+    isin: str
+    price: Optional[float]  # None if all attempts failed
+    error: Optional[Exception] = None  # exception of the last failed attempt, if the fetch function raised one
+
+    @property
+    def host_unreachable(self) -> bool:
+        """
+        True if the last attempt failed because the host could not be reached (not because of the instrument).
+        """
+        return isinstance(self.error, PriceFetchError) and self.error.host_unreachable
+
+
+class PriceFetcher:
+    """
+    Concurrent price fetch engine.
+    Single fetch attempts run on a thread pool while the calling thread coordinates them:
+    it caps in-flight requests per host, reschedules failed attempts on a retry heap (so no worker
+    sleeps between retries) and yields results in completion order.
+    The fetch function returns a price, or returns None or raises on failure. A PriceFetchError that is
+    not caused by an unreachable host is specific to the instrument and is not retried within a sweep.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Optional[float]] = fetch_stock_price,
+        workers: int = FETCH_WORKERS,
+        max_per_host: int = FETCH_MAX_PER_HOST,
+        retries: int = FETCH_RETRIES,
+        retry_delay: float = FETCH_RETRY_DELAY,
+    ):
+        self._fetch = fetch
+        self._max_per_host = max(1, max_per_host)
+        self._retries = max(1, retries)
+        self._retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fetch")
+        self._lock = threading.Lock()
+        logger.info(
+            f"Price fetcher started with {max(1, workers)} worker(s), "
+            f"{self._max_per_host} request(s) per host, {self._retries} attempt(s) per ISIN"
+        )
+
+    @staticmethod
+    def _host(isin: str) -> str:
+        return urlparse(get_tradegate_url(isin)).netloc
+
+    def fetch_all(
+        self,
+        isins: Iterable[str],
+        stop_event: Optional[threading.Event] = None,
+        probes: Collection[str] = (),
+    ) -> Iterator[FetchResult]:
+        """
+        Fetch prices for all given ISINs concurrently.
+        Yields a FetchResult as soon as each ISIN succeeds, or with price None once all attempts failed.
+        ISINs in `probes` (e.g. half-open circuit breakers) get a single attempt.
+        Stops early (without yielding the outstanding ISINs) when `stop_event` is set.
+        """
+        # Only one sweep may drive the executor at a time, otherwise the per-host cap would not hold
+        with self._lock:
+            for result in self._run(isins, stop_event, probes):
+                if result is not None:
+                    yield result
+
+    def fetch_batches(
+        self,
+        isins: Iterable[str],
+        stop_event: Optional[threading.Event] = None,
+        probes: Collection[str] = (),
+    ) -> Iterator[List[FetchResult]]:
+        """
+        Like `fetch_all`, but yields the results in batches: a batch holds all results that completed
+        since the previous batch and is yielded whenever the fetcher would otherwise wait for running
+        fetches or retries. Callers can act on the prices that arrived together without waiting for the
+        rest of the sweep; while they do, further results complete and form the next batch.
+        """
+        with self._lock:
+            batch: List[FetchResult] = []
+            for result in self._run(isins, stop_event, probes):
+                if result is not None:
+                    batch.append(result)
+                elif batch:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def _should_retry(self, isin: str, attempt: int, error: Optional[Exception], probes: Collection[str]) -> bool:
+        if attempt >= self._retries or isin in probes:
+            return False
+        return not isinstance(error, PriceFetchError) or error.host_unreachable
+
+    def _run(
+        self, isins: Iterable[str], stop_event: Optional[threading.Event], probes: Collection[str]
+    ) -> Iterator[Optional[FetchResult]]:
+        # Yields None before it blocks, so callers can tell the results that arrived together
+        waiting: Dict[str, Deque[Tuple[str, int]]] = defaultdict(deque)  # host -> queued (isin, attempt)
+        in_flight: Dict[str, int] = defaultdict(int)  # host -> running requests
+        pending: Dict[Future, Tuple[str, str, int]] = {}  # future -> (host, isin, attempt)
+        retry_heap: List[Tuple[float, str, int]] = []  # (due monotonic time, isin, attempt)
+
+        for isin in isins:
+            waiting[self._host(isin)].append((isin, 1))
+
+        def submit_ready():
+            for host, queue in waiting.items():
+                while queue and in_flight[host] < self._max_per_host:
+                    isin, attempt = queue.popleft()
+                    in_flight[host] += 1
+                    pending[self._executor.submit(self._fetch, isin)] = (host, isin, attempt)
+
+        try:
+            while pending or retry_heap or any(waiting.values()):
+                if stop_event is not None and stop_event.is_set():
+                    logger.info("Stop requested. Abandoning outstanding price fetches.")
+                    return
+                now = time.monotonic()
+                while retry_heap and retry_heap[0][0] <= now:
+                    _, isin, attempt = heapq.heappop(retry_heap)
+                    waiting[self._host(isin)].append((isin, attempt))
+                submit_ready()
+
+                timeout = _POLL_INTERVAL
+                if retry_heap:
+                    timeout = min(timeout, max(0.0, retry_heap[0][0] - now))
+                if not pending:
+                    # Only retries outstanding: wait for the next one to become due
+                    yield None
+                    if stop_event is not None:
+                        stop_event.wait(timeout)
+                    else:
+                        time.sleep(timeout)
+                    continue
+
+                done, _ = wait(pending, timeout=0)
+                if not done:
+                    yield None
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, isin, attempt = pending.pop(future)
+                    in_flight[host] -= 1
+                    error = None
+                    try:
+                        price = future.result()
+                    except PriceFetchError as e:
+                        logger.error(f"Error retrieving price for ISIN {isin}: {e}")
+                        price, error = None, e
+                    except Exception as e:
+                        logger.error(f"Unexpected exception while fetching price for ISIN {isin}: {e}", exc_info=True)
+                        price, error = None, e
+                    if price is not None:
+                        yield FetchResult(isin, price)
+                    elif self._should_retry(isin, attempt, error, probes):
+                        logger.info(
+                            f"Retrying price retrieval for ISIN {isin} in {self._retry_delay} seconds "
+                            f"(attempt {attempt}/{self._retries} failed)"
+                        )
+                        RETRIED_FETCHES.inc()
+                        heapq.heappush(retry_heap, (time.monotonic() + self._retry_delay, isin, attempt + 1))
+                    else:
+                        logger.error(f"Failed to retrieve price for ISIN {isin} after {attempt} attempt(s).")
+                        result = FetchResult(isin, None, error)
+                        FETCH_FAILURES.labels("host" if result.host_unreachable else "instrument").inc()
+                        yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker threads. Running fetches are allowed to finish, queued ones are cancelled.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
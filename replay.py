@@ -0,0 +1,477 @@
+"""
+Replay recorded price ticks through the alert rules and report which alerts would have fired and when.
+
+Ticks are read from CSV files (timestamp, isin, price; timestamps in epoch seconds or ISO 8601, sorted by
+time; the header row is optional) or from the price history recorded by the service (--history). They are
+streamed through the same alert evaluation as the monitoring loop on a simulated clock, as fast as the CPU
+allows. By default every tick is evaluated as if it had just been fetched; with --interval the ISINs are
+polled on the service's schedule (CHECK_INTERVAL, poll_interval, adaptive polling) and each poll sees the
+last tick before it. Memory is bounded by the number of ISINs, not by the number of ticks.
+
+The alerts are written as CSV (or JSON lines with --format json) to stdout or --output, in time order.
+One-shot alerts deactivate their ISIN for the rest of the replay, like in the service.
+
+Usage (from the repository root):
+    python replay.py ticks.csv [more.csv ...] [--config config.json] [--interval 60] [--processes 4]
+    python replay.py --history history --start 2024-01-01 --end 2024-12-31 --market-hours
+"""
+
+import argparse
+import csv
+import datetime
+import heapq
+import json
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before importing modules that read them at import time
+load_dotenv()
+from alert_evaluator import AlertEvaluator, TriggeredAlert  # noqa: E402
+from config_manager import CONFIG_PATH, ConfigEntry, load_config  # noqa: E402
+from history_store import HISTORY_DIR, HistoryStore  # noqa: E402
+from rules import RuleEngine  # noqa: E402
+from scheduler import MARKET_CLOSE, MARKET_HOLIDAYS, MARKET_OPEN, MarketCalendar, PollScheduler  # noqa: E402
+from stock_monitor import MARKET_TIMEZONE  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Max ISINs evaluated together in tick mode; a batch never holds two ticks of the same ISIN
+BATCH_SIZE = 4096
+# Ticks written at once to the file of a process with --processes
+SHARD_CHUNK_SIZE = 10000
+OUTPUT_FIELDS = ("time", "isin", "price", "rules", "reason", "deactivated")
+
+Tick = Tuple[float, str, float]  # (timestamp, isin, price)
+
+
+class ReplayAlert(NamedTuple):
+    time: float  # simulated time (epoch seconds) at which the alert fired
+    alert: TriggeredAlert
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Parse epoch seconds or ISO 8601; ISO times without an offset are in the market timezone.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is None:
+        parsed = MARKET_TIMEZONE.localize(parsed)
+    return parsed.timestamp()
+
+
+def read_csv(path: str, select: Optional[Callable[[str], bool]] = None) -> Iterator[Tick]:
+    """
+    Stream the ticks of a CSV file ("-" for stdin) with the columns timestamp, isin and price.
+    A header row naming the columns (in any order) is optional. Ticks for which `select(isin)` is False are skipped.
+    """
+    f = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        reader = csv.reader(f)
+        columns = (0, 1, 2)
+        for line, row in enumerate(reader, 1):
+            if not row or row[0].startswith("#"):
+                continue
+            if line == 1:
+                names = [name.strip().lower() for name in row]
+                if "isin" in names:
+                    timestamp_column = "timestamp" if "timestamp" in names else "time"
+                    columns = (names.index(timestamp_column), names.index("isin"), names.index("price"))
+                    continue
+            try:
+                isin = row[columns[1]].strip()
+                if select is not None and not select(isin):
+                    continue
+                yield parse_timestamp(row[columns[0]]), isin, float(row[columns[2]])
+            except (IndexError, ValueError) as e:
+                raise ValueError(f"{path}, line {line}: invalid tick {row}: {e}") from None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_history(
+    directory: str, start: float, end: float, select: Optional[Callable[[str], bool]] = None
+) -> Iterator[Tick]:
+    """
+    Stream the price history recorded by the service, all ISINs merged in time order.
+    """
+    store = HistoryStore(directory)
+
+    def ticks(isin: str) -> Iterator[Tick]:
+        for timestamp, price in store.iterate(isin, start, end):
+            yield timestamp, isin, price
+
+    return heapq.merge(*(ticks(isin) for isin in store.isins() if select is None or select(isin)))
+
+
+def _order(item: ReplayAlert) -> Tuple[float, str]:
+    return item.time, item.alert.isin
+
+
+class _SimulatedDay:
+    """
+    Trading day and session of the simulated clock, recomputed only when the clock passes midnight.
+    """
+
+    def __init__(self, calendar: Optional[MarketCalendar]):
+        self.calendar = calendar
+        self.day = -1  # ordinal of the current date in the market timezone
+        self.session: Optional[Tuple[float, float]] = None  # open and close (epoch seconds) of the current day
+        self._start = self._end = float("nan")
+
+    def update(self, timestamp: float) -> None:
+        if self._start <= timestamp < self._end:
+            return
+        date = datetime.datetime.fromtimestamp(timestamp, MARKET_TIMEZONE).date()
+        self.day = date.toordinal()
+        midnight = datetime.time()
+        self._start = MARKET_TIMEZONE.localize(datetime.datetime.combine(date, midnight)).timestamp()
+        self._end = MARKET_TIMEZONE.localize(
+            datetime.datetime.combine(date + datetime.timedelta(days=1), midnight)
+        ).timestamp()
+        session = self.calendar.session(date) if self.calendar is not None else None
+        self.session = (session[0].timestamp(), session[1].timestamp()) if session is not None else None
+
+    def is_open(self, timestamp: float) -> bool:
+        self.update(timestamp)
+        if self.calendar is None:
+            return True
+        return self.session is not None and self.session[0] <= timestamp <= self.session[1]
+
+    def next_open(self, timestamp: float) -> float:
+        now = datetime.datetime.fromtimestamp(timestamp, MARKET_TIMEZONE)
+        return self.calendar.next_open(now).timestamp()
+
+
+class Replayer:
+    """
+    Runs ticks through an AlertEvaluator on a simulated clock.
+    Without `interval` every tick is evaluated as soon as it arrives; ticks of different ISINs are
+    batched until an ISIN repeats, which gives the same result as evaluating them one by one.
+    With `interval` a PollScheduler polls the ISINs as in the service and every poll evaluates the
+    last tick seen before it; the service is started at `start` (default: the first tick).
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[ConfigEntry],
+        interval: Optional[float] = None,
+        calendar: Optional[MarketCalendar] = None,
+        adaptive: bool = False,
+        start: Optional[float] = None,
+    ):
+        self.entries = {entry.isin: entry for entry in entries}
+        self.interval = interval
+        self.evaluator = AlertEvaluator(RuleEngine())
+        self.evaluator.sync(self.entries.values())
+        self.scheduler = PollScheduler(interval, adaptive=adaptive) if interval else None
+        self.start = start
+        self._clock = _SimulatedDay(calendar)
+        self.ticks = 0
+        self.evaluations = 0
+        self.alerts = 0
+
+    def run(self, ticks: Iterable[Tick]) -> Iterator[ReplayAlert]:
+        """
+        Replay the ticks (sorted by time) and yield the alerts in time order.
+        """
+        if self.scheduler is None:
+            return self._run_ticks(ticks)
+        return self._run_polls(ticks)
+
+    def _evaluate(self, prices: Dict[str, float], day: int) -> List[TriggeredAlert]:
+        self.evaluations += len(prices)
+        triggered = self.evaluator.evaluate(prices, day=day)
+        self.alerts += len(triggered)
+        for alert in triggered:
+            if alert.one_shot:
+                # Like the service: the ISIN is deactivated after a one-shot alert
+                self.entries.pop(alert.isin, None)
+        return triggered
+
+    def _run_ticks(self, ticks: Iterable[Tick]) -> Iterator[ReplayAlert]:
+        batch: Dict[str, float] = {}
+        times: Dict[str, float] = {}
+        batch_day = -1
+        last = float("-inf")
+        for timestamp, isin, price in ticks:
+            if timestamp < last:
+                raise ValueError(f"Ticks are not sorted by time: {isin} at {timestamp} after {last}")
+            last = timestamp
+            self.ticks += 1
+            if isin not in self.entries:
+                continue
+            if not self._clock.is_open(timestamp):
+                continue
+            if isin in batch or self._clock.day != batch_day or len(batch) >= BATCH_SIZE:
+                yield from self._flush(batch, times, batch_day)
+                batch_day = self._clock.day
+            batch[isin] = price
+            times[isin] = timestamp
+        yield from self._flush(batch, times, batch_day)
+
+    def _flush(self, batch: Dict[str, float], times: Dict[str, float], day: int) -> Iterator[ReplayAlert]:
+        if not batch:
+            return
+        triggered = self._evaluate(batch, day)
+        yield from sorted((ReplayAlert(times[alert.isin], alert) for alert in triggered), key=_order)
+        batch.clear()
+        times.clear()
+
+    def _run_polls(self, ticks: Iterable[Tick]) -> Iterator[ReplayAlert]:
+        latest: Dict[str, float] = {}  # last tick per ISIN
+        started = False
+        last = float("-inf")
+        for timestamp, isin, price in ticks:
+            if timestamp < last:
+                raise ValueError(f"Ticks are not sorted by time: {isin} at {timestamp} after {last}")
+            last = timestamp
+            self.ticks += 1
+            if isin not in self.entries:
+                continue
+            if not started:
+                # Like a freshly started service: every ISIN is due at once
+                start = timestamp if self.start is None else min(self.start, timestamp)
+                self.scheduler.sync(self.entries.values(), now=start)
+                started = True
+            # Run the polls due before this tick, then record it for the next poll
+            yield from self._polls_until(timestamp, latest, inclusive=False)
+            latest[isin] = price
+        if started:
+            yield from self._polls_until(last, latest, inclusive=True)
+
+    def _polls_until(self, until: float, latest: Dict[str, float], inclusive: bool) -> Iterator[ReplayAlert]:
+        while True:
+            now = self.scheduler.next_due()
+            if now is None or now > until or (now == until and not inclusive):
+                return
+            due = [isin for isin in self.scheduler.pop_due(now) if isin in self.entries]
+            if not self._clock.is_open(now):
+                # Outside trading hours the service sleeps until the next open
+                opening = self._clock.next_open(now)
+                for isin in due:
+                    self.scheduler.schedule(isin, opening)
+                continue
+            prices = {isin: latest[isin] for isin in due if isin in latest}
+            triggered = self._evaluate(prices, self._clock.day) if prices else []
+            yield from sorted((ReplayAlert(now, alert) for alert in triggered), key=_order)
+            for isin in due:
+                entry = self.entries.get(isin)
+                if entry is not None:
+                    self.scheduler.reschedule(entry, latest.get(isin), now=now)
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, MARKET_TIMEZONE).isoformat()
+
+
+def _record(item: ReplayAlert) -> Dict:
+    alert = item.alert
+    return {
+        "time": _format_time(item.time),
+        "isin": alert.isin,
+        "price": alert.price,
+        "rules": "+".join(fired.rule for fired in alert.alerts),
+        "reason": alert.reason,
+        "deactivated": alert.one_shot,
+    }
+
+
+class _Writer:
+    def __init__(self, f, output_format: str):
+        self._f = f
+        self._format = output_format
+        if output_format == "csv":
+            self._csv = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, record: Dict) -> None:
+        if self._format == "csv":
+            self._csv.writerow(record)
+        else:
+            self._f.write(json.dumps(record) + "\n")
+
+
+def _shard(isin: str, count: int) -> int:
+    return zlib.crc32(isin.encode()) % count
+
+
+def _open_ticks(args: argparse.Namespace, isins: Set[str]) -> Iterator[Tick]:
+    # Ticks of ISINs that are not replayed are skipped while reading
+    if args.history:
+        return read_history(args.history, args.start, args.end, isins.__contains__)
+    return heapq.merge(*(read_csv(path, isins.__contains__) for path in args.sources))
+
+
+def _partition(ticks: Iterable[Tick], paths: List[str]) -> Optional[float]:
+    """
+    Split the ticks by ISIN into one file per process. Returns the time of the first tick.
+    """
+    shards: Dict[str, int] = {}
+    chunks: List[List[Tick]] = [[] for _ in paths]
+    files = [open(path, "wb") for path in paths]
+    first = None
+    last = float("-inf")
+    try:
+        for tick in ticks:
+            timestamp, isin, _ = tick
+            if timestamp < last:
+                raise ValueError(f"Ticks are not sorted by time: {isin} at {timestamp} after {last}")
+            last = timestamp
+            if first is None:
+                first = timestamp
+            shard = shards.get(isin)
+            if shard is None:
+                shard = shards[isin] = _shard(isin, len(paths))
+            chunk = chunks[shard]
+            chunk.append(tick)
+            if len(chunk) >= SHARD_CHUNK_SIZE:
+                pickle.dump(chunk, files[shard], pickle.HIGHEST_PROTOCOL)
+                chunk.clear()
+        for chunk, f in zip(chunks, files):
+            if chunk:
+                pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+    return first
+
+
+def _read_shard(path: str) -> Iterator[Tick]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+def _load_entries(args: argparse.Namespace) -> List[ConfigEntry]:
+    entries = [ConfigEntry.from_dict(data) for data in load_config(args.config)]
+    return [entry for entry in entries if args.include_inactive or entry.active]
+
+
+def _replay(
+    args: argparse.Namespace,
+    entries: List[ConfigEntry],
+    ticks: Iterable[Tick],
+    output: str,
+    start: Optional[float] = None,
+) -> Dict[str, int]:
+    # Replay the ISINs of `entries` and write the alert records as JSON lines to `output`
+    calendar = MarketCalendar(MARKET_OPEN, MARKET_CLOSE, MARKET_HOLIDAYS) if args.market_hours else None
+    replayer = Replayer(entries, interval=args.interval, calendar=calendar, adaptive=args.adaptive, start=start)
+    with open(output, "w") as f:
+        for item in replayer.run(ticks):
+            f.write(json.dumps([item.time, _record(item)]) + "\n")
+    return {"isins": len(entries), "ticks": replayer.ticks, "evaluations": replayer.evaluations, "alerts": replayer.alerts}
+
+
+def _replay_shard(
+    args: argparse.Namespace, index: int, ticks: str, output: str, start: Optional[float]
+) -> Dict[str, int]:
+    # Runs in a worker process: replays the share of the ISINs whose ticks `_partition` wrote to `ticks`
+    entries = [entry for entry in _load_entries(args) if _shard(entry.isin, args.processes) == index]
+    return _replay(args, entries, _read_shard(ticks), output, start)
+
+
+def _read_records(path: str) -> Iterator[Tuple[float, Dict]]:
+    with open(path) as f:
+        for line in f:
+            timestamp, record = json.loads(line)
+            yield timestamp, record
+
+
+def replay(args: argparse.Namespace, out) -> Dict[str, int]:
+    """
+    Run the replay described by the parsed command line and write the alerts to `out`. Returns the counters.
+    """
+    entries = _load_entries(args)
+    isins = {entry.isin for entry in entries}
+    with tempfile.TemporaryDirectory(prefix="replay-") as workdir:
+        outputs = [os.path.join(workdir, f"shard-{index}.jsonl") for index in range(args.processes)]
+        if args.processes == 1:
+            totals = _replay(args, entries, _open_ticks(args, isins), outputs[0])
+        else:
+            # The input is read and parsed once, split by ISIN into one tick file per process
+            shards = [os.path.join(workdir, f"ticks-{index}.pickle") for index in range(args.processes)]
+            start = _partition(_open_ticks(args, isins), shards)
+            # Every process starts at the first tick of any ISIN, so the polls fall at the same times as in
+            # a single process
+            with ProcessPoolExecutor(args.processes) as pool:
+                futures = [
+                    pool.submit(_replay_shard, args, index, shard, output, start)
+                    for index, (shard, output) in enumerate(zip(shards, outputs))
+                ]
+                results = [future.result() for future in futures]
+            totals = {name: sum(result[name] for result in results) for name in results[0]}
+        writer = _Writer(out, args.format)
+        # Alerts at the same time are ordered by ISIN, so the output does not depend on the number of processes
+        merged = heapq.merge(*(_read_records(output) for output in outputs), key=lambda item: (item[0], item[1]["isin"]))
+        for _, record in merged:
+            writer.write(record)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sources", nargs="*", help='CSV files of ticks (timestamp, isin, price), "-" for stdin')
+    parser.add_argument("--history", nargs="?", const=HISTORY_DIR, help="replay the recorded price history instead")
+    parser.add_argument("--start", type=parse_timestamp, default=0.0, help="first tick of --history (epoch or ISO)")
+    parser.add_argument("--end", type=parse_timestamp, help="last tick of --history (default: now)")
+    parser.add_argument("--config", default=CONFIG_PATH, help="config with the ISINs and rules to replay")
+    parser.add_argument("--include-inactive", action="store_true", help="replay inactive ISINs too")
+    parser.add_argument("--interval", type=float, help="poll every N seconds like the service instead of every tick")
+    parser.add_argument("--adaptive", action="store_true", help="adaptive polling with --interval")
+    parser.add_argument("--market-hours", action="store_true", help="ignore ticks outside MARKET_OPEN-MARKET_CLOSE")
+    parser.add_argument("--processes", type=int, default=1, help="split the ISINs across N processes")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv", help="output format of the alerts")
+    parser.add_argument("--output", help="file for the alerts (default: stdout)")
+    args = parser.parse_args()
+    if bool(args.sources) == bool(args.history):
+        parser.error("pass either CSV files or --history")
+    if args.interval is not None and args.interval <= 0:
+        parser.error("--interval must be positive")
+    args.processes = max(1, args.processes)
+    if args.end is None:
+        args.end = time.time()
+
+    logging.basicConfig(format="[%(asctime)s] %(levelname)s: %(message)s", level=logging.INFO, datefmt="%Y-%m-%d %H:%M:%S")
+    started = time.perf_counter()
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        totals = replay(args, out)
+        out.flush()
+    except ValueError as e:
+        sys.exit(f"Replay failed: {e}")
+    except BrokenPipeError:
+        # The reader of the output went away (e.g. piped into head): stop quietly like other command line
+        # tools, and keep Python from failing again when it flushes stdout at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Replayed {totals['ticks']} tick(s) of {totals['isins']} ISIN(s) in {elapsed:.1f}s "
+        f"({totals['ticks'] / max(elapsed, 1e-9):.0f} ticks/s): {totals['alerts']} alert(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+import datetime
+import itertools
+import logging
+import math
+import os
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config_manager import ConfigEntry
+from stock_monitor import MARKET_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+RULE_WINDOW = int(os.getenv("RULE_WINDOW", "200"))  # prices kept per ISIN, limits the long moving average
+
+# Config fields of the rules beyond the plain thresholds
+RULE_FIELDS = ("pct_change_open", "pct_change_alert", "trailing_stop_pct", "ma_short", "ma_long", "rearm_pct")
+
+# Rule columns of the armed/fired matrices
+UPPER, LOWER, PCT_OPEN, PCT_ALERT, TRAILING, MA_CROSS = range(6)
+RULE_NAMES = ("upper_threshold", "lower_threshold", "pct_change_open", "pct_change_alert", "trailing_stop", "ma_crossover")
+
+# Columns of the parameter matrix, NaN where a rule is not configured
+_PARAMS = ("upper_threshold", "lower_threshold") + RULE_FIELDS
+_P = {name: column for column, name in enumerate(_PARAMS)}
+
+
+def validate_rules(fields: Mapping, window: int = RULE_WINDOW) -> Optional[str]:
+    """
+    Check the rule fields of a config entry. Returns an error message, or None if they are valid.
+    """
+    for name in ("pct_change_open", "pct_change_alert", "trailing_stop_pct"):
+        value = fields.get(name)
+        if value is not None and value <= 0:
+            return f"Invalid {name}, must be greater than 0."
+    rearm = fields.get("rearm_pct")
+    if rearm is not None and rearm < 0:
+        return "Invalid rearm_pct, must not be negative."
+    pct_open = fields.get("pct_change_open")
+    if rearm is not None and pct_open is not None and rearm >= pct_open:
+        # The since-open move could never shrink by rearm_pct points, so the rule would only re-arm at the next open
+        return "rearm_pct must be smaller than pct_change_open."
+    short, long = fields.get("ma_short"), fields.get("ma_long")
+    if (short is None) != (long is None):
+        return "ma_short and ma_long must be set together."
+    if short is not None:
+        if short != int(short) or long != int(long) or short < 1:
+            return "Invalid moving average windows, expected whole numbers of prices."
+        if short >= long:
+            return "ma_short must be smaller than ma_long."
+        if long > window:
+            return f"ma_long must not exceed {window} prices."
+    return None
+
+
+class Alert(NamedTuple):
+    isin: str
+    rule: str  # one of RULE_NAMES
+    reason: str
+    price: float
+
+
+# Batches of fewer ISINs are evaluated one ISIN at a time: below this size the fixed cost of the array
+# operations outweighs what they save (e.g. when replaying the ticks of a few ISINs)
+SMALL_BATCH = 10
+
+# Per-ISIN state arrays exported by RuleEngine.export_arrays besides the price window
+_STATE_ARRAYS = ("count", "armed", "open_day", "open_price", "baseline", "peak", "stop_price", "ma_sign")
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    # Division with NumPy's semantics (inf or NaN and a warning) instead of raising ZeroDivisionError
+    try:
+        return numerator / denominator
+    except ZeroDivisionError:
+        return float(np.float64(numerator) / denominator)
+
+
+def _optional(value: float) -> Optional[float]:
+    # NaN (not set) as None, so the state is valid JSON
+    return None if np.isnan(value) else float(value)
+
+
+def _where(condition: bool, x, y):
+    return x if condition else y
+
+
+def _fmax(x: float, y: float) -> float:
+    # np.fmax: the larger value, ignoring NaN
+    if math.isnan(x):
+        return y
+    return x if math.isnan(y) or x >= y else y
+
+
+class _Ops(NamedTuple):
+    # The operations of the rules that differ between NumPy arrays and Python floats
+    where: Callable
+    isnan: Callable
+    fmax: Callable
+    divide: Callable
+
+
+_ARRAY_OPS = _Ops(np.where, np.isnan, np.fmax, np.divide)
+_FLOAT_OPS = _Ops(_where, math.isnan, _fmax, _divide)
+
+
+class _Outcome(NamedTuple):
+    fired: List  # per rule column before MA_CROSS
+    armed: List  # per rule column
+    baseline: object  # price of the last percent-change alert, the current price if there was none
+    next_baseline: object
+    peak: object
+    next_stop_price: object
+    change_open: object
+    change_alert: object
+    drop: object
+    rearm: object  # rearm_pct, 0 where not set
+
+
+def _rules(ops: _Ops, p, params: Mapping, armed: List, new_day, open_price, baseline, peak, stop_price) -> _Outcome:
+    """
+    Evaluate the price rules except the moving average crossover. The rules are defined only here: the same
+    code runs on arrays with one row per ISIN (`_ARRAY_OPS`) and on floats for a single ISIN (`_FLOAT_OPS`).
+    `params` maps the names of `_PARAMS` to their values (NaN where a rule is not configured) and `armed`
+    holds the armed flags per rule column. Comparisons with NaN parameters are False, so unset rules never fire.
+    """
+    upper, lower = params["upper_threshold"], params["lower_threshold"]
+    rearm = ops.where(ops.isnan(params["rearm_pct"]), 0.0, params["rearm_pct"])
+    band = rearm / 100
+    baseline = ops.where(ops.isnan(baseline), p, baseline)
+
+    # Thresholds re-arm once the price is back beyond the threshold by the hysteresis band
+    reached_upper = p >= upper
+    rearmed_upper = p < upper * (1 - band)
+    reached_lower = p <= lower
+    rearmed_lower = p > lower * (1 + band)
+    # Percent change since the day's open re-arms once the move shrinks by rearm_pct points, and at every open
+    change_open = (ops.divide(p, open_price) - 1) * 100
+    reached_open = abs(change_open) >= params["pct_change_open"]
+    rearmed_open = new_day | (abs(change_open) < params["pct_change_open"] - rearm)
+    # Percent change since the last alert: the baseline moves to the alert price, so it is always armed
+    change_alert = (ops.divide(p, baseline) - 1) * 100
+    reached_alert = abs(change_alert) >= params["pct_change_alert"]
+    # Trailing stop: drop from the high since it was armed; re-arms once the price recovers above the stop
+    peak = ops.where(armed[TRAILING], ops.fmax(peak, p), p)
+    drop = (1 - ops.divide(p, peak)) * 100
+    reached_trailing = drop >= params["trailing_stop_pct"]
+    rearmed_trailing = p >= stop_price * (1 + band)
+
+    fired = [
+        reached_upper & armed[UPPER],
+        reached_lower & armed[LOWER],
+        reached_open & armed[PCT_OPEN],
+        reached_alert & armed[PCT_ALERT],
+        reached_trailing & armed[TRAILING],
+    ]
+    armed = list(armed)
+    armed[UPPER] = ops.where(reached_upper, False, armed[UPPER] | rearmed_upper)
+    armed[LOWER] = ops.where(reached_lower, False, armed[LOWER] | rearmed_lower)
+    armed[PCT_OPEN] = ops.where(reached_open, False, armed[PCT_OPEN] | rearmed_open)
+    armed[TRAILING] = ops.where(fired[TRAILING], False, armed[TRAILING] | rearmed_trailing)
+    return _Outcome(
+        fired,
+        armed,
+        baseline,
+        ops.where(fired[PCT_ALERT], p, baseline),
+        peak,
+        ops.where(fired[TRAILING], p, stop_price),
+        change_open,
+        change_alert,
+        drop,
+        rearm,
+    )
+
+
+def _ma_cross(ops: _Ops, short_ma, long_ma, rearm, previous) -> Tuple:
+    """
+    Evaluate the moving average crossover given the side of the last crossing (`previous`, 0 if none yet).
+    Returns whether it fired and the new side; within the hysteresis band the side is kept.
+    """
+    diff_pct = (ops.divide(short_ma, long_ma) - 1) * 100
+    side = ops.where(diff_pct > rearm, 1, ops.where(diff_pct < -rearm, -1, 0))
+    fired = (previous != 0) & (side != 0) & (side != previous)
+    return fired, ops.where(side != 0, side, previous)
+
+
+class RuleEngine:
+    """
+    Evaluates the alert rules of all ISINs for a whole sweep with batched NumPy operations; batches of
+    fewer than `small_batch` ISINs are evaluated one ISIN at a time with the same results.
+    Per ISIN it keeps a ring buffer of the last `window` prices (for moving averages), the first price of
+    the trading day, the price of the last alert and the high since the trailing stop was armed.
+    Every rule is edge-triggered: after it fires it is disarmed until the price has moved back by
+    `rearm_pct` percent (hysteresis), so a re-armed entry does not alert on every sweep.
+    """
+
+    def __init__(self, window: int = RULE_WINDOW, capacity: int = 64, small_batch: int = SMALL_BATCH):
+        self.window = max(2, window)
+        self.small_batch = small_batch
+        self._slots: Dict[str, int] = {}  # ISIN -> row in the state arrays
+        self._entries: Dict[str, ConfigEntry] = {}
+        self._free: List[int] = []
+        self._capacity = 0
+        self._ring = np.empty((0, self.window))
+        self._pos = np.empty(0, dtype=np.int64)  # next write position in the ring buffer
+        self._count = np.empty(0, dtype=np.int64)  # prices in the ring buffer
+        self._params = np.empty((0, len(_PARAMS)))
+        self._armed = np.empty((0, len(RULE_NAMES)), dtype=bool)
+        self._open_day = np.empty(0, dtype=np.int64)
+        self._open_price = np.empty(0)
+        self._baseline = np.empty(0)  # price of the last percent-change alert
+        self._peak = np.empty(0)  # high since the trailing stop was armed
+        self._stop_price = np.empty(0)  # price at which the trailing stop last fired
+        self._ma_sign = np.empty(0, dtype=np.int8)  # side of the short MA relative to the long MA
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _grow(self, capacity: int) -> None:
+        extra = capacity - self._capacity
+        self._ring = np.concatenate([self._ring, np.full((extra, self.window), np.nan)])
+        self._pos = np.concatenate([self._pos, np.zeros(extra, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(extra, dtype=np.int64)])
+        self._params = np.concatenate([self._params, np.full((extra, len(_PARAMS)), np.nan)])
+        self._armed = np.concatenate([self._armed, np.ones((extra, len(RULE_NAMES)), dtype=bool)])
+        self._open_day = np.concatenate([self._open_day, np.full(extra, -1, dtype=np.int64)])
+        self._open_price = np.concatenate([self._open_price, np.full(extra, np.nan)])
+        self._baseline = np.concatenate([self._baseline, np.full(extra, np.nan)])
+        self._peak = np.concatenate([self._peak, np.full(extra, np.nan)])
+        self._stop_price = np.concatenate([self._stop_price, np.full(extra, np.nan)])
+        self._ma_sign = np.concatenate([self._ma_sign, np.zeros(extra, dtype=np.int8)])
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def _reset_alert_state(self, slot: int) -> None:
+        self._armed[slot] = True
+        self._baseline[slot] = np.nan
+        self._peak[slot] = np.nan
+        self._stop_price[slot] = np.nan
+        self._ma_sign[slot] = 0
+
+    def _reset(self, slot: int) -> None:
+        self._reset_alert_state(slot)
+        self._ring[slot] = np.nan
+        self._pos[slot] = 0
+        self._count[slot] = 0
+        self._params[slot] = np.nan
+        self._open_day[slot] = -1
+        self._open_price[slot] = np.nan
+
+    def _set_params(self, slot: int, entry: ConfigEntry) -> None:
+        values = {name: getattr(entry, name) for name in _PARAMS}
+        # Invalid rules from a hand-edited config.json are disabled instead of alerting on every sweep
+        groups = [(name,) for name in ("pct_change_open", "pct_change_alert", "trailing_stop_pct", "rearm_pct")]
+        for group in groups + [("ma_short", "ma_long")]:
+            error = validate_rules({name: values[name] for name in group}, self.window)
+            if error:
+                logger.warning(f"Ignoring {'/'.join(group)} of ISIN {entry.isin}: {error}")
+                values.update(dict.fromkeys(group))
+        self._params[slot] = [np.nan if values[name] is None else values[name] for name in _PARAMS]
+
+    def sync(self, entries: Iterable[ConfigEntry]) -> None:
+        """
+        Align the engine with the active config entries. New ISINs get fresh state, removed ISINs are
+        dropped, and changing an entry re-arms all of its rules (the price window is kept).
+        """
+        current = {}
+        for entry in entries:
+            current[entry.isin] = entry
+            slot = self._slots.get(entry.isin)
+            if slot is None:
+                if not self._free:
+                    self._grow(self._capacity * 2)
+                slot = self._slots[entry.isin] = self._free.pop()
+                self._reset(slot)
+            elif self._entries[entry.isin] == entry:
+                continue
+            else:
+                self._reset_alert_state(slot)
+            self._entries[entry.isin] = entry
+            self._set_params(slot, entry)
+        for isin in [isin for isin in self._slots if isin not in current]:
+            self._free.append(self._slots.pop(isin))
+            del self._entries[isin]
+
+    def export_state(self, isins: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Return the rolling state of the given ISINs as JSON-serializable dicts, e.g. to hand ISINs over
+        to another worker. ISINs the engine does not track are skipped.
+        """
+        states = {}
+        for isin in isins:
+            slot = self._slots.get(isin)
+            if slot is None:
+                continue
+            count = int(self._count[slot])
+            # Oldest price first
+            window = np.roll(self._ring[slot], -int(self._pos[slot]))[self.window - count :]
+            states[isin] = {
+                "prices": window.tolist(),
+                "armed": self._armed[slot].tolist(),
+                "open_day": int(self._open_day[slot]),
+                "open_price": _optional(self._open_price[slot]),
+                "baseline": _optional(self._baseline[slot]),
+                "peak": _optional(self._peak[slot]),
+                "stop_price": _optional(self._stop_price[slot]),
+                "ma_sign": int(self._ma_sign[slot]),
+            }
+        return states
+
+    def import_state(self, states: Mapping[str, Dict]) -> None:
+        """
+        Restore rolling state exported by `export_state` for ISINs the engine tracks (call after `sync`).
+        """
+        for isin, state in states.items():
+            slot = self._slots.get(isin)
+            if slot is None:
+                continue
+            try:
+                prices = [float(price) for price in state["prices"]][-self.window :]
+                armed = [bool(value) for value in state["armed"]]
+                if len(armed) != len(RULE_NAMES):
+                    raise ValueError(f"expected {len(RULE_NAMES)} armed flags")
+                self._ring[slot] = np.nan
+                self._ring[slot, : len(prices)] = prices
+                self._pos[slot] = len(prices) % self.window
+                self._count[slot] = len(prices)
+                self._armed[slot] = armed
+                self._open_day[slot] = int(state["open_day"])
+                for name, array in (
+                    ("open_price", self._open_price),
+                    ("baseline", self._baseline),
+                    ("peak", self._peak),
+                    ("stop_price", self._stop_price),
+                ):
+                    array[slot] = np.nan if state[name] is None else float(state[name])
+                self._ma_sign[slot] = int(state["ma_sign"])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid rule state of ISIN {isin}: {e}")
+                self._reset(slot)
+                self._set_params(slot, self._entries[isin])
+
+    def export_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Return the rolling state of all tracked ISINs as arrays with one row per ISIN (prices oldest first,
+        NaN-padded), e.g. to persist it across restarts with `import_arrays`.
+        """
+        isins = list(self._slots)
+        idx = np.fromiter((self._slots[isin] for isin in isins), dtype=np.int64, count=len(isins))
+        columns = (self._pos[idx, None] + np.arange(self.window)) % self.window
+        arrays = {"isins": np.array(isins, dtype=str), "prices": self._ring[idx[:, None], columns]}
+        for name in _STATE_ARRAYS:
+            arrays[name] = getattr(self, f"_{name}")[idx]
+        return arrays
+
+    def import_arrays(self, arrays: Mapping[str, np.ndarray]) -> int:
+        """
+        Restore state exported by `export_arrays` for the ISINs the engine tracks (call after `sync`).
+        Returns the number of restored ISINs. Raises KeyError or ValueError for incompatible arrays.
+        """
+        isins = arrays["isins"].tolist()
+        rows = np.fromiter((row for row, isin in enumerate(isins) if isin in self._slots), dtype=np.int64)
+        if not len(rows):
+            return 0
+        if arrays["armed"].shape[1:] != (len(RULE_NAMES),):
+            raise ValueError(f"expected {len(RULE_NAMES)} armed flags per ISIN")
+        idx = np.fromiter((self._slots[isins[row]] for row in rows), dtype=np.int64, count=len(rows))
+        prices = arrays["prices"][rows]
+        # The window may have been resized since the export: keep the newest prices that fit
+        width = min(prices.shape[1], self.window)
+        ring = np.full((len(rows), self.window), np.nan)
+        ring[:, self.window - width :] = prices[:, prices.shape[1] - width :]
+        self._ring[idx] = ring
+        self._pos[idx] = 0
+        self._count[idx] = np.minimum(arrays["count"][rows], width)
+        for name in _STATE_ARRAYS:
+            if name != "count":
+                getattr(self, f"_{name}")[idx] = arrays[name][rows]
+        return len(rows)
+
+    def evaluate(self, prices: Mapping[str, float], day: Optional[int] = None) -> List[Alert]:
+        """
+        Add one price per ISIN to the rolling state and evaluate all rules for the whole batch.
+        `day` identifies the trading day (e.g. a date ordinal); the first price of a new day is the open.
+        Returns the alerts that fired, grouped by ISIN in the order of `prices`.
+        """
+        isins = [isin for isin in prices if isin in self._slots]
+        if not isins:
+            return []
+        if day is None:
+            day = datetime.datetime.now(MARKET_TIMEZONE).date().toordinal()
+        if len(isins) < self.small_batch:
+            alerts = []
+            for isin in isins:
+                alerts.extend(self._evaluate_one(isin, prices[isin], day))
+            return alerts
+        idx = np.fromiter((self._slots[isin] for isin in isins), dtype=np.int64, count=len(isins))
+        p = np.fromiter((prices[isin] for isin in isins), dtype=float, count=len(isins))
+
+        # Rolling state
+        new_day = self._open_day[idx] != day
+        self._open_day[idx[new_day]] = day
+        self._open_price[idx[new_day]] = p[new_day]
+        self._ring[idx, self._pos[idx]] = p
+        self._pos[idx] = (self._pos[idx] + 1) % self.window
+        count = self._count[idx] = np.minimum(self._count[idx] + 1, self.window)
+
+        params = self._params[idx]
+        outcome = _rules(
+            _ARRAY_OPS,
+            p,
+            {name: params[:, column] for name, column in _P.items()},
+            list(self._armed[idx].T),
+            new_day,
+            self._open_price[idx],
+            self._baseline[idx],
+            self._peak[idx],
+            self._stop_price[idx],
+        )
+        fired = np.zeros((len(isins), len(RULE_NAMES)), dtype=bool)
+        fired[:, :MA_CROSS] = np.column_stack(outcome.fired)
+        self._armed[idx] = np.column_stack(outcome.armed)
+        self._baseline[idx] = outcome.next_baseline
+        self._peak[idx] = outcome.peak
+        self._stop_price[idx] = outcome.next_stop_price
+
+        # Moving average crossover, only for ISINs with enough prices for the long average
+        ma_short, ma_long = params[:, _P["ma_short"]], params[:, _P["ma_long"]]
+        ma_rows = np.flatnonzero(~np.isnan(ma_long) & (count >= np.nan_to_num(ma_long, nan=np.inf)))
+        ma_values = {}
+        if ma_rows.size:
+            slots = idx[ma_rows]
+            short_n = ma_short[ma_rows].astype(np.int64)
+            long_n = ma_long[ma_rows].astype(np.int64)
+            depth = int(long_n.max())
+            # Most recent price first
+            order = (self._pos[slots, None] - 1 - np.arange(depth)) % self.window
+            sums = np.cumsum(np.take_along_axis(self._ring[slots], order, axis=1), axis=1)
+            rows = np.arange(ma_rows.size)
+            short_ma = sums[rows, short_n - 1] / short_n
+            long_ma = sums[rows, long_n - 1] / long_n
+            fired[ma_rows, MA_CROSS], self._ma_sign[slots] = _ma_cross(
+                _ARRAY_OPS, short_ma, long_ma, outcome.rearm[ma_rows], self._ma_sign[slots]
+            )
+            ma_values = dict(zip(ma_rows.tolist(), zip(short_ma.tolist(), long_ma.tolist())))
+
+        return [
+            self._alert(
+                isins[row],
+                idx[row],
+                rule,
+                float(p[row]),
+                outcome.change_open[row],
+                outcome.change_alert[row],
+                outcome.baseline[row],
+                outcome.drop[row],
+                outcome.peak[row],
+                ma_values.get(row),
+            )
+            for row, rule in zip(*np.nonzero(fired))
+        ]
+
+    def _evaluate_one(self, isin: str, price: float, day: int) -> List[Alert]:
+        # evaluate() for a single ISIN: the same rules on Python floats, which is much faster than arrays of one
+        slot = self._slots[isin]
+        p = float(price)
+
+        # Rolling state
+        new_day = self._open_day[slot] != day
+        if new_day:
+            self._open_day[slot] = day
+            self._open_price[slot] = p
+        pos = int(self._pos[slot])
+        self._ring[slot, pos] = p
+        pos = self._pos[slot] = (pos + 1) % self.window
+        count = self._count[slot] = min(int(self._count[slot]) + 1, self.window)
+
+        params = dict(zip(_PARAMS, self._params[slot].tolist()))
+        outcome = _rules(
+            _FLOAT_OPS,
+            p,
+            params,
+            self._armed[slot].tolist(),
+            bool(new_day),
+            float(self._open_price[slot]),
+            float(self._baseline[slot]),
+            float(self._peak[slot]),
+            float(self._stop_price[slot]),
+        )
+        fired = outcome.fired + [False]
+        self._armed[slot] = outcome.armed
+        self._baseline[slot] = outcome.next_baseline
+        self._peak[slot] = outcome.peak
+        self._stop_price[slot] = outcome.next_stop_price
+
+        ma = None
+        ma_short, ma_long = params["ma_short"], params["ma_long"]
+        if not math.isnan(ma_long) and count >= ma_long:
+            short_n, long_n = int(ma_short), int(ma_long)
+            # The last long_n prices, most recent first, summed one by one like np.cumsum in the array version
+            ring = self._ring[slot]
+            end = (pos - 1) % self.window + 1
+            if end >= long_n:
+                recent = ring[end - long_n : end].tolist()
+            else:
+                recent = ring[end - long_n :].tolist() + ring[:end].tolist()
+            recent.reverse()
+            sums = list(itertools.accumulate(recent))
+            short_ma = sums[short_n - 1] / short_n
+            long_ma = sums[long_n - 1] / long_n
+            fired[MA_CROSS], self._ma_sign[slot] = _ma_cross(
+                _FLOAT_OPS, short_ma, long_ma, outcome.rearm, int(self._ma_sign[slot])
+            )
+            ma = (short_ma, long_ma)
+
+        return [
+            self._alert(
+                isin,
+                slot,
+                rule,
+                p,
+                outcome.change_open,
+                outcome.change_alert,
+                outcome.baseline,
+                outcome.drop,
+                outcome.peak,
+                ma,
+            )
+            for rule in range(len(RULE_NAMES))
+            if fired[rule]
+        ]
+
+    def _alert(
+        self,
+        isin: str,
+        slot: int,
+        rule: int,
+        price: float,
+        change_open: float,
+        change_alert: float,
+        baseline: float,
+        drop: float,
+        peak: float,
+        ma: Optional[Tuple[float, float]],
+    ) -> Alert:
+        entry = self._entries[isin]
+        if rule == UPPER:
+            reason = f"reached or exceeded upper threshold {entry.upper_threshold}"
+        elif rule == LOWER:
+            reason = f"reached or fell below lower threshold {entry.lower_threshold}"
+        elif rule == PCT_OPEN:
+            reason = f"moved {change_open:+.2f}% since the open at {self._open_price[slot]}"
+        elif rule == PCT_ALERT:
+            reason = f"moved {change_alert:+.2f}% since the last alert at {baseline}"
+        elif rule == TRAILING:
+            reason = f"fell {drop:.2f}% from its high of {peak} (trailing stop {entry.trailing_stop_pct}%)"
+        else:
+            short_ma, long_ma = ma
+            direction = "above" if self._ma_sign[slot] > 0 else "below"
+            reason = (
+                f"{entry.ma_short}-price moving average ({short_ma:.4f}) crossed {direction} "
+                f"the {entry.ma_long}-price moving average ({long_ma:.4f})"
+            )
+        return Alert(isin, RULE_NAMES[rule], reason, price)
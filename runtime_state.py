@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from price_cache import CachedPrice
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_STATE_PATH = os.getenv("RUNTIME_STATE_PATH", "runtime_state.npz")  # empty disables the snapshot
+RUNTIME_STATE_INTERVAL = float(os.getenv("RUNTIME_STATE_INTERVAL", "60"))  # seconds between periodic snapshots
+RUNTIME_STATE_MAX_AGE = float(os.getenv("RUNTIME_STATE_MAX_AGE", "86400"))  # older snapshots are ignored at boot
+
+_FORMAT_VERSION = 1
+_RULES_PREFIX = "rules_"
+
+
+class RuntimeState(NamedTuple):
+    saved_at: float  # wall-clock time (epoch seconds)
+    prices: Dict[str, Tuple[float, float]]  # ISIN -> (price, fetched_at)
+    due: Dict[str, float]  # ISIN -> wall-clock next due time
+    health: Dict  # HealthTracker.export_state
+    rules: Dict[str, np.ndarray]  # RuleEngine.export_arrays
+
+
+def save_runtime_state(
+    path: str,
+    prices: Mapping[str, CachedPrice],
+    due: Mapping[str, float],
+    health: Dict,
+    rules: Mapping[str, np.ndarray],
+) -> None:
+    """
+    Write a snapshot of the monitoring state as one uncompressed NumPy archive.
+    Prices and due times are stored as arrays and the rule state as the engine's own arrays, so saving
+    and loading stay a handful of array copies however many ISINs are watched. The file is written to
+    a temporary file in the same directory and renamed over the old one.
+    """
+    price_isins = list(prices)
+    due_isins = list(due)
+    arrays = {
+        "format": np.array(_FORMAT_VERSION),
+        "saved_at": np.array(time.time()),
+        "price_isins": np.array(price_isins, dtype=str),
+        "price": np.fromiter((prices[isin].price for isin in price_isins), dtype=float, count=len(price_isins)),
+        "fetched_at": np.fromiter(
+            (prices[isin].fetched_at for isin in price_isins), dtype=float, count=len(price_isins)
+        ),
+        "due_isins": np.array(due_isins, dtype=str),
+        "due": np.fromiter((due[isin] for isin in due_isins), dtype=float, count=len(due_isins)),
+        "health": np.array(json.dumps(health)),
+    }
+    for name, values in rules.items():
+        arrays[_RULES_PREFIX + name] = values
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".runtime-state-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_runtime_state(path: str, max_age: float = RUNTIME_STATE_MAX_AGE) -> Optional[RuntimeState]:
+    """
+    Load a snapshot written by `save_runtime_state`. Returns None (and logs why) if there is none,
+    it cannot be read or it is older than `max_age` seconds.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format"]) != _FORMAT_VERSION:
+                logger.warning(f"Ignoring runtime state {path} in unknown format {int(data['format'])}")
+                return None
+            saved_at = float(data["saved_at"])
+            age = time.time() - saved_at
+            if age > max_age:
+                logger.info(f"Ignoring runtime state {path} saved {age:.0f} seconds ago")
+                return None
+            prices = dict(
+                zip(data["price_isins"].tolist(), zip(data["price"].tolist(), data["fetched_at"].tolist()))
+            )
+            due = dict(zip(data["due_isins"].tolist(), data["due"].tolist()))
+            health = json.loads(str(data["health"]))
+            rules = {
+                name[len(_RULES_PREFIX) :]: data[name] for name in data.files if name.startswith(_RULES_PREFIX)
+            }
+    except FileNotFoundError:
+        return None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.error(f"Could not load runtime state {path}: {e}")
+        return None
+    return RuntimeState(saved_at, prices, due, health, rules)
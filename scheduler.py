@@ -0,0 +1,251 @@
+import datetime
+import heapq
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from config_manager import ConfigEntry
+from stock_monitor import MARKET_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "false").lower() in ("1", "true", "yes")
+MIN_POLL_INTERVAL = float(os.getenv("MIN_POLL_INTERVAL", "15"))  # seconds, fastest adaptive poll rate
+ADAPTIVE_NEAR_PCT = float(os.getenv("ADAPTIVE_NEAR_PCT", "5"))  # distance to a threshold (%) where polling speeds up
+
+
+def parse_holidays(value: Optional[str], path: Optional[str] = None) -> Set[datetime.date]:
+    """
+    Parse market holidays from a comma-separated list of YYYY-MM-DD dates and/or
+    a file with one date per line ('#' starts a comment). Invalid dates are logged and skipped.
+    """
+    items = (value or "").split(",")
+    if path:
+        try:
+            with open(path) as f:
+                items.extend(line.split("#", 1)[0] for line in f)
+        except OSError as e:
+            logger.error(f"Could not read market holidays file '{path}': {e}")
+    holidays = set()
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            holidays.add(datetime.date.fromisoformat(item))
+        except ValueError:
+            logger.warning(f"Ignoring invalid market holiday '{item}', expected YYYY-MM-DD")
+    return holidays
+
+
+# Market open/close times, defaulting to 07:30 and 22:00
+MARKET_OPEN_STR = os.getenv("MARKET_OPEN", "07:30")
+MARKET_CLOSE_STR = os.getenv("MARKET_CLOSE", "22:00")
+MARKET_OPEN = datetime.datetime.strptime(MARKET_OPEN_STR, "%H:%M").time()
+MARKET_CLOSE = datetime.datetime.strptime(MARKET_CLOSE_STR, "%H:%M").time()
+# Market holidays as comma-separated YYYY-MM-DD dates and/or a file with one date per line
+MARKET_HOLIDAYS = parse_holidays(os.getenv("MARKET_HOLIDAYS"), os.getenv("MARKET_HOLIDAYS_FILE"))
+
+
+class MarketCalendar:
+    """
+    Trading hours of the German market (Tradegate): open on weekdays between `market_open`
+    and `market_close` (Europe/Berlin), except on the given holidays.
+    """
+
+    def __init__(
+        self,
+        market_open: datetime.time,
+        market_close: datetime.time,
+        holidays: Iterable[datetime.date] = (),
+        tz: datetime.tzinfo = MARKET_TIMEZONE,
+    ):
+        self.market_open = market_open
+        self.market_close = market_close
+        self.holidays = set(holidays)
+        self.tz = tz
+
+    def _now(self, now: Optional[datetime.datetime]) -> datetime.datetime:
+        return now.astimezone(self.tz) if now is not None else datetime.datetime.now(self.tz)
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def trading_day(self, now: Optional[datetime.datetime] = None) -> int:
+        """
+        Ordinal of the current date in the market timezone, identifying the trading session.
+        """
+        return self._now(now).date().toordinal()
+
+    def is_open(self, now: Optional[datetime.datetime] = None) -> bool:
+        now = self._now(now)
+        return self.is_trading_day(now.date()) and self.market_open <= now.time() <= self.market_close
+
+    def _localize(self, day: datetime.date, at: datetime.time) -> datetime.datetime:
+        naive = datetime.datetime.combine(day, at)
+        # pytz zones need localize() to pick the right UTC offset; other tzinfos can be attached directly
+        localize = getattr(self.tz, "localize", None)
+        return localize(naive) if localize else naive.replace(tzinfo=self.tz)
+
+    def session(self, day: datetime.date) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Return the open and close of the trading session on a day, or None if there is none.
+        """
+        if not self.is_trading_day(day):
+            return None
+        return self._localize(day, self.market_open), self._localize(day, self.market_close)
+
+    def next_open(self, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """
+        Return the next market open after `now` (or `now` itself if the market is open).
+        """
+        now = self._now(now)
+        if self.is_open(now):
+            return now
+        day = now.date()
+        for _ in range(366):
+            if self.is_trading_day(day):
+                opening = self._localize(day, self.market_open)
+                if opening > now:
+                    return opening
+            day += datetime.timedelta(days=1)
+        raise ValueError("No trading day found within a year, check MARKET_HOLIDAYS")
+
+    def next_close(self, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """
+        Return the close of the current (or next) trading session.
+        """
+        opening = self.next_open(now)
+        return self._localize(opening.date(), self.market_close)
+
+    def seconds_until_close(self, now: Optional[datetime.datetime] = None) -> float:
+        now = self._now(now)
+        return max(0.0, (self.next_close(now) - now).total_seconds())
+
+    def seconds_until_open(self, now: Optional[datetime.datetime] = None) -> float:
+        now = self._now(now)
+        return max(0.0, (self.next_open(now) - now).total_seconds())
+
+
+class PollScheduler:
+    """
+    Priority queue (heap) of next-due poll times per ISIN.
+    Each ISIN has its own interval: the entry's `poll_interval` or the default interval, shortened by
+    adaptive polling as the last price approaches one of the entry's thresholds.
+    Stale heap items (rescheduled or removed ISINs) are skipped lazily when popped.
+    """
+
+    def __init__(
+        self,
+        default_interval: float,
+        adaptive: bool = ADAPTIVE_POLLING,
+        min_interval: float = MIN_POLL_INTERVAL,
+        near_pct: float = ADAPTIVE_NEAR_PCT,
+    ):
+        self.default_interval = default_interval
+        self.adaptive = adaptive
+        self.min_interval = min(min_interval, default_interval)
+        self.near_pct = near_pct
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}  # ISIN -> monotonic due time of its live heap item
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, isin: str) -> bool:
+        return isin in self._due
+
+    def schedule(self, isin: str, due: float) -> None:
+        self._due[isin] = due
+        heapq.heappush(self._heap, (due, isin))
+
+    def sync(self, entries: Iterable[ConfigEntry], now: Optional[float] = None) -> None:
+        """
+        Align the schedule with the active config entries: new ISINs become due immediately,
+        ISINs that were removed or deactivated are dropped.
+        """
+        now = time.monotonic() if now is None else now
+        isins = set()
+        for entry in entries:
+            isins.add(entry.isin)
+            if entry.isin not in self._due:
+                self.schedule(entry.isin, now)
+        for isin in [isin for isin in self._due if isin not in isins]:
+            del self._due[isin]
+        if len(self._heap) > 2 * len(self._due) + 64:
+            # Drop accumulated stale items
+            self._heap = [(due, isin) for isin, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Remove and return all ISINs that are due. They are not scheduled again until `reschedule` is called.
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, isin = heapq.heappop(self._heap)
+            if self._due.get(isin) == when:
+                del self._due[isin]
+                due.append(isin)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        """
+        Monotonic time at which the next ISIN is due, or None if nothing is scheduled.
+        """
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def export_due(self) -> Dict[str, float]:
+        """
+        Next due time of every scheduled ISIN as wall-clock time (epoch seconds), e.g. to persist the schedule.
+        """
+        offset = time.time() - time.monotonic()
+        return {isin: due + offset for isin, due in self._due.items()}
+
+    def restore(self, due_times: Mapping[str, float]) -> int:
+        """
+        Move scheduled ISINs to the wall-clock due times exported by `export_due`. ISINs that fell due while
+        the service was down keep their previous phase within the default interval instead of all becoming
+        due at once. Returns the number of restored ISINs.
+        """
+        now_wall, now = time.time(), time.monotonic()
+        restored = 0
+        for isin, due in due_times.items():
+            if isin not in self._due:
+                continue
+            delay = due - now_wall
+            if delay < 0:
+                delay %= self.default_interval
+            self.schedule(isin, now + delay)
+            restored += 1
+        return restored
+
+    def interval(self, entry: ConfigEntry, price: Optional[float]) -> float:
+        """
+        Poll interval for an entry given its last price.
+        With adaptive polling the interval shrinks linearly from the base interval (at `near_pct` percent
+        or more away from the nearest threshold) down to `min_interval` (at the threshold).
+        """
+        base = entry.poll_interval or self.default_interval
+        if not self.adaptive or price is None or price <= 0 or self.near_pct <= 0:
+            return base
+        thresholds = [t for t in (entry.upper_threshold, entry.lower_threshold) if t is not None]
+        if not thresholds:
+            return base
+        distance_pct = min(abs(price - threshold) for threshold in thresholds) / price * 100
+        ratio = min(1.0, distance_pct / self.near_pct)
+        fastest = min(self.min_interval, base)
+        return fastest + (base - fastest) * ratio
+
+    def reschedule(self, entry: ConfigEntry, price: Optional[float], now: Optional[float] = None) -> float:
+        """
+        Schedule the next poll of an entry after a fetch. Returns the interval used.
+        """
+        now = time.monotonic() if now is None else now
+        interval = self.interval(entry, price)
+        self.schedule(entry.isin, now + interval)
+        return interval
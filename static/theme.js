@@ -6,8 +6,61 @@ function toggleTheme() {
         localStorage.setItem('theme', 'light');
     }
 }
+
+function formatTimestamp(seconds) {
+    // Same format as the server-rendered page: YYYY-MM-DD HH:MM:SS in local time
+    const date = new Date(seconds * 1000);
+    const pad = (value) => String(value).padStart(2, '0');
+    return date.getFullYear() + '-' + pad(date.getMonth() + 1) + '-' + pad(date.getDate()) + ' ' +
+        pad(date.getHours()) + ':' + pad(date.getMinutes()) + ':' + pad(date.getSeconds());
+}
+
+function startLiveUpdates() {
+    // Update the rows of the admin page in place from the /api/stream Server-Sent Events
+    const table = document.getElementById('config-table');
+    if (!table || !table.dataset.stream || !window.EventSource || !table.querySelector('tr[data-isin]')) {
+        return;
+    }
+    const row = (isin) => table.querySelector('tr[data-isin="' + isin + '"]');
+    // EventSource reconnects by itself after network errors and after the server drops a slow client
+    const source = new EventSource(table.dataset.stream);
+    source.addEventListener('price', (event) => {
+        const data = JSON.parse(event.data);
+        const tr = row(data.isin);
+        if (!tr) {
+            return;
+        }
+        const price = tr.querySelector('td.price');
+        price.textContent = data.price;
+        const upper = parseFloat(tr.querySelector('input[name="upper_threshold"]').value);
+        const lower = parseFloat(tr.querySelector('input[name="lower_threshold"]').value);
+        const triggered = (!isNaN(upper) && data.price >= upper) || (!isNaN(lower) && data.price <= lower);
+        price.classList.toggle('triggered', triggered);
+        price.title = triggered ? 'At or beyond a threshold' : '';
+        tr.querySelector('td.fetched-at').textContent = formatTimestamp(data.fetched_at);
+    });
+    source.addEventListener('alert', (event) => {
+        const data = JSON.parse(event.data);
+        const tr = row(data.isin);
+        if (tr) {
+            tr.classList.add('alerted');
+            tr.title = 'Alert: ' + data.reason + ' (price: ' + data.price + ')';
+        }
+    });
+    source.addEventListener('active', (event) => {
+        const data = JSON.parse(event.data);
+        const tr = row(data.isin);
+        if (!tr) {
+            return;
+        }
+        tr.querySelector('input[name="active"]').checked = data.active;
+        tr.classList.toggle('deleted', Boolean(data.deleted));
+    });
+}
+
 window.onload = function () {
     if (localStorage.getItem('theme') === 'dark') {
         document.body.classList.add('dark-theme');
     }
+    startLiveUpdates();
 }
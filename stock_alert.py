@@ -1,21 +1,26 @@
+import contextlib
 import datetime
 import logging
 import os
 import signal
 import threading
-import time  # Added back to ensure time.sleep works
+import time
 import traceback
 
 from dotenv import load_dotenv
 from flask import Flask
 
-from admin_ui import admin_ui
-from api import api
-from stock_monitor import get_stock_price, is_market_open
-
-# Load environment variables from .env file
+# Load environment variables from .env file before importing modules that read them at import time
 load_dotenv()
-from config_manager import CONFIG_PATH, config_lock, load_config, save_config, shared_config  # noqa: E402
+from admin_ui import admin_ui  # noqa: E402
+from alert_evaluator import AlertEvaluator  # noqa: E402
+from api import api  # noqa: E402
+from compression import GZIP_LEVEL, GZIP_MIN_SIZE, compress_response  # noqa: E402
+from config_follower import CONFIG_POLL_INTERVAL, FRONTEND_URL, ConfigFollower  # noqa: E402
+from config_manager import CONFIG_PATH, config_store, load_config  # noqa: E402
+from config_persister import CONFIG_JOURNAL, CONFIG_SAVE_DEBOUNCE, ConfigPersister  # noqa: E402
+from config_view import CONFIG_PAGE_SIZE  # noqa: E402
+from coordinator import COORDINATION_DB, WORKER_ID, WORKER_LEASE, WORKER_VNODES, Coordinator  # noqa: E402
 from email_utils import (  # noqa: E402
     EMAIL_FROM,
     EMAIL_TO,
@@ -23,19 +28,61 @@ from email_utils import (  # noqa: E402
     SMTP_PORT,
     SMTP_SERVER,
     SMTP_USERNAME,
-    send_email,
 )
+from event_stream import (  # noqa: E402
+    ALERT,
+    PRICE,
+    STREAM_HEARTBEAT,
+    STREAM_MAX_CLIENTS,
+    STREAM_QUEUE_SIZE,
+    event_broker,
+)
+from health import BREAKER_BASE_BACKOFF, BREAKER_FAILURE_THRESHOLD, health_tracker  # noqa: E402
+from history_store import HISTORY_DIR, HISTORY_ENABLED, history_store  # noqa: E402
+from http_client import http_stats  # noqa: E402
+from metrics import (  # noqa: E402
+    ALERTS,
+    REGISTRY,
+    RULE_EVALUATION_SECONDS,
+    SWEEP_ISINS,
+    SWEEP_LAG_SECONDS,
+    SWEEP_SECONDS,
+    Gauge,
+)
+from notifier import EMAIL_DIGEST, EMAIL_SPOOL_DIR, notifier  # noqa: E402
+from price_cache import PRICE_CACHE_SIZE, PRICE_CACHE_TTL, price_cache  # noqa: E402
+from price_fetcher import FETCH_MAX_PER_HOST, FETCH_RETRIES, FETCH_WORKERS, PriceFetcher  # noqa: E402
+from rules import RULE_WINDOW, RuleEngine  # noqa: E402
+from runtime_state import (  # noqa: E402
+    RUNTIME_STATE_INTERVAL,
+    RUNTIME_STATE_MAX_AGE,
+    RUNTIME_STATE_PATH,
+    load_runtime_state,
+    save_runtime_state,
+)
+from scheduler import (  # noqa: E402
+    ADAPTIVE_POLLING,
+    MARKET_CLOSE,
+    MARKET_HOLIDAYS,
+    MARKET_OPEN,
+    MarketCalendar,
+    PollScheduler,
+)
+from stock_monitor import TRADEGATE_BASE_URL, fetch_price  # noqa: E402
+from worker_state import WORKER_STATE_INTERVAL, StateMirror, StatePublisher  # noqa: E402
 
 # Configuration constants from environment variables
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "60"))  # seconds between stock checks
 MAX_FAIL_COUNT = int(os.getenv("MAX_FAIL_COUNT", "3"))
 MAX_EXCEPTIONS = int(os.getenv("MAX_EXCEPTIONS", "10"))
-
-# Load market open/close times from environment variables, defaulting to 07:30 and 22:00
-MARKET_OPEN_STR = os.getenv("MARKET_OPEN", "07:30")
-MARKET_CLOSE_STR = os.getenv("MARKET_CLOSE", "22:00")
-MARKET_OPEN = datetime.datetime.strptime(MARKET_OPEN_STR, "%H:%M").time()
-MARKET_CLOSE = datetime.datetime.strptime(MARKET_CLOSE_STR, "%H:%M").time()
+# all: admin UI, API and monitoring in one process; frontend: admin UI and API only, the single config writer;
+# worker: monitoring only, sharing the active ISINs with the other workers
+SERVICE_MODE = os.getenv("SERVICE_MODE", "all").lower()
+if SERVICE_MODE not in ("all", "frontend", "worker"):
+    raise ValueError(f"Invalid SERVICE_MODE {SERVICE_MODE!r}, expected all, frontend or worker")
+if SERVICE_MODE == "worker" and not WORKER_ID:
+    # A generated ID would change with every restart and orphan the worker's email spool and runtime state
+    raise ValueError("SERVICE_MODE=worker requires a stable WORKER_ID, e.g. WORKER_ID=worker-1")
 
 # Set up logging for the application
 logging.basicConfig(
@@ -46,6 +93,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Log configuration for debugging
+logger.info(f"SERVICE_MODE = {SERVICE_MODE}")
 logger.info(f"CHECK_INTERVAL = {CHECK_INTERVAL}")
 logger.info(f"EMAIL_FROM = {EMAIL_FROM}")
 logger.info(f"EMAIL_TO = {EMAIL_TO}")
@@ -58,19 +106,69 @@ logger.info(f"MAX_FAIL_COUNT = {MAX_FAIL_COUNT}")
 logger.info(f"MAX_EXCEPTIONS = {MAX_EXCEPTIONS}")
 logger.info(f"MARKET_OPEN = {MARKET_OPEN}")
 logger.info(f"MARKET_CLOSE = {MARKET_CLOSE}")
+logger.info(f"MARKET_HOLIDAYS = {sorted(day.isoformat() for day in MARKET_HOLIDAYS)}")
+logger.info(f"ADAPTIVE_POLLING = {ADAPTIVE_POLLING}")
+logger.info(f"RULE_WINDOW = {RULE_WINDOW}")
+logger.info(f"FETCH_WORKERS = {FETCH_WORKERS}")
+logger.info(f"FETCH_MAX_PER_HOST = {FETCH_MAX_PER_HOST}")
+logger.info(f"FETCH_RETRIES = {FETCH_RETRIES}")
+logger.info(f"BREAKER_FAILURE_THRESHOLD = {BREAKER_FAILURE_THRESHOLD}")
+logger.info(f"BREAKER_BASE_BACKOFF = {BREAKER_BASE_BACKOFF}")
+logger.info(f"PRICE_CACHE_TTL = {PRICE_CACHE_TTL}")
+logger.info(f"PRICE_CACHE_SIZE = {PRICE_CACHE_SIZE}")
+logger.info(f"TRADEGATE_BASE_URL = {TRADEGATE_BASE_URL}")
+logger.info(f"CONFIG_SAVE_DEBOUNCE = {CONFIG_SAVE_DEBOUNCE}")
+logger.info(f"CONFIG_JOURNAL = {CONFIG_JOURNAL}")
+logger.info(f"HISTORY_ENABLED = {HISTORY_ENABLED}")
+logger.info(f"HISTORY_DIR = {HISTORY_DIR}")
+logger.info(f"EMAIL_DIGEST = {EMAIL_DIGEST}")
+logger.info(f"EMAIL_SPOOL_DIR = {EMAIL_SPOOL_DIR}")
+logger.info(f"CONFIG_PAGE_SIZE = {CONFIG_PAGE_SIZE}")
+logger.info(f"GZIP_LEVEL = {GZIP_LEVEL}")
+logger.info(f"GZIP_MIN_SIZE = {GZIP_MIN_SIZE}")
+logger.info(f"STREAM_QUEUE_SIZE = {STREAM_QUEUE_SIZE}")
+logger.info(f"STREAM_MAX_CLIENTS = {STREAM_MAX_CLIENTS}")
+logger.info(f"STREAM_HEARTBEAT = {STREAM_HEARTBEAT}")
+logger.info(f"RUNTIME_STATE_PATH = {RUNTIME_STATE_PATH}")
+logger.info(f"RUNTIME_STATE_INTERVAL = {RUNTIME_STATE_INTERVAL}")
+logger.info(f"RUNTIME_STATE_MAX_AGE = {RUNTIME_STATE_MAX_AGE}")
+if SERVICE_MODE == "worker":
+    logger.info(f"WORKER_ID = {WORKER_ID}")
+if SERVICE_MODE != "all":
+    logger.info(f"COORDINATION_DB = {COORDINATION_DB}")
+    logger.info(f"WORKER_LEASE = {WORKER_LEASE}")
+    logger.info(f"WORKER_STATE_INTERVAL = {WORKER_STATE_INTERVAL}")
+    logger.info(f"WORKER_VNODES = {WORKER_VNODES}")
+    logger.info(f"FRONTEND_URL = {FRONTEND_URL}")
+    logger.info(f"CONFIG_POLL_INTERVAL = {CONFIG_POLL_INTERVAL}")
 
 # Initialize Flask app for admin UI
 app = Flask(__name__)
 app.secret_key = os.urandom(12).hex()
 app.register_blueprint(admin_ui)
 app.register_blueprint(api)
+# Compress JSON and HTML responses for clients that accept gzip
+app.after_request(compress_response)
+
+# Gauges read when /metrics is scraped
+Gauge("stock_alert_monitored_isins", "Active ISINs in the config.", function=lambda: len(config_store.active_entries()))
+Gauge("stock_alert_pending_notifications", "Emails queued for sending.", function=notifier.pending_count)
+Gauge("stock_alert_stream_clients", "Connected event stream clients.", function=lambda: len(event_broker))
+Gauge(
+    "stock_alert_open_circuit_breakers",
+    "ISINs quarantined by an open or half-open circuit breaker.",
+    function=lambda: sum(1 for breaker in health_tracker.snapshot().values() if breaker["state"] != "closed"),
+)
 
 shutdown_event = threading.Event()
+# Wakes the monitoring loop early: on shutdown and whenever the config changes
+wakeup_event = threading.Event()
 
 
 def handle_shutdown(signum, frame):
     logger.info(f"Received shutdown signal ({signum}). Shutting down gracefully...")
     shutdown_event.set()
+    wakeup_event.set()
 
 
 # Register signal handlers
@@ -78,23 +176,124 @@ signal.signal(signal.SIGINT, handle_shutdown)  # Ctrl+C
 signal.signal(signal.SIGTERM, handle_shutdown)  # Docker/K8s
 
 
+def schedule_probe(scheduler: PollScheduler, isin: str) -> None:
+    # Schedule the next check of a quarantined ISIN at its circuit breaker's retry time
+    retry_at = health_tracker.retry_at(isin)
+    delay = max(0.0, retry_at - time.time()) if retry_at is not None else scheduler.default_interval
+    scheduler.schedule(isin, time.monotonic() + delay)
+
+
+def save_state(path: str, scheduler: PollScheduler, rule_engine: RuleEngine) -> None:
+    # Snapshot prices, schedule, circuit breakers and rule state so a restart resumes where this run stopped
+    try:
+        save_runtime_state(
+            path,
+            price_cache.snapshot(),
+            scheduler.export_due(),
+            health_tracker.export_state(),
+            rule_engine.export_arrays(),
+        )
+    except OSError as e:
+        logger.error(f"Could not save runtime state to {path}: {e}")
+
+
+def fetch_and_cache(isin: str) -> float:
+    # Polls always fetch: a cached price would be fed to the rules (and the history) again whenever an ISIN
+    # is polled faster than PRICE_CACHE_TTL. The cache only serves the latest prices to the API and admin UI.
+    price = fetch_price(isin)
+    price_cache.put(isin, price)
+    return price
+
+
+def serve():
+    """Front end only: owns and persists the config while workers do the monitoring."""
+    config_store.load(load_config())
+    persister = ConfigPersister(config_store)
+    persister.start()
+    config_store.subscribe(event_broker.on_config_change)
+    # Show the workers' prices, breakers, alerts and metrics in the admin UI and the API
+    mirror = StateMirror(price_cache, health_tracker, event_broker)
+    mirror.start()
+    REGISTRY.include(mirror.worker_metrics)
+    logger.info(f"Serving {len(config_store)} ISIN(s) to the workers. Monitoring runs in the worker processes.")
+    shutdown_event.wait()
+    mirror.stop()
+    persister.stop()
+    logger.info("Service shutdown complete.")
+
+
 def main():
     """Main monitoring loop: checks stock prices, sends alerts, and manages config state."""
-    global shared_config
-    config = load_config()
-    # Ensure all entries have an 'active' field (default True)
-    for entry in config:
-        if "active" not in entry:
-            entry["active"] = True
-    with config_lock:
-        shared_config[:] = config.copy()
-    active_alerts = shared_config
-    fail_count = 0
+    follower = persister = coordinator = publisher = None
+    if SERVICE_MODE == "worker":
+        # The front end owns the config; workers follow it and send their deactivations to it
+        follower = ConfigFollower(config_store)
+        follower.start()
+    else:
+        # Entries without an 'active' field default to active
+        config_store.load(load_config())
+        # Persist all further changes (API, admin UI, deactivations) in the background
+        persister = ConfigPersister(config_store)
+        persister.start()
+    # Alerts are queued and sent by a background thread so SMTP never stalls price checks.
+    # Every worker has its own spool so a restarted worker resends only its own notifications.
+    notifier.start(os.path.join(EMAIL_SPOOL_DIR, WORKER_ID) if SERVICE_MODE == "worker" else None)
+    fetcher = PriceFetcher(fetch=fetch_and_cache)
     logger.info(
-        f"Monitoring {len(active_alerts)} ISIN(s) every {CHECK_INTERVAL} seconds. Max fail count: {MAX_FAIL_COUNT}"
+        f"Monitoring {len(config_store)} ISIN(s) every {CHECK_INTERVAL} seconds. Max fail count: {MAX_FAIL_COUNT}"
     )
+    calendar = MarketCalendar(MARKET_OPEN, MARKET_CLOSE, MARKET_HOLIDAYS)
+    scheduler = PollScheduler(CHECK_INTERVAL)
+    # The alert decision itself, shared with the replay tool (replay.py)
+    evaluator = AlertEvaluator()
+    rule_engine = evaluator.rule_engine
+    if SERVICE_MODE == "worker":
+        # Each active ISIN is polled and alerted by exactly one worker; ISINs that move to another worker
+        # take their rule state with them
+        coordinator = Coordinator(on_change=wakeup_event.set, state_provider=rule_engine.export_state)
+        config_store.subscribe(
+            lambda version, changes: coordinator.set_isins(entry.isin for entry in config_store.active_entries())
+        )
+        coordinator.set_isins(entry.isin for entry in config_store.active_entries())
+        coordinator.start()
+        # The front end shows what the workers publish
+        publisher = StatePublisher(WORKER_ID, event_broker, health_tracker, REGISTRY)
+        publisher.start()
+    # Keeps the coordinator from handing ISINs over while the loop uses or alerts on their rule state
+    hold = coordinator.hold if coordinator is not None else contextlib.nullcontext
+    # Resume from the runtime state of the previous run instead of fetching every ISIN at once.
+    # Pending notifications need no snapshot: they are spooled to EMAIL_SPOOL_DIR until sent.
+    state_path = RUNTIME_STATE_PATH
+    if state_path and SERVICE_MODE == "worker":
+        root, extension = os.path.splitext(state_path)
+        state_path = f"{root}.{WORKER_ID}{extension}"
+    restored = load_runtime_state(state_path) if state_path else None
+    if restored is not None:
+        for isin, (price, fetched_at) in restored.prices.items():
+            if isin in config_store:
+                price_cache.put(isin, price, fetched_at)
+        health_tracker.import_state(
+            dict(
+                restored.health,
+                breakers={
+                    isin: breaker for isin, breaker in restored.health.get("breakers", {}).items() if isin in config_store
+                },
+            )
+        )
+        logger.info(
+            f"Loaded runtime state saved at {datetime.datetime.fromtimestamp(restored.saved_at):%Y-%m-%d %H:%M:%S} "
+            f"from {state_path}: {len(restored.prices)} price(s), {len(restored.due)} scheduled ISIN(s)"
+        )
+    next_state_save = time.monotonic() + RUNTIME_STATE_INTERVAL
+    # Deleting or re-activating an ISIN resets its circuit breaker
+    config_store.subscribe(health_tracker.on_config_change)
+    # Stream clients see activations and deactivations from the loop, the API and the admin UI
+    config_store.subscribe(event_broker.on_config_change)
+    config_store.subscribe(lambda version, changes: wakeup_event.set())
+    config_version = None
+    ownership_version = None
     # Initial market state check and log
-    market_now = is_market_open(MARKET_OPEN, MARKET_CLOSE)
+    market_now = calendar.is_open()
     if market_now:
         logger.info("Market is currently open. Monitoring of stock prices is active.")
     else:
@@ -106,7 +305,7 @@ def main():
     while not shutdown_event.is_set():
         try:
             # Check if the market is currently open
-            market_now = is_market_open(MARKET_OPEN, MARKET_CLOSE)
+            market_now = calendar.is_open()
             # Log only on market open/close transitions
             if last_market_open is not None and market_now != last_market_open:
                 if market_now:
@@ -114,67 +313,173 @@ def main():
                 else:
                     logger.info("Market has just closed. Pausing stock price monitoring until next market open.")
             last_market_open = market_now
-            if market_now:
-                to_deactivate = []  # List of ISINs to deactivate after alerting
-                with config_lock:
-                    alerts_to_check = [entry for entry in shared_config if entry.get("active", True)]
-                if not alerts_to_check:
-                    logger.info("All entries are marked as inactive. No ISINs are currently being monitored.")
-                for entry in alerts_to_check:
-                    isin = entry["isin"]
-                    upper_threshold = entry.get("upper_threshold")
-                    lower_threshold = entry.get("lower_threshold")
-                    price = get_stock_price(isin)
-                    if price is not None:
-                        logger.info(f"Current price for ISIN {isin}: {price}")
-                        fail_count = 0  # Reset fail count on success
-                        alert = False
-                        alert_reason = ""
-                        # Check if price crosses upper threshold
-                        if upper_threshold is not None and price >= upper_threshold:
-                            alert = True
-                            alert_reason = f"reached or exceeded upper threshold {upper_threshold}"
-                        # Check if price crosses lower threshold
-                        if lower_threshold is not None and price <= lower_threshold:
-                            alert = True
-                            alert_reason = f"reached or fell below lower threshold {lower_threshold}"
-                        if alert:
-                            logger.info(f"Sending alert email for ISIN {isin}: {alert_reason}")
-                            send_email(
-                                f"Stock Alert: {isin} {alert_reason} (price: {price})",
-                                f"The stock with ISIN {isin} {alert_reason}. Current price: {price}.",
-                            )
-                            logger.info(f"Alert sent for {isin} ({alert_reason}). Marking as inactive.")
-                            to_deactivate.append(isin)
-                            logger.info(f"ISIN {isin} marked as inactive after alert.")
+            if not market_now:
+                # Sleep until the next market open (or shutdown)
+                logger.info(f"Next market open at {calendar.next_open():%Y-%m-%d %H:%M %Z}.")
+                shutdown_event.wait(calendar.seconds_until_open())
+                continue
+
+            # Pick up added, removed, activated and deactivated ISINs, and ISINs moved between workers
+            if config_store.version != config_version or (
+                coordinator is not None and coordinator.version != ownership_version
+            ):
+                with hold():
+                    config_version = config_store.version
+                    active_entries = config_store.active_entries()
+                    if coordinator is not None:
+                        ownership_version = coordinator.version
+                        owned = coordinator.owned()
+                        active_entries = [entry for entry in active_entries if entry.isin in owned]
+                    scheduler.sync(active_entries)
+                    evaluator.sync(active_entries)
+                    if restored is not None:
+                        # Continue the previous run's schedule and rule state once the ISINs are known
+                        try:
+                            rules_restored = rule_engine.import_arrays(restored.rules)
+                        except (KeyError, ValueError) as e:
+                            logger.warning(f"Ignoring the rule state of {state_path}: {e}")
+                            rules_restored = 0
+                        logger.info(
+                            f"Resumed the schedule of {scheduler.restore(restored.due)} and the rule state of "
+                            f"{rules_restored} ISIN(s)"
+                        )
+                        restored = None
+                    if coordinator is not None:
+                        rule_engine.import_state(coordinator.take_handover())
+                if not len(scheduler):
+                    if coordinator is not None:
+                        logger.info(f"Worker {WORKER_ID} currently owns no active ISINs.")
                     else:
-                        # Failed to get price: log and increment fail count
-                        logger.warning(f"Failed to get stock price for ISIN {isin}.")
-                        fail_count += 1
-                        logger.warning(f"Incremented fail_count to {fail_count}")
-                        # If too many consecutive failures, stop monitoring and notify
-                        if fail_count >= MAX_FAIL_COUNT:
-                            logger.error(
-                                f"Failed to retrieve stock prices {MAX_FAIL_COUNT} times in a row. Stopping monitoring."
-                            )
-                            logger.info("Sending service stopped notification email.")
-                            send_email(
-                                "Stock Alert: Service terminated due to repeated failures",
-                                f"The service terminated after {MAX_FAIL_COUNT} consecutive failures to retrieve stock prices.",
+                        logger.info("All entries are marked as inactive. No ISINs are currently being monitored.")
+
+            first_due = scheduler.next_due()
+            sweep_start = time.monotonic()
+            entries_by_isin = {}
+            for isin in scheduler.pop_due(sweep_start):
+                # Lock-free read of the current config snapshot
+                entry = config_store.get(isin)
+                if entry is None:
+                    continue
+                # Skip ISINs whose lease could not be renewed in time; another worker may have them now
+                if coordinator is not None and not coordinator.owns(isin):
+                    scheduler.reschedule(entry, None)
+                    continue
+                # Quarantined ISINs stay scheduled for their next probe but are not checked before
+                if not health_tracker.allow(isin):
+                    schedule_probe(scheduler, isin)
+                    continue
+                entries_by_isin[isin] = entry
+            if entries_by_isin:
+                # How far behind schedule this sweep starts
+                SWEEP_LAG_SECONDS.set(max(0.0, sweep_start - first_due))
+                SWEEP_ISINS.inc(len(entries_by_isin))
+                to_deactivate = set()  # ISINs to deactivate after alerting
+                # Half-open breakers get a single probe instead of the usual retries
+                probes = {isin for isin in entries_by_isin if health_tracker.is_probe(isin)}
+                host_reached = False
+                host_error = None
+                # Fetch all due ISINs concurrently. The rules are evaluated for each batch of prices that
+                # arrived together, so slow fetches and retries do not hold back the alerts of the others.
+                for batch in fetcher.fetch_batches(entries_by_isin, stop_event=shutdown_event, probes=probes):
+                    prices = {}  # ISIN -> price retrieved in this batch
+                    for result in batch:
+                        isin, price = result.isin, result.price
+                        entry = entries_by_isin[isin]
+                        if price is not None:
+                            logger.info(f"Current price for ISIN {isin}: {price}")
+                            host_reached = True
+                            health_tracker.record_success(isin)
+                            # The time the price was fetched, as stored in the cache
+                            cached = price_cache.get(isin)
+                            fetched_at = cached.fetched_at if cached else time.time()
+                            if HISTORY_ENABLED:
+                                history_store.record(isin, price, fetched_at)
+                            event_broker.publish(PRICE, isin, {"isin": isin, "price": price, "fetched_at": fetched_at})
+                            prices[isin] = price
+                        elif result.host_unreachable:
+                            # Not the instrument's fault: keep its breaker closed and count it as a systemic failure
+                            logger.warning(f"Failed to get stock price for ISIN {isin}: host unreachable.")
+                            host_error = str(result.error)
+                            scheduler.reschedule(entry, None)
+                        else:
+                            logger.warning(f"Failed to get stock price for ISIN {isin}.")
+                            host_reached = True
+                            error = str(result.error) if result.error is not None else "No price retrieved"
+                            if health_tracker.record_failure(isin, error) is not None:
+                                schedule_probe(scheduler, isin)
+                            else:
+                                scheduler.reschedule(entry, None)
+                    if not prices:
+                        continue
+                    with hold():
+                        with RULE_EVALUATION_SECONDS.time():
+                            # ISINs handed over during the fetch are alerted by their new owner
+                            triggered = evaluator.evaluate(
+                                prices,
+                                day=calendar.trading_day(),
+                                accept=coordinator.owns if coordinator is not None else None,
                             )
-                            return
+                        for alert in triggered:
+                            for fired in alert.alerts:
+                                ALERTS.labels(fired.rule).inc()
+                                event_broker.publish(ALERT, alert.isin, fired._asdict())
+                            logger.info(f"Queueing alert email for ISIN {alert.isin}: {alert.reason}")
+                            notifier.notify(alert.subject, alert.body)
+                            if alert.one_shot:
+                                # Without re-arming an alert is one-shot: deactivate the ISIN
+                                logger.info(f"Alert queued for {alert.isin} ({alert.reason}). Marking as inactive.")
+                                to_deactivate.add(alert.isin)
+                                logger.info(f"ISIN {alert.isin} marked as inactive after alert.")
+                            else:
+                                logger.info(
+                                    f"Alert queued for {alert.isin} ({alert.reason}). "
+                                    f"Rules re-arm after a {entries_by_isin[alert.isin].rearm_pct}% move back."
+                                )
+                        for isin, price in prices.items():
+                            if isin not in to_deactivate:
+                                scheduler.reschedule(entries_by_isin[isin], price)
+                # Terminate only if the price host could not be reached at all, several checks in a row
+                if host_error is not None and not host_reached:
+                    fail_count = health_tracker.record_host_failure(host_error)
+                    logger.warning(f"Price host unreachable, incremented fail_count to {fail_count}")
+                    if fail_count >= MAX_FAIL_COUNT:
+                        logger.error(
+                            f"Price host unreachable in {MAX_FAIL_COUNT} checks in a row. Stopping monitoring."
+                        )
+                        logger.info("Sending service stopped notification email.")
+                        notifier.notify(
+                            "Stock Alert: Service terminated due to repeated failures",
+                            f"The service terminated after {MAX_FAIL_COUNT} consecutive checks in which "
+                            f"Tradegate could not be reached.\n\nLast error: {host_error}",
+                        )
+                        shutdown_event.set()
+                        wakeup_event.set()
                 # Mark ISINs as inactive after alerting
-                with config_lock:
-                    for entry in shared_config:
-                        if entry["isin"] in to_deactivate:
-                            entry["active"] = False
-                            logger.info(f"ISIN {entry['isin']} set to inactive in config.")
-                    alerts_to_check = [entry for entry in shared_config if entry.get("active", True)]
-                    if not alerts_to_check:
+                if to_deactivate:
+                    if follower is not None:
+                        follower.deactivate(to_deactivate)
+                    for isin in config_store.set_active(to_deactivate, False):
+                        logger.info(f"ISIN {isin} set to inactive in config.")
+                    if not config_store.active_entries():
                         logger.info("All entries are marked as inactive. No ISINs are currently being monitored.")
-            # Wait before next check
-            time.sleep(CHECK_INTERVAL)
+                # Send all alerts of this sweep (as one digest email if enabled)
+                notifier.flush()
+                if HISTORY_ENABLED:
+                    history_store.flush()
+                SWEEP_SECONDS.observe(time.monotonic() - sweep_start)
+                if state_path and time.monotonic() >= next_state_save:
+                    with hold():
+                        save_state(state_path, scheduler, rule_engine)
+                    next_state_save = time.monotonic() + RUNTIME_STATE_INTERVAL
             exception_count = 0  # Reset exception count after successful loop
+
+            # Sleep until the next ISIN is due, the market closes, the config changes or shutdown
+            next_due = scheduler.next_due()
+            timeout = calendar.seconds_until_close()
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.monotonic()))
+            wakeup_event.wait(timeout)
+            wakeup_event.clear()
         except Exception as e:
             # Catch-all for unexpected errors in the main loop
             exception_count += 1
@@ -186,26 +491,49 @@ def main():
             if exception_count >= MAX_EXCEPTIONS:
                 logger.critical(f"Terminating service after {MAX_EXCEPTIONS} consecutive unexpected exceptions.")
                 exc_str = "".join(traceback.format_exception(type(e), e, e.__traceback__))
-                send_email(
+                notifier.notify(
                     "Stock Alert: Service terminated due to repeated unexpected exceptions",
                     f"The service terminated after {MAX_EXCEPTIONS} consecutive unexpected exceptions in the main loop.\n\n"
                     + "Last exception:\n"
                     + exc_str,
                 )
                 break
-            time.sleep(CHECK_INTERVAL)
+            shutdown_event.wait(CHECK_INTERVAL)
     # After loop exits, do cleanup
-    with config_lock:
-        save_config(shared_config)
+    fetcher.shutdown()
+    # Keep the previous snapshot if this run never got as far as resuming it (e.g. the market stayed closed)
+    if state_path and restored is None:
+        with hold():
+            save_state(state_path, scheduler, rule_engine)
+    if HISTORY_ENABLED:
+        history_store.flush()
+    logger.info(f"HTTP transfer stats: {http_stats()}")
+    if publisher is not None:
+        publisher.stop()
+    if coordinator is not None:
+        # Hand the owned ISINs and their rule state to the remaining workers right away
+        coordinator.stop()
+    if follower is not None:
+        follower.stop()
+    if persister is not None:
+        persister.stop()
+    # Last attempt to deliver queued notifications; undelivered ones stay spooled for the next start
+    notifier.stop()
     logger.info("Service shutdown complete.")
     # Optionally:
-    # send_email("Stock Alert: Service stopped", "The service was stopped gracefully.")
+    # notifier.notify("Stock Alert: Service stopped", "The service was stopped gracefully.")
 
 
 if __name__ == "__main__":
-    # Start Flask admin UI in a separate thread
-    flask_thread = threading.Thread(target=lambda: app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False))
-    flask_thread.daemon = True
-    flask_thread.start()
-    # Start the main monitoring loop
-    main()
+    if SERVICE_MODE != "worker":
+        # Start Flask admin UI in a separate thread
+        flask_thread = threading.Thread(
+            target=lambda: app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
+        )
+        flask_thread.daemon = True
+        flask_thread.start()
+    if SERVICE_MODE == "frontend":
+        serve()
+    else:
+        # Start the main monitoring loop
+        main()
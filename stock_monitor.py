@@ -1,69 +1,180 @@
-import datetime
 import logging
-import time
-from typing import Optional
+import os
+import re
+from typing import Callable, Dict, Optional
 
+import lxml.html
 import pytz
 import requests
 from bs4 import BeautifulSoup
 
+from http_client import conditional_get
+from metrics import PARSE_SECONDS
+
 logger = logging.getLogger(__name__)
 
+# Tradegate trading hours are defined in German local time
+MARKET_TIMEZONE = pytz.timezone("Europe/Berlin")
+# Scheme and host of the order book pages; point it at a local stand-in for load tests
+TRADEGATE_BASE_URL = os.getenv("TRADEGATE_BASE_URL", "https://www.tradegate.de").rstrip("/")
+
 
 def get_tradegate_url(isin: str) -> str:
     """
     Construct the Tradegate URL for a given ISIN.
     """
-    return f"https://www.tradegate.de/orderbuch_umsaetze.php?isin={isin}"
+    return f"{TRADEGATE_BASE_URL}/orderbuch_umsaetze.php?isin={isin}"
+
 
+# Locates the opening tag of the trades table body, e.g. <tbody id="umsaetze_body">
+_TBODY_PATTERN = re.compile(rb"<tbody[^>]*\bid\s*=\s*[\"']?umsaetze_body\b[^>]*>", re.IGNORECASE)
+_TBODY_END_PATTERN = re.compile(rb"</tbody\s*>", re.IGNORECASE)
+_ROW_START_PATTERN = re.compile(rb"<tr\b", re.IGNORECASE)
+_ROW_END_PATTERN = re.compile(rb"</tr\s*>", re.IGNORECASE)
 
-def get_stock_price(isin: str, retries: int = 3, delay: int = 30) -> Optional[float]:
+
+def parse_price_cell_fast(content: bytes) -> Optional[str]:
     """
-    Retrieve the latest stock price for a given ISIN from Tradegate.
-    Retries up to `retries` times with `delay` seconds between attempts.
-    Returns the price as float, or None if retrieval fails.
+    Targeted extractor: locate the first row of `tbody#umsaetze_body` in the raw bytes and parse only that row
+    with lxml, instead of building a tree for the whole page.
+    Returns the text of the fifth cell, or None if the row cannot be found.
     """
-    url = get_tradegate_url(isin)
-    logger.info(f"Starting price retrieval for ISIN {isin} from {url}")
-    for attempt in range(retries):
+    tbody = _TBODY_PATTERN.search(content)
+    if not tbody:
+        return None
+    # Rows after the end of the tbody belong to other tables: an empty tbody (no trades yet) has no price
+    tbody_end = _TBODY_END_PATTERN.search(content, tbody.end())
+    if not tbody_end:
+        return None
+    row_start = _ROW_START_PATTERN.search(content, tbody.end(), tbody_end.start())
+    if not row_start:
+        return None
+    row_end = _ROW_END_PATTERN.search(content, row_start.start(), tbody_end.start())
+    if not row_end:
+        return None
+    fragment = b"<table><tbody>" + content[row_start.start() : row_end.end()] + b"</tbody></table>"
+    cells = lxml.html.fromstring(fragment).xpath("//tr[1]/td")
+    if len(cells) < 5:
+        return None
+    return cells[4].text_content()
+
+
+def parse_price_cell_soup(content: bytes) -> Optional[str]:
+    """
+    Full-page extractor: build a BeautifulSoup tree of the whole page and read the fifth cell
+    of the first row of `tbody#umsaetze_body`. Slower, but tolerant of unusual markup.
+    Returns the text of the fifth cell, or None if the row cannot be found.
+    """
+    soup = BeautifulSoup(content, "lxml")
+    tbody = soup.find("tbody", {"id": "umsaetze_body"})
+    if tbody:
+        first_row = tbody.find("tr")
+        if first_row:
+            cols = first_row.find_all("td")
+            if len(cols) >= 5:
+                return cols[4].text
+    return None
+
+
+# Registered price cell extractors, tried in order: PRICE_PARSER first, then the BeautifulSoup fallback
+PRICE_PARSERS: Dict[str, Callable[[bytes], Optional[str]]] = {
+    "fast": parse_price_cell_fast,
+    "soup": parse_price_cell_soup,
+}
+PRICE_PARSER = os.getenv("PRICE_PARSER", "fast")
+FALLBACK_PRICE_PARSER = "soup"
+
+
+def register_price_parser(name: str, parser: Callable[[bytes], Optional[str]]) -> None:
+    """
+    Register an additional price cell extractor. It receives the raw page bytes and returns
+    the price cell text, or None if it cannot find it.
+    """
+    PRICE_PARSERS[name] = parser
+
+
+def _to_price(price_text: str) -> float:
+    return float(price_text.strip().replace("\xa0", "").replace(",", "."))
+
+
+def extract_price(content: bytes, isin: str) -> Optional[float]:
+    """
+    Extract the latest trade price from a Tradegate orderbook page.
+    Uses the PRICE_PARSER extractor and falls back to the BeautifulSoup extractor if it fails.
+    Returns the price as float, or None if the page does not contain a parsable price.
+    """
+    parser_names = [PRICE_PARSER]
+    if PRICE_PARSER != FALLBACK_PRICE_PARSER:
+        parser_names.append(FALLBACK_PRICE_PARSER)
+    for name in parser_names:
+        parser = PRICE_PARSERS.get(name)
+        if parser is None:
+            logger.warning(f"Unknown price parser '{name}', skipping it")
+            continue
         try:
-            logger.debug(f"Attempt {attempt + 1} to retrieve price for ISIN {isin} from {url}")
-            response = requests.get(url, timeout=10)
-            logger.debug(f"HTTP status code for ISIN {isin}: {response.status_code}")
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "lxml")
-            tbody = soup.find("tbody", {"id": "umsaetze_body"})
-            if tbody:
-                first_row = tbody.find("tr")
-                if first_row:
-                    cols = first_row.find_all("td")
-                    if len(cols) >= 5:
-                        price_text = cols[4].text.strip().replace("\xa0", "").replace(",", ".")
-                        try:
-                            price = float(price_text)
-                            logger.info(f"Successfully retrieved price for ISIN {isin}: {price}")
-                            return price
-                        except ValueError:
-                            logger.warning(f"Could not parse price for ISIN {isin}: {price_text}")
-            logger.warning(f"Could not find price on page for ISIN {isin} (attempt {attempt + 1})")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error retrieving price for ISIN {isin} (attempt {attempt + 1}/{retries}): {e}")
+            price_text = parser(content)
         except Exception as e:
-            logger.error(f"Unexpected exception while retrieving price for ISIN {isin}: {e}", exc_info=True)
-        if attempt < retries - 1:
-            logger.info(f"Retrying price retrieval for ISIN {isin} after {delay} seconds...")
-            time.sleep(delay)
-    logger.error(f"Failed to retrieve price for ISIN {isin} after {retries} attempts.")
+            logger.debug(f"Price parser '{name}' failed for ISIN {isin}: {e}")
+            continue
+        if price_text is None:
+            logger.debug(f"Price parser '{name}' found no price for ISIN {isin}")
+            continue
+        try:
+            return _to_price(price_text)
+        except ValueError:
+            logger.warning(f"Could not parse price for ISIN {isin} with parser '{name}': {price_text.strip()}")
     return None
 
 
-def is_market_open(market_open: datetime.time, market_close: datetime.time) -> bool:
+class PriceFetchError(Exception):
+    """
+    A single attempt to retrieve a price failed.
+    `host_unreachable` is True if Tradegate itself could not be reached or answered with a server error,
+    as opposed to a problem with the individual instrument (unknown ISIN, no trades on the page).
+    """
+
+    def __init__(self, message: str, host_unreachable: bool = False):
+        super().__init__(message)
+        self.host_unreachable = host_unreachable
+
+
+def _timed_extract_price(content: bytes, isin: str) -> Optional[float]:
+    with PARSE_SECONDS.time():
+        return extract_price(content, isin)
+
+
+def fetch_price(isin: str) -> float:
     """
-    Returns True if the German market is open (Tradegate hours) and today is a weekday (Mon-Fri), else False.
+    Perform a single attempt to retrieve the latest stock price for a given ISIN from Tradegate.
+    Returns the price as float or raises PriceFetchError.
     """
-    tz = pytz.timezone("Europe/Berlin")
-    now = datetime.datetime.now(tz)
-    if now.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-        return False
-    now_cet = now.time()
-    return market_open <= now_cet <= market_close
+    url = get_tradegate_url(isin)
+    logger.debug(f"Retrieving price for ISIN {isin} from {url}")
+    try:
+        price = conditional_get(url, lambda content: _timed_extract_price(content, isin))
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        raise PriceFetchError(str(e), host_unreachable=True) from e
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        raise PriceFetchError(str(e), host_unreachable=status is None or status >= 500) from e
+    except requests.exceptions.RequestException as e:
+        raise PriceFetchError(str(e)) from e
+    if price is None:
+        raise PriceFetchError("Could not find price on page")
+    logger.info(f"Successfully retrieved price for ISIN {isin}: {price}")
+    return price
+
+
+def fetch_stock_price(isin: str) -> Optional[float]:
+    """
+    Perform a single attempt to retrieve the latest stock price for a given ISIN from Tradegate.
+    Returns the price as float, or None if the attempt fails.
+    Retrying is left to the caller (see `price_fetcher.PriceFetcher`).
+    """
+    try:
+        return fetch_price(isin)
+    except PriceFetchError as e:
+        logger.error(f"Error retrieving price for ISIN {isin}: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected exception while retrieving price for ISIN {isin}: {e}", exc_info=True)
+    return None
@@ -0,0 +1,241 @@
+import collections
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Deque, Dict, List, Tuple
+
+from coordinator import COORDINATION_DB, WORKER_LEASE
+from event_stream import ALERT, PRICE, EventBroker
+from health import HealthTracker
+from metrics import Family, Registry
+from price_cache import PriceCache
+
+logger = logging.getLogger(__name__)
+
+WORKER_STATE_INTERVAL = float(os.getenv("WORKER_STATE_INTERVAL", "2"))  # seconds between worker state exchanges
+
+# Published events are kept this long for the front end to pick them up
+_EVENT_RETENTION = 300.0
+# Events a worker keeps while the database is unavailable; the oldest are dropped beyond this
+_MAX_PENDING_EVENTS = 100000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS worker_prices (
+    isin TEXT PRIMARY KEY,
+    price REAL NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    event TEXT NOT NULL,
+    isin TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS worker_events_created ON worker_events (created);
+CREATE TABLE IF NOT EXISTS worker_status (
+    worker_id TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    health TEXT NOT NULL,
+    metrics TEXT NOT NULL
+);
+"""
+
+
+def _connect(path: str, timeout: float) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class StatePublisher:
+    """
+    Publishes what a worker sees into the coordination database for the front end: its price and alert
+    events, the last price per ISIN, its circuit breakers and its metrics. Events are buffered in memory
+    and written in one transaction per interval, so the monitoring loop never waits for the database.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        broker: EventBroker,
+        health: HealthTracker,
+        registry: Registry,
+        path: str = COORDINATION_DB,
+        interval: float = WORKER_STATE_INTERVAL,
+    ):
+        self.worker_id = worker_id
+        self.path = path
+        self.interval = interval
+        self._health = health
+        self._registry = registry
+        self._pending: Deque[Tuple[float, str, str, Dict]] = collections.deque(maxlen=_MAX_PENDING_EVENTS)
+        self._unsent: List[Tuple[float, str, str, Dict]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="state-publisher", daemon=True)
+        broker.add_listener(self._on_event)
+
+    def _on_event(self, event: str, isin: str, data: Dict) -> None:
+        if event in (PRICE, ALERT):
+            self._pending.append((time.time(), event, isin, data))
+
+    def start(self) -> None:
+        self._connection = _connect(self.path, self.interval * 5)
+        self._thread.start()
+        logger.info(f"Worker {self.worker_id} publishes its state via {self.path} every {self.interval:g} seconds")
+
+    def stop(self) -> None:
+        """
+        Publish the remaining events and remove this worker's status, so the front end stops showing its breakers.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        try:
+            self.publish()
+            self._connection.execute("DELETE FROM worker_status WHERE worker_id = ?", (self.worker_id,))
+        except sqlite3.Error as e:
+            logger.error(f"Worker {self.worker_id} could not publish its final state: {e}")
+        self._connection.close()
+
+    def publish(self) -> None:
+        # Only this thread takes from the deque, the publishing threads only append to it
+        events = self._unsent
+        while self._pending:
+            events.append(self._pending.popleft())
+        del events[:-_MAX_PENDING_EVENTS]
+        self._unsent = []
+        prices = {isin: (data["price"], data["fetched_at"]) for _, event, isin, data in events if event == PRICE}
+        now = time.time()
+        status = (
+            self.worker_id,
+            now,
+            json.dumps(self._health.export_state()),
+            json.dumps(self._registry.collect()),
+        )
+        connection = self._connection
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT INTO worker_events (created, event, isin, data) VALUES (?, ?, ?, ?)",
+                    [(created, event, isin, json.dumps(data)) for created, event, isin, data in events],
+                )
+                connection.executemany(
+                    "INSERT INTO worker_prices (isin, price, fetched_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (isin) DO UPDATE SET price = excluded.price, fetched_at = excluded.fetched_at",
+                    [(isin, price, fetched_at) for isin, (price, fetched_at) in prices.items()],
+                )
+                connection.execute(
+                    "INSERT INTO worker_status (worker_id, updated, health, metrics) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (worker_id) DO UPDATE SET "
+                    "updated = excluded.updated, health = excluded.health, metrics = excluded.metrics",
+                    status,
+                )
+                connection.execute("DELETE FROM worker_events WHERE created < ?", (now - _EVENT_RETENTION,))
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            # Keep the events for the next attempt
+            self._unsent = events
+            raise
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except sqlite3.Error as e:
+                logger.error(f"Worker {self.worker_id} could not publish its state: {e}")
+
+
+class StateMirror:
+    """
+    Mirrors the state the workers publish into the front end's price cache, health tracker and event
+    broker, so the admin page, /api/prices, /api/health and /api/stream show the workers' prices, circuit
+    breakers and alerts. The metrics of live workers are kept for /metrics, see `worker_metrics`.
+    """
+
+    def __init__(
+        self,
+        cache: PriceCache,
+        health: HealthTracker,
+        broker: EventBroker,
+        path: str = COORDINATION_DB,
+        interval: float = WORKER_STATE_INTERVAL,
+        lease: float = WORKER_LEASE,
+    ):
+        self.path = path
+        self.interval = interval
+        self.lease = lease
+        self._cache = cache
+        self._health = health
+        self._broker = broker
+        self._last_event = 0
+        self._worker_metrics: Dict[str, List[Family]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="state-mirror", daemon=True)
+
+    def start(self) -> None:
+        """
+        Load the last price of every ISIN and the live workers' state once before returning.
+        """
+        self._connection = _connect(self.path, self.interval * 5)
+        rows = self._connection.execute("SELECT isin, price, fetched_at FROM worker_prices").fetchall()
+        for isin, price, fetched_at in rows:
+            self._cache.put(isin, price, fetched_at)
+        # Older events only repeat the prices just loaded
+        self._last_event = self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM worker_events").fetchone()[0]
+        self.refresh()
+        self._thread.start()
+        logger.info(f"Mirroring the state of {len(self._worker_metrics)} worker(s) from {self.path}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._connection.close()
+
+    def worker_metrics(self) -> Dict[str, List[Family]]:
+        """
+        Return the metrics last published by each live worker, keyed by worker ID.
+        """
+        return self._worker_metrics
+
+    def refresh(self) -> None:
+        connection = self._connection
+        events = connection.execute(
+            "SELECT id, event, isin, data FROM worker_events WHERE id > ? ORDER BY id", (self._last_event,)
+        ).fetchall()
+        for event_id, event, isin, data in events:
+            data = json.loads(data)
+            if event == PRICE:
+                self._cache.put(isin, data["price"], data["fetched_at"])
+            self._broker.publish(event, isin, data)
+            self._last_event = event_id
+        statuses = connection.execute(
+            "SELECT worker_id, health, metrics FROM worker_status WHERE updated >= ? ORDER BY updated",
+            (time.time() - self.lease,),
+        ).fetchall()
+        # An ISIN that moved between workers shows the breaker of the worker that published last
+        breakers: Dict[str, Dict] = {}
+        host = {"host_failures": 0, "host_last_error": None}
+        for _, health, _ in statuses:
+            state = json.loads(health)
+            breakers.update(state.get("breakers", {}))
+            if state.get("host_failures", 0) >= host["host_failures"]:
+                host = {"host_failures": state.get("host_failures", 0), "host_last_error": state.get("host_last_error")}
+        self._health.import_state({"breakers": breakers, **host}, replace=True)
+        self._worker_metrics = {worker_id: json.loads(metrics) for worker_id, _, metrics in statuses}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                logger.error(f"Could not read the state of the workers: {e}")